@@ -0,0 +1,39 @@
+"""message history indexes
+
+Revision ID: 3c9e41d7b2a8
+Revises: 757135dcdd72
+Create Date: 2026-10-18 09:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e41d7b2a8'
+down_revision: Union[str, None] = '757135dcdd72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination of chat and group history by (timestamp, id)
+    op.create_index(
+        'ix_messages_sender_receiver_timestamp',
+        'messages',
+        ['sender_id', 'receiver_id', 'timestamp', 'id'],
+        unique=False
+    )
+    op.create_index(
+        'ix_group_messages_group_timestamp',
+        'group_messages',
+        ['group_id', 'timestamp', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_group_messages_group_timestamp', table_name='group_messages')
+    op.drop_index('ix_messages_sender_receiver_timestamp', table_name='messages')
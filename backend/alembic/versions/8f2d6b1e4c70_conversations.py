@@ -0,0 +1,137 @@
+"""conversations
+
+Revision ID: 8f2d6b1e4c70
+Revises: 3c9e41d7b2a8
+Create Date: 2026-10-18 11:40:05.271943
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d6b1e4c70'
+down_revision: Union[str, None] = '3c9e41d7b2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=True),
+        sa.Column('user_low_id', sa.Integer(), nullable=True),
+        sa.Column('user_high_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message', sa.Text(), nullable=True),
+        sa.Column('last_sender_id', sa.Integer(), nullable=True),
+        sa.Column('last_activity_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['chat_groups.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_low_id'], ['user_profiles.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_high_id'], ['user_profiles.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id'),
+        sa.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversations_direct_pair')
+    )
+    op.create_index(op.f('ix_conversations_id'), 'conversations', ['id'], unique=False)
+    op.create_table(
+        'conversation_members',
+        sa.Column('conversation_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.Column('last_activity_at', sa.DateTime(), nullable=False),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_read_message_at', sa.DateTime(), nullable=True),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user_profiles.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('conversation_id', 'user_id')
+    )
+    op.create_index(
+        'ix_conversation_members_user_activity',
+        'conversation_members',
+        ['user_id', 'last_activity_at', 'conversation_id'],
+        unique=False
+    )
+
+    # ── Backfill from existing messages ────────────────────────────────────
+    # Existing history counts as read: members start at the last message
+    op.execute("""
+        INSERT INTO conversations (kind, group_id, last_activity_at)
+        SELECT 'group', g.id, COALESCE(
+            (SELECT MAX(m.timestamp) FROM group_messages m WHERE m.group_id = g.id),
+            g.created_at,
+            CURRENT_TIMESTAMP
+        )
+        FROM chat_groups g
+    """)
+    op.execute("""
+        INSERT INTO conversations (kind, user_low_id, user_high_id, last_activity_at)
+        SELECT 'direct', pairs.low, pairs.high, COALESCE(MAX(pairs.timestamp), CURRENT_TIMESTAMP)
+        FROM (
+            SELECT
+                CASE WHEN sender_id < receiver_id THEN sender_id ELSE receiver_id END AS low,
+                CASE WHEN sender_id < receiver_id THEN receiver_id ELSE sender_id END AS high,
+                timestamp
+            FROM messages
+            WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL
+        ) pairs
+        GROUP BY pairs.low, pairs.high
+    """)
+    op.execute("""
+        UPDATE conversations SET last_message_id = (
+            SELECT m.id FROM group_messages m
+            WHERE m.group_id = conversations.group_id
+            ORDER BY m.timestamp DESC, m.id DESC
+            LIMIT 1
+        )
+        WHERE kind = 'group'
+    """)
+    op.execute("""
+        UPDATE conversations SET last_message_id = (
+            SELECT m.id FROM messages m
+            WHERE (m.sender_id = conversations.user_low_id AND m.receiver_id = conversations.user_high_id)
+               OR (m.sender_id = conversations.user_high_id AND m.receiver_id = conversations.user_low_id)
+            ORDER BY m.timestamp DESC, m.id DESC
+            LIMIT 1
+        )
+        WHERE kind = 'direct'
+    """)
+    op.execute("""
+        UPDATE conversations SET
+            last_message = (SELECT m.content FROM group_messages m WHERE m.id = conversations.last_message_id),
+            last_sender_id = (SELECT m.sender_id FROM group_messages m WHERE m.id = conversations.last_message_id)
+        WHERE kind = 'group' AND last_message_id IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE conversations SET
+            last_message = (SELECT m.content FROM messages m WHERE m.id = conversations.last_message_id),
+            last_sender_id = (SELECT m.sender_id FROM messages m WHERE m.id = conversations.last_message_id)
+        WHERE kind = 'direct' AND last_message_id IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO conversation_members
+            (conversation_id, user_id, unread_count, last_activity_at, last_read_message_id, last_read_message_at)
+        SELECT c.id, members.user_id, 0, c.last_activity_at, c.last_message_id,
+            CASE WHEN c.last_message_id IS NULL THEN NULL ELSE c.last_activity_at END
+        FROM conversations c
+        JOIN (
+            SELECT c2.id AS conversation_id, gm.user_id
+            FROM conversations c2 JOIN group_members gm ON gm.group_id = c2.group_id
+            UNION
+            SELECT id, user_low_id FROM conversations WHERE kind = 'direct'
+            UNION
+            SELECT id, user_high_id FROM conversations WHERE kind = 'direct'
+        ) members ON members.conversation_id = c.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversation_members_user_activity', table_name='conversation_members')
+    op.drop_table('conversation_members')
+    op.drop_index(op.f('ix_conversations_id'), table_name='conversations')
+    op.drop_table('conversations')
@@ -0,0 +1,27 @@
+"""auth token epoch
+
+Revision ID: b5a7e3f09d21
+Revises: 8f2d6b1e4c70
+Create Date: 2026-10-18 13:05:48.902614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5a7e3f09d21'
+down_revision: Union[str, None] = '8f2d6b1e4c70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Bumped to revoke every token issued to an account
+    op.add_column('auth_users', sa.Column('token_epoch', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('auth_users', 'token_epoch')
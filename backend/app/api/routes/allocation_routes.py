@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+
+from ...schemas.allocation_schema import AllocationRequest, AllocationJobResponse
+from ...services.allocation_services import allocation_jobs
+from ...core.auth import require_role
+
+router = APIRouter()
+
+
+@router.post("/allocation-jobs", response_model=AllocationJobResponse, status_code=202)
+def start_allocation_job(
+    request: AllocationRequest,
+    current_user=Depends(require_role("admin"))
+):
+    """
+    Start assigning every unallocated student (of one hall, or all of them)
+    to the rooms with free places, maximising compatibility within rooms.
+    Poll the returned job for progress.
+    """
+    try:
+        job = allocation_jobs.submit(
+            residence_hall_id=request.residence_hall_id,
+            same_gender=request.same_gender,
+            dry_run=request.dry_run,
+            max_seconds=request.max_seconds
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
+
+
+@router.get("/allocation-jobs", response_model=List[AllocationJobResponse])
+def list_allocation_jobs(current_user=Depends(require_role("admin"))):
+    return [job.to_dict() for job in allocation_jobs.list()]
+
+
+@router.get("/allocation-jobs/{job_id}", response_model=AllocationJobResponse)
+def get_allocation_job(job_id: str, current_user=Depends(require_role("admin"))):
+    job = allocation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Allocation job not found")
+    return job.to_dict()
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import List, Dict, Any, Literal, Optional
 
 from ...schemas.compatibility_schema import CompatibilityScore, TopMatches
-from ...database import get_db
+from ...database import get_async_db, run_in_db_session
 
 from app.services.compatibility_services import MatchingService
+from app.ml.candidate_filter import CandidateFilter
+from app.core.config import Settings
 from app.models.user_model import UserProfile
 
 
@@ -15,14 +19,16 @@ router = APIRouter()
 @router.get("/compatibility-score/{user1_id}/{user2_id}", response_model=CompatibilityScore)
 async def get_compatibility_score(
     user1_id: int,
-    user2_id: int,
-    db: Session = Depends(get_db)
+    user2_id: int
 ):
     """
     Get compatibility score between two users
     """
-    service = MatchingService(db)
-    score = service.get_compatibility_between_users(user1_id, user2_id)
+    # Scoring is CPU work on the in-memory index, so it runs on the
+    # database thread pool rather than on the event loop
+    score = await run_in_db_session(
+        lambda session: MatchingService(session).get_compatibility_between_users(user1_id, user2_id)
+    )
     
     return {
         "user1_id": user1_id,
@@ -36,20 +42,46 @@ async def get_top_matches_for_user(
     user_id: int,
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    mode: Optional[Literal["exact", "approximate"]] = Query(
+        None, description="Search mode; defaults to the server's MATCHING_SEARCH_MODE"
+    ),
+    residence_hall_id: Optional[int] = Query(None, description="Only users in this residence hall"),
+    gender: Optional[str] = Query(None, description="Only users of this gender"),
+    move_in_from: Optional[date] = Query(None, description="Earliest move-in date"),
+    move_in_to: Optional[date] = Query(None, description="Latest move-in date (inclusive)"),
+    min_age: Optional[int] = Query(None, ge=0),
+    max_age: Optional[int] = Query(None, ge=0),
+    unallocated_only: bool = Query(False, description="Only users without a room yet"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get top compatible users for a given user
+    Get top compatible users for a given user, optionally restricted to
+    candidates matching the given filters
     """
-    service = MatchingService(db)
-    matches = service.get_top_compatible_users(user_id, skip, n = limit)
+    mode = mode or Settings.MATCHING_SEARCH_MODE
+    filters = CandidateFilter(
+        residence_hall_id=residence_hall_id,
+        gender=gender,
+        move_in_from=move_in_from,
+        move_in_to=move_in_to,
+        min_age=min_age,
+        max_age=max_age,
+        unallocated_only=unallocated_only
+    )
+    try:
+        # CPU-bound search, kept off the event loop like the score above
+        matches = await run_in_db_session(
+            lambda session: MatchingService(session).get_top_compatible_users(
+                user_id, skip, n = limit, mode=mode, filters=filters
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     user_ids = [m["user_id"] for m in matches]
     profiles = (
-        db.query(UserProfile)
-          .filter(UserProfile.user_id.in_(user_ids))
-          .all()
-    )
+        await db.scalars(select(UserProfile).where(UserProfile.user_id.in_(user_ids)))
+    ).all()
     profile_map = { p.user_id: p for p in profiles }
 
     enriched = [
@@ -61,4 +93,4 @@ async def get_top_matches_for_user(
         for m in matches
     ]
 
-    return {"matches": enriched}
\ No newline at end of file
+    return {"matches": enriched, "mode": mode}
\ No newline at end of file
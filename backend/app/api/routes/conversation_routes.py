@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.database import get_async_db
+from app.schemas.conversation_schema import InboxPage, ReadReceipt, ConversationMemberResponse
+from app.services.conversation_services import ConversationService
+
+router = APIRouter()
+
+@router.get("/users/{user_id}/inbox", response_model=InboxPage)
+async def get_inbox(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="next_cursor of a previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Direct and group conversations of a user, most recently active first,
+    with last message and unread count
+    """
+    try:
+        page = await db.run_sync(lambda session: ConversationService(session).get_inbox(user_id, limit, before=before))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {
+        "conversations": page["items"],
+        "next_cursor": page["next_cursor"]
+    }
+
+@router.post("/conversations/{conversation_id}/read", response_model=ConversationMemberResponse)
+async def mark_conversation_read(
+    conversation_id: int,
+    receipt: ReadReceipt,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Mark a conversation read up to a message (its last message by default)
+    and reset the user's unread count accordingly
+    """
+    try:
+        member = await db.run_sync(
+            lambda session: ConversationService(session).mark_read(conversation_id, receipt.user_id, receipt.message_id)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if member is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is not in this conversation")
+    return member
+
+@router.get("/conversations/{conversation_id}/receipts", response_model=List[ConversationMemberResponse])
+async def get_read_receipts(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """How far each member of a conversation has read"""
+    receipts = await db.run_sync(lambda session: ConversationService(session).get_receipts(conversation_id))
+    if not receipts:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return receipts
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
 import json
 
-from app.database import get_db
-from app.schemas.group_schema import GroupCreate, GroupResponse, GroupDetail, GroupMessageCreate, GroupMessageResponse, GroupMessageWithSender
+from app.database import get_async_db
+from app.schemas.group_schema import GroupCreate, GroupResponse, GroupDetail, GroupMessageCreate, GroupMessageResponse, GroupMessageWithSender, GroupMessagePage
 from app.services.group_services import GroupService, GroupMessageService
 from app.models.user_model import UserProfile
 from app.websockets.group_chat_ws import group_manager
+from app.services.message_writer import message_writer
+from app.services.chat_cache import chat_cache
 from app.models.message_model import ChatGroup, group_members, GroupMessage  
 
 router = APIRouter()
@@ -15,46 +18,43 @@ router = APIRouter()
 @router.post("/groups", response_model=GroupResponse)
 async def create_group(
     group_data: GroupCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Verify the creator exists
-    creator = db.query(UserProfile).filter(UserProfile.id == group_data.creator_id).first()
-    if not creator:
+    # Verify the creator and all members exist, in one query
+    profile_ids = {group_data.creator_id, *group_data.member_ids}
+    found = set(await db.scalars(select(UserProfile.id).where(UserProfile.id.in_(profile_ids))))
+    if group_data.creator_id not in found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Creator not found")
-    
-    # Verify all members exist
     for member_id in group_data.member_ids:
-        member = db.query(UserProfile).filter(UserProfile.id == member_id).first()
-        if not member:
+        if member_id not in found:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID {member_id} not found")
     
-    group_service = GroupService(db)
-    created_group = group_service.create_group(group_data)
+    created_group = await db.run_sync(lambda session: GroupService(session).create_group(group_data))
+    await db.refresh(created_group, ["members"])
     return created_group
 
 @router.get("/groups/{group_id}", response_model=GroupResponse)
 async def get_group(
     group_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    group_service = GroupService(db)
-    group = group_service.get_group(group_id)
+    group = await db.get(ChatGroup, group_id)
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    await db.refresh(group, ["members"])
     return group
 
 @router.get("/users/{user_id}/groups", response_model=List[GroupDetail])
 async def get_user_groups(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify user exists
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+    user = await db.get(UserProfile, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
-    group_service = GroupService(db)
-    groups = group_service.get_group_with_last_message(user_id)
+    groups = await db.run_sync(lambda session: GroupService(session).get_group_with_last_message(user_id))
     return groups
 
 @router.post("/groups/{group_id}/members/{user_id}")
@@ -62,21 +62,19 @@ async def add_group_member(
     group_id: int,
     user_id: int,
     is_admin: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify user exists
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+    user = await db.get(UserProfile, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    group_service = GroupService(db)
-    
     # Check if group exists
-    group = group_service.get_group(group_id)
+    group = await db.get(ChatGroup, group_id)
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
         
-    result = group_service.add_member(group_id, user_id, is_admin)
+    result = await db.run_sync(lambda session: GroupService(session).add_member(group_id, user_id, is_admin))
     if not result:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is already a member of this group")
     
@@ -86,16 +84,14 @@ async def add_group_member(
 async def remove_group_member(
     group_id: int,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    group_service = GroupService(db)
-    
     # Check if group exists
-    group = group_service.get_group(group_id)
+    group = await db.get(ChatGroup, group_id)
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
         
-    result = group_service.remove_member(group_id, user_id)
+    result = await db.run_sync(lambda session: GroupService(session).remove_member(group_id, user_id))
     if not result:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not a member of this group")
     
@@ -106,69 +102,67 @@ async def get_group_messages(
     group_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    group_service = GroupService(db)
-    message_service = GroupMessageService(db)
-    
     # Check if group exists
-    group = group_service.get_group(group_id)
+    group = await db.get(ChatGroup, group_id)
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
     
-    # Get messages
-    messages = message_service.get_group_messages(group_id, skip, limit)
+    # Messages with sender name and avatar in one joined query
+    return await db.run_sync(
+        lambda session: GroupMessageService(session).get_group_messages_with_sender(group_id, skip, limit)
+    )
+
+@router.get("/groups/{group_id}/messages/history", response_model=GroupMessagePage)
+async def get_group_message_history(
+    group_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="next_cursor of a previous page, for older messages"),
+    after: Optional[str] = Query(None, description="prev_cursor of a previous page, for newer messages"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    group = await db.get(ChatGroup, group_id)
+    if not group:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
     
-    # Format messages with sender info
-    result = []
-    for msg in messages:
-        sender = None
-        if msg.sender_id:
-            sender = db.query(UserProfile).filter(UserProfile.id == msg.sender_id).first()
-        
-        message_data = {
-            "id": msg.id,
-            "group_id": msg.group_id,
-            "sender_id": msg.sender_id,
-            "content": msg.content,
-            "timestamp": msg.timestamp,
-            "sender_name": f"{sender.first_name or ''} {sender.last_name or ''}".strip() if sender else None,
-            "sender_image": sender.profile_image if sender else None
-        }
-        result.append(message_data)
+    try:
+        page = await db.run_sync(
+            lambda session: GroupMessageService(session).get_group_messages_page(group_id, limit, before=before, after=after)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return result
+    return {
+        "messages": page["items"],
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"]
+    }
 
 @router.put("/groups/{group_id}")
 async def update_group(
     group_id: int,
     name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    group_service = GroupService(db)
-    
-    # Check if group exists
-    group = group_service.get_group(group_id)
-    if not group:
+    # False when the group doesn't exist
+    updated = await db.run_sync(lambda session: GroupService(session).update_group_name(group_id, name))
+    if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
-        
-    result = group_service.update_group_name(group_id, name)
     return {"status": "success", "message": "Group updated"}
 
 
 @router.websocket("/ws/group/{user_id}")
 async def websocket_group_endpoint(
     websocket: WebSocket, 
-    user_id: int, 
-    db: Session = Depends(get_db)
+    user_id: int
 ):
     # Verify user exists
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
-    if not user:
+    if await chat_cache.profile(user_id) is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
         
-    await group_manager.connect(user_id, websocket)
+    connection = await group_manager.connect(user_id, websocket)
     try:
         while True:
             data = await websocket.receive_text()
@@ -177,7 +171,7 @@ async def websocket_group_endpoint(
                 
                 # Validate required fields
                 if not all(key in message_data for key in ["group_id", "content"]):
-                    await websocket.send_text(json.dumps({
+                    connection.send(json.dumps({
                         "status": "error",
                         "message": "Message must contain group_id and content"
                     }))
@@ -186,77 +180,55 @@ async def websocket_group_endpoint(
                 group_id = message_data["group_id"]
                 content = message_data["content"]
                 
-                # Check if user is in the group
-                group_service = GroupService(db)
-                if not group_service.is_user_in_group(group_id, user_id):
-                    await websocket.send_text(json.dumps({
+                # Membership and the sender's profile normally come from the
+                # chat cache without a query
+                member_ids = await chat_cache.group_members(group_id)
+                if user_id not in member_ids:
+                    connection.send(json.dumps({
                         "status": "error",
                         "message": "You are not a member of this group"
                     }))
                     continue
+                sender = await chat_cache.profile(user_id)
                 
-                # Create message
-                message_service = GroupMessageService(db)
+                # Queue the message for a batched insert and deliver it straight away
                 message_create = GroupMessageCreate(
                     group_id=group_id,
                     sender_id=user_id,
                     content=content
                 )
+                saved_message = await message_writer.enqueue(GroupMessage, message_create.model_dump())
+                message_to_send = GroupMessageService.chat_payload(saved_message, sender)
                 
-                # Save to database
-                saved_message = message_service.send_message(message_create)
-                
-                # Get sender information
-                sender = db.query(UserProfile).filter(UserProfile.id == user_id).first()
-                
-                # Format message for sending
-                message_to_send = {
-                    "id": saved_message.id,
-                    "group_id": saved_message.group_id,
-                    "sender_id": saved_message.sender_id,
-                    "content": saved_message.content,
-                    "timestamp": saved_message.timestamp.isoformat(),
-                    "sender_name": f"{sender.first_name or ''} {sender.last_name or ''}".strip() if sender else None,
-                    "sender_image": sender.profile_image if sender else None
-                }
-                
-                # Get all members of the group
-                members = (
-                    db.query(group_members.c.user_id)
-                    .filter(group_members.c.group_id == group_id)
-                    .all()
+                # Send to all group members who are connected, on any worker
+                await group_manager.send_to_group(
+                    group_id,
+                    json.dumps({
+                        "type": "group_message",
+                        "data": message_to_send
+                    }),
+                    exclude_user_id=user_id  # Don't send to the sender
                 )
                 
-                member_ids = [member[0] for member in members]
-                
-                # Send to all group members who are connected
-                for member_id in member_ids:
-                    if member_id != user_id:  # Don't send to the sender
-                        await group_manager.send_message(
-                            receiver_id=member_id,
-                            message=json.dumps({
-                                "type": "group_message",
-                                "data": message_to_send
-                            })
-                        )
-                
                 # Send confirmation back to sender
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "success",
                     "message": "Message sent",
                     "data": message_to_send
                 }))
                 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "error",
                     "message": "Invalid JSON format"
                 }))
             except Exception as e:
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "error",
                     "message": f"Error: {str(e)}"
                 }))
                 
     except WebSocketDisconnect:
-        group_manager.disconnect(user_id)
+        pass
+    finally:
+        group_manager.disconnect(user_id, connection)
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, status
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.websockets.chat_ws import manager
-from app.schemas.message_schema import MessageCreate, MessageResponse
+from app.schemas.message_schema import MessageCreate, MessageResponse, MessagePage
 from app.services.message_services import MessageService
-from app.database import get_db
+from app.services.message_writer import message_writer
+from app.services.chat_cache import chat_cache
+from app.models.message_model import Message
+from app.database import get_async_db
+from app.core.auth import require_role
 import json
 
 
@@ -17,27 +21,59 @@ router = APIRouter()
 async def get_chat_history(
     current_user_id: int,
     other_user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = 0,
     limit: int = 100
 ):
-    message_service = MessageService(db)
-    messages = message_service.get_chat_history(
+    messages = await db.run_sync(lambda session: MessageService(session).get_chat_history(
         user_id=current_user_id,
         other_user_id=other_user_id,
         skip=skip,
         limit=limit
-    )
+    ))
     
     return messages
 
+@router.get(
+    "/messages/{current_user_id}/{other_user_id}/history",
+    response_model=MessagePage
+)
+async def get_chat_history_page(
+    current_user_id: int,
+    other_user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="next_cursor of a previous page, for older messages"),
+    after: Optional[str] = Query(None, description="prev_cursor of a previous page, for newer messages"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        page = await db.run_sync(lambda session: MessageService(session).get_chat_history_page(
+            user_id=current_user_id,
+            other_user_id=other_user_id,
+            limit=limit,
+            before=before,
+            after=after
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return {
+        "messages": page["items"],
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"]
+    }
+
+@router.get("/chat/metrics")
+async def get_chat_metrics(current_user=Depends(require_role("admin"))):
+    """Queue depth and flush counters of the chat message writer, and chat cache hit rates"""
+    return {**message_writer.stats(), "cache": chat_cache.stats()}
+
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket, 
-    user_id: int, 
-    db: Session = Depends(get_db)
+    user_id: int
 ):
-    await manager.connect(user_id, websocket)
+    connection = await manager.connect(user_id, websocket)
     try:
         while True:
             data = await websocket.receive_text()
@@ -45,7 +81,7 @@ async def websocket_endpoint(
                 message_data = json.loads(data)
                 # Validate required fields
                 if not all(key in message_data for key in ["receiver_id", "content"]):
-                    await websocket.send_text(json.dumps({
+                    connection.send(json.dumps({
                         "status": "error",
                         "message": "Message must contain receiver_id and content"
                     }))
@@ -58,23 +94,16 @@ async def websocket_endpoint(
                     content=message_data["content"]
                 )
                 
-                # Save to database
-                message_service = MessageService(db)
-                saved_message = message_service.send_message(message_create)
+                # Both profiles normally come from the chat cache without a query
+                if await chat_cache.profile(message_create.receiver_id) is None:
+                    raise ValueError(f"User {message_create.receiver_id} not found")
+                sender = await chat_cache.profile(user_id)
+                if sender is None:
+                    raise ValueError(f"User {user_id} not found")
                 
-                # Format message for sending with consistent structure
-                message_to_send = {
-                    "id": saved_message.id,
-                    "sender": {
-                    "id":          saved_message.sender_id,
-                    "first_name":  saved_message.sender.first_name,
-                    "last_name":   saved_message.sender.last_name,
-                    "avatar":      saved_message.sender.profile_image
-                    },
-                    "receiver_id": saved_message.receiver_id,  # Add receiver_id which was missing
-                    "content": saved_message.content,
-                    "timestamp": saved_message.timestamp.isoformat()
-                }
+                # Queue the message for a batched insert and deliver it straight away
+                saved_message = await message_writer.enqueue(Message, message_create.model_dump())
+                message_to_send = MessageService.chat_payload(saved_message, sender)
                 
                 # Send to receiver if they're connected
                 await manager.send_message(
@@ -84,36 +113,37 @@ async def websocket_endpoint(
                 
                 # Send confirmation back to sender with the SAME format as regular messages
                 # This is important for consistent handling
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "success",
                     "message": "Message sent",
                     "data": message_to_send  # Same format as what's sent to receiver
                 }))
                 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "error",
                     "message": "Invalid JSON format"
                 }))
             except Exception as e:
-                await websocket.send_text(json.dumps({
+                connection.send(json.dumps({
                     "status": "error",
                     "message": f"Error: {str(e)}"
                 }))
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        manager.disconnect(user_id, connection)
 
 @router.get(
     "/messages-contacts/{current_user_id}",
 )
 async def get_chat_contacts(
     current_user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    message_service = MessageService(db)
-    contacts = message_service.get_chat_contacts(
+    contacts = await db.run_sync(lambda session: MessageService(session).get_chat_contacts(
         user_id=current_user_id
-    )
+    ))
     
     # Convert to response format with only necessary fields
     return [
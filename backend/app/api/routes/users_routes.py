@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Body, BackgroundTasks
 from typing import List
 from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from ...core.auth import get_current_active_user, refresh_access_token
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 
@@ -37,17 +39,21 @@ from ...services import (
     search_user_profiles_by_query_service,
     filter_user_profiles_by_demographics_service,
     logout_user_service,
-    get_auth_user_by_id_service
+    get_auth_user_by_id_service,
+    set_user_blocked_service,
+    import_users_service
 )
 from ...core.auth import (
     get_current_active_user,
     require_role,
+    password_pool,
+    hash_password_async,
     hash_password,
     verify_password,
     create_tokens,
     oauth2_scheme,
 )
-from ...database import get_db
+from ...database import get_db, get_async_db, run_in_db_session
 from app.websockets.chat_ws import manager
 
 router = APIRouter(
@@ -58,31 +64,60 @@ router = APIRouter(
 # ---------------------------
 
 @router.post("/admin_users")
-def register_user(
-    user: AuthUserCreate, 
-    db: Session = Depends(get_db)
+async def register_user(
+    user: AuthUserCreate
 ):
     """
     Admin endpoint to register a new user.
     """
     try:
-        return create_user_service(user, db)
+        # Hash on the bcrypt pool without holding a request thread, then
+        # write on the database thread pool
+        password_hash = await hash_password_async(user.password)
+        return await run_in_db_session(lambda session: create_user_service(user, session, password_hash=password_hash))
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in register_user: {e}")
 
 
+@router.post("/admin_users/import")
+async def import_users(
+    file: UploadFile = File(...),
+    send_welcome: bool = Form(False),
+    current_user=Depends(require_role("admin"))
+):
+    """
+    Admin endpoint to create many users from a CSV (with a header row) or
+    JSONL file. Columns: msu_email, password, optional role, first_name,
+    last_name and msu_id. Streams one JSON line per row (created, exists,
+    duplicate, invalid or failed) followed by a summary line. With
+    send_welcome, new users are e-mailed their credentials in the background.
+    """
+    content = await file.read()
+    return StreamingResponse(
+        import_users_service(content, file.filename or "", send_welcome),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/login",  tags=["Auth"])
-def login_for_access_token(
+async def login_for_access_token(
     background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    result = authenticate_user_service(form_data.username, form_data.password, db)
+    result = await authenticate_user_service(form_data.username, form_data.password, db)
     background_tasks.add_task(manager.broadcast_presence, result["user"].id, True)
     return result
 
+@router.get("/auth/metrics", tags=["Auth"])
+def get_auth_metrics(current_user=Depends(require_role("admin"))):
+    """
+    Admin endpoint with the password hashing pool's queue depth and rejections.
+    """
+    return password_pool.stats()
+
 @router.post(
     "/token/refresh",
     response_model=TokenResponse,
@@ -140,6 +175,30 @@ def update_auth_user(
         raise HTTPException(status_code=500, detail=f"Error in update_auth_user: {e}")
 
 
+@router.post("/admin_users/{user_id}/block", response_model=AuthUserResponse)
+def block_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(require_role("admin"))
+):
+    """
+    Admin endpoint to block a user; their tokens stop working right away.
+    """
+    return set_user_blocked_service(user_id, True, db)
+
+
+@router.post("/admin_users/{user_id}/unblock", response_model=AuthUserResponse)
+def unblock_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(require_role("admin"))
+):
+    """
+    Admin endpoint to unblock a user.
+    """
+    return set_user_blocked_service(user_id, False, db)
+
+
 @router.get("/admin_users/all", response_model=List[AuthUserResponse])
 def get_all_auth_users(
     skip: int = 0, 
@@ -181,7 +240,7 @@ def get_new_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db))
 @router.post("/logout")
 async def logout(
     background_tasks: BackgroundTasks, 
-    db: Session=Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_active_user)
    
 ):
@@ -189,7 +248,7 @@ async def logout(
     if user_id is None:
         raise HTTPException(status_code=400, detail="Invalid user")
     background_tasks.add_task(manager.broadcast_presence, user_id, False)
-    return logout_user_service(user_id, db)
+    return await db.run_sync(lambda session: logout_user_service(user_id, session))
 
 @router.get("/admin_users/{user_id}", response_model=AuthUserResponse)
 def get_auth_user_by_id(
@@ -214,17 +273,17 @@ def get_auth_user_by_id(
 # ---------------------------
 
 @router.put("/users/update_password/{user_id}", response_model=AuthUserResponse)
-def update_student_password(
+async def update_student_password(
     update_data: AuthUserUpdatePwd,
     user_id: int,  
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint for a student to update their password.
     In development mode, the current user's id is passed from the frontend.
     """
     try:
-        return update_student_password_service(user_id, update_data, db)
+        return await update_student_password_service(user_id, update_data, db)
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -263,8 +322,7 @@ async def update_profile(
     gender: str = Form(None),
     move_in_date: str = Form(None),  
     bio: str = Form(None),
-    majors: str = Form(None),
-    db: Session = Depends(get_db)
+    majors: str = Form(None)
 ):
     try:
         update_data = {}
@@ -298,7 +356,9 @@ async def update_profile(
                 shutil.copyfileobj(profile_image.file, buffer)
             update_data["profile_image"] = file_path
 
-        return update_user_profile_service(user_id, update_data, db)
+        # The service also refreshes the compatibility index (NumPy work),
+        # so it runs on the database thread pool rather than the event loop
+        return await run_in_db_session(lambda session: update_user_profile_service(user_id, update_data, session))
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -1,5 +1,10 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
-from typing import Optional, Dict, Tuple
+from typing import Any, Callable, Optional, Dict, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -8,21 +13,132 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from .config import Settings 
-from ..database import get_db
+from ..database import SessionLocal
 from ..models.user_model import AuthUser
 from ..schemas.user_schema import CurrentUser
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different work factor are flagged for rehashing on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=Settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=Settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=Settings.BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
 
+
+class PasswordHashPool:
+    """
+    Bounded pool for bcrypt hashing and verification
+
+    Each bcrypt call takes 100-300 ms of CPU. Running them on a few
+    dedicated threads caps how much of the machine a login storm can use,
+    and once max_pending calls are queued or running, new ones are refused
+    with 429 right away.
+
+    Request handlers (login, registration, password change) are async and
+    await run_async, so a queued hash holds no request thread. run() blocks
+    its caller until the hash is done and is for sync code paths only.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._work_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and rejections"""
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": min(self._pending, self.workers),
+                "queue_depth": max(self._pending - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": self._wait_seconds / done * 1000,
+                "avg_hash_ms": self._work_seconds / done * 1000,
+            }
+
+    def run(self, function: Callable, *args) -> Any:
+        """Run function(*args) on the pool and wait for it (for sync callers)"""
+        return self._submit(function, *args).result()
+
+    async def run_async(self, function: Callable, *args) -> Any:
+        """Run function(*args) on the pool without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(function, *args))
+
+    def _submit(self, function: Callable, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many sign-in requests right now; please try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        queued = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self.completed += 1
+                    self._wait_seconds += started - queued
+                    self._work_seconds += finished - started
+
+        return self._executor.submit(call)
+
+
+password_pool = PasswordHashPool(
+    workers=Settings.PASSWORD_HASH_WORKERS,
+    max_pending=Settings.PASSWORD_HASH_MAX_PENDING
+)
+
 def hash_password(password: str) -> str:
     """Hash the password using bcrypt."""
-    return pwd_context.hash(password)
+    return password_pool.run(pwd_context.hash, password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if its hash uses an outdated work factor,
+    return a new hash to store (None otherwise).
+    """
+    return password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def hash_password_in_worker(password: str) -> str:
+    """
+    Hash a password without going through password_pool. Meant to be
+    mapped over a process pool for bulk imports, not called from requests.
+    """
+    return pwd_context.hash(password)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run_async(pwd_context.hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run_async(pwd_context.verify, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_pool.run_async(pwd_context.verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
@@ -36,19 +152,78 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, Settings.SECRET_KEY, algorithm=Settings.ALGORITHM)
     return encoded_jwt
 
+def token_claims(user: AuthUser) -> dict:
+    """
+    Claims identifying an account in its tokens: email, role, account id
+    (uid) and the account's revocation epoch, which is bumped to revoke
+    every token issued before
+    """
+    return {"sub": user.msu_email, "role": user.role, "uid": user.id, "epoch": user.token_epoch or 0}
+
+
+class PrincipalCache:
+    """
+    Short-lived cache of each account's blocked flag and token epoch, so
+    authenticated requests don't query auth_users
+
+    Blocking, unblocking, logging out and changing credentials invalidate
+    the account's entry on this worker; other workers see the change
+    within ttl_seconds. Deleted accounts are not cached.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, bool, int]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Tuple[bool, int]]:
+        """(is_blocked, token_epoch) of an account, or None if it doesn't exist"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1], entry[2]
+            generation = self._generations.get(user_id, 0)
+
+        with SessionLocal() as db:
+            row = db.query(AuthUser.is_blocked, AuthUser.token_epoch).filter(AuthUser.id == user_id).first()
+        if row is None:
+            return None
+        state = (bool(row.is_blocked), row.token_epoch or 0)
+
+        with self._lock:
+            # Don't cache a read that overlapped an invalidation
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (time.monotonic() + self.ttl_seconds, *state)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return state
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+principal_cache = PrincipalCache(ttl_seconds=Settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+
+
 def get_user_by_email(db: Session, email: str):
     """
     Retrieve a user by email from the database.
     """
     return db.query(AuthUser).filter(AuthUser.msu_email == email).first()
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> Optional[CurrentUser]:
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Optional[CurrentUser]:
     """
     Decode the JWT and return the current user's information.
-    Raises an HTTPException if the token is invalid.
+    Raises an HTTPException if the token is invalid or has been revoked.
+    Identity comes from the token's claims; only the account's blocked
+    flag and token epoch are looked up, through principal_cache.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,25 +232,32 @@ def get_current_user(
     )
     try:
         payload = jwt.decode(token, Settings.SECRET_KEY, algorithms=[Settings.ALGORITHM])
-        msu_email: str = payload.get("sub")
-        role: str = payload.get("role")
-        
-        if msu_email is None:
-            raise credentials_exception
-        
-        # Verify user exists in database
-        user = get_user_by_email(db, msu_email)
-        if not user:
-            raise credentials_exception
-        
-        return {
-            "msu_email": msu_email, 
-            "role": role,
-            "user_id": user.id
-        }
     except JWTError:
         raise credentials_exception
     
+    msu_email: str = payload.get("sub")
+    role: str = payload.get("role")
+    user_id = payload.get("uid")
+    epoch = payload.get("epoch")
+    
+    # Tokens issued before uid/epoch claims existed must be renewed by logging in
+    if msu_email is None or user_id is None or epoch is None or payload.get("token_type") == "refresh":
+        raise credentials_exception
+    
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        raise credentials_exception
+    is_blocked, token_epoch = principal
+    if epoch != token_epoch:
+        raise credentials_exception
+    
+    return {
+        "msu_email": msu_email, 
+        "role": role,
+        "user_id": user_id,
+        "is_blocked": is_blocked
+    }
+    
 def get_current_active_user(current_user: dict = Depends(get_current_user)) -> Optional[CurrentUser]:
     """
     Verifies the user account is active and not blocked.
@@ -86,11 +268,8 @@ def get_current_active_user(current_user: dict = Depends(get_current_user)) -> O
             detail="User authentication failed",
         )
     
-    # Added check to verify user isn't blocked
-    db = next(get_db())
-    user = get_user_by_email(db, current_user["msu_email"])
-    
-    if user.is_blocked:
+    # Blocked flag comes from the principal cache; no extra query
+    if current_user["is_blocked"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is blocked",
@@ -103,7 +282,7 @@ def require_role(required_role: str):
     """
     Dependency to check if the current user has the required role.
     """
-    def role_checker(current_user: dict = Depends(get_current_user)):
+    def role_checker(current_user: dict = Depends(get_current_active_user)):
         if current_user['role'] != required_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
@@ -159,7 +338,7 @@ def refresh_access_token(refresh_token: str, db: Session) -> str:
         
         # Get user from database
         user = get_user_by_email(db, msu_email)
-        if not user or user.refresh_token != refresh_token:
+        if not user or user.refresh_token != refresh_token or payload.get("epoch") != (user.token_epoch or 0):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token",
@@ -189,9 +368,7 @@ def refresh_access_token(refresh_token: str, db: Session) -> str:
             )
         
         # Create new access token
-        new_access_token = create_access_token(
-            {"sub": user.msu_email, "role": user.role}
-        )
+        new_access_token = create_access_token(token_claims(user))
         
         return new_access_token
     
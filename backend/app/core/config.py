@@ -16,6 +16,7 @@
 
 
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -24,12 +25,19 @@ load_dotenv()
 class Settings:
     # ── Database ─────────────────────────────
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DB_EXECUTOR_THREADS: int = int(os.getenv("DB_EXECUTOR_THREADS", 10))  # blocking DB work from async handlers
 
     # ── Auth / JWT ───────────────────────────
     SECRET_KEY: str = os.getenv("SECRET_KEY", "change-me")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", 30))  # block/revoke lag across workers
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))  # changing it rehashes passwords on login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))  # beyond this, 429
+    USER_IMPORT_CHUNK_SIZE: int = int(os.getenv("USER_IMPORT_CHUNK_SIZE", 500))  # rows per INSERT ... RETURNING
+    USER_IMPORT_WORKERS: int = int(os.getenv("USER_IMPORT_WORKERS", 0))  # hashing processes, 0 = all cores
 
     # ── SMTP / E-mail ────────────────────────
     MAIL_SERVER: str   = os.getenv("MAIL_SERVER")
@@ -38,6 +46,46 @@ class Settings:
     MAIL_PASSWORD: str = os.getenv("MAIL_PASSWORD")
     MAIL_FROM: str     = os.getenv("MAIL_FROM", "no-reply@example.com")
     MAIL_USE_TLS: bool = os.getenv("MAIL_USE_TLS", "false").lower() == "true"  # for port 587
+    MAIL_BACKEND: str  = os.getenv("MAIL_BACKEND", "smtp")  # or "file" / "console" for tests and dev
+    MAIL_FILE_PATH: str = os.getenv("MAIL_FILE_PATH", "outbox.mbox")  # used by the file backend
+    MAIL_QUEUE_SIZE: int = int(os.getenv("MAIL_QUEUE_SIZE", 10000))
+    MAIL_BATCH_SIZE: int = int(os.getenv("MAIL_BATCH_SIZE", 50))  # messages per connection use
+    MAIL_MAX_ATTEMPTS: int = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+    MAIL_RETRY_BASE_SECONDS: float = float(os.getenv("MAIL_RETRY_BASE_SECONDS", 2))  # doubles per attempt
+
+    # ── Matching ─────────────────────────────
+    MATCHING_INDEX_PATH: str            = os.getenv("MATCHING_INDEX_PATH")  # optional .npz snapshot
+    MATCHING_INDEX_MAX_AGE_SECONDS: int = int(os.getenv("MATCHING_INDEX_MAX_AGE_SECONDS", 900))
+    MATCHING_DRIFT_THRESHOLD: float     = float(os.getenv("MATCHING_DRIFT_THRESHOLD", 0.1))
+    # "approximate" re-ranks LSH candidates exactly, so only recall suffers:
+    # measured recall@10 is ~0.90-0.96 for 2k-100k users with the defaults
+    # below. Under ~10k users the exact scan is as fast or faster.
+    MATCHING_SEARCH_MODE: str           = os.getenv("MATCHING_SEARCH_MODE", "exact")  # or "approximate"
+    MATCHING_ANN_BACKEND: str           = os.getenv("MATCHING_ANN_BACKEND", "lsh")
+    MATCHING_LSH_TABLES: int            = int(os.getenv("MATCHING_LSH_TABLES", 32))
+    MATCHING_LSH_BITS: Optional[int]    = int(os.getenv("MATCHING_LSH_BITS")) if os.getenv("MATCHING_LSH_BITS") else None  # unset: from the user count
+    MATCHING_BLOCK_SIZE: int            = int(os.getenv("MATCHING_BLOCK_SIZE", 1024))  # all-pairs tile size
+    MATCHING_WORKERS: int               = int(os.getenv("MATCHING_WORKERS", 1))  # all-pairs processes
+    MATCHING_RATING_WEIGHT: float       = float(os.getenv("MATCHING_RATING_WEIGHT", 0))  # share of peer feedback (opt-in, e.g. 0.2)
+    MATCHING_RATING_PRIOR_MEAN: float   = float(os.getenv("MATCHING_RATING_PRIOR_MEAN", 3.0))
+    MATCHING_RATING_PRIOR_COUNT: float  = float(os.getenv("MATCHING_RATING_PRIOR_COUNT", 5))
+    MATCHING_CATEGORY_WEIGHTS: str      = os.getenv("MATCHING_CATEGORY_WEIGHTS", "")  # JSON, e.g. {"lifestyle": 2}
+    ALLOCATION_MAX_SECONDS: float       = float(os.getenv("ALLOCATION_MAX_SECONDS", 10))  # solver time budget
+    ALLOCATION_NEIGHBOURS: int          = int(os.getenv("ALLOCATION_NEIGHBOURS", 30))
+
+    # ── Chat ─────────────────────────────────
+    CHAT_BROKER: str                 = os.getenv("CHAT_BROKER", "memory")  # or "postgres" for several workers
+    CHAT_BROKER_CHANNEL: str         = os.getenv("CHAT_BROKER_CHANNEL", "chat_events")  # NOTIFY channel
+    CHAT_SEND_QUEUE_SIZE: int        = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 256))  # pending messages per socket
+    CHAT_SLOW_CONSUMER_POLICY: str   = os.getenv("CHAT_SLOW_CONSUMER_POLICY", "drop_oldest")  # or "disconnect"
+    CHAT_SEND_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_SEND_TIMEOUT_SECONDS", 10))
+    CHAT_FLUSH_INTERVAL_MS: int      = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", 50))  # write-behind flush period
+    CHAT_FLUSH_BATCH_SIZE: int       = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", 500))  # flush early at this many rows
+    CHAT_MAX_PENDING_MESSAGES: int   = int(os.getenv("CHAT_MAX_PENDING_MESSAGES", 10000))
+    CHAT_ID_BLOCK_SIZE: int          = int(os.getenv("CHAT_ID_BLOCK_SIZE", 100))  # ids reserved per round trip
+    CHAT_SPILL_PATH: str             = os.getenv("CHAT_SPILL_PATH", "chat_unsaved_messages.jsonl")
+    CHAT_CACHE_TTL_SECONDS: float    = float(os.getenv("CHAT_CACHE_TTL_SECONDS", 300))  # member/profile cache backstop
+    CHAT_CACHE_MAX_ENTRIES: int      = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", 10000))
 
     # ── Misc ─────────────────────────────────
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
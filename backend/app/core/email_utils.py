@@ -1,14 +1,297 @@
+import heapq
+import itertools
+import logging
+import mailbox
+import queue
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
+from typing import Any, Dict, List, Optional, Tuple
+
 from app.core.config import Settings
 
+logger = logging.getLogger(__name__)
+
 settings = Settings()        # ⇐ your existing Pydantic settings class
 
-def send_welcome_email(to_email: str, raw_password: str) -> None:
+# How long stop() waits for the queue to drain before giving up
+SHUTDOWN_TIMEOUT_SECONDS = 10.0
+
+# Longest wait between retries of one message
+MAX_RETRY_DELAY_SECONDS = 300.0
+
+
+# ── Sinks ──────────────────────────────────────────────────────────────────
+class ConsoleMailSink:
+    """Logs messages instead of sending them (local development)"""
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[Tuple[EmailMessage, Exception]]:
+        for message in messages:
+            logger.info("Mail to %s: %s\n%s", message["To"], message["Subject"], message.get_content())
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class FileMailSink:
+    """Appends messages to an mbox file, so tests can read back what was sent"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[Tuple[EmailMessage, Exception]]:
+        box = mailbox.mbox(self.path)
+        box.lock()
+        try:
+            for message in messages:
+                box.add(message)
+            box.flush()
+        finally:
+            box.unlock()
+            box.close()
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class SMTPMailSink:
+    """
+    Sends over one SMTP connection that is kept open between batches
+
+    The TLS handshake and login happen once per connection rather than once
+    per message. A dropped connection is reopened and the batch continues;
+    the queue closes the connection after it has been idle for a while.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 30.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def send_batch(self, messages: List[EmailMessage]) -> List[Tuple[EmailMessage, Exception]]:
+        failures = []
+        for message in messages:
+            try:
+                self._send(message)
+            except Exception as exc:
+                failures.append((message, exc))
+        return failures
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass  # The server may already have hung up
+        self._smtp = None
+
+    def _send(self, message: EmailMessage) -> None:
+        try:
+            self._connection().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Servers drop idle connections; reconnect once and try again
+            self._smtp = None
+            self._connection().send_message(message)
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            if self.starttls:
+                smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                smtp.starttls()
+            else:
+                smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            if self.username:
+                smtp.login(self.username, self.password)
+            self._smtp = smtp
+        return self._smtp
+
+
+def _is_permanent(exc: Exception) -> bool:
+    # 5xx replies and refused recipients will fail the same way next time
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 500 <= exc.smtp_code < 600
+    return False
+
+
+# ── Queue ──────────────────────────────────────────────────────────────────
+class MailQueue:
     """
-    Sends a blocking welcome e-mail that includes the user’s credentials.
-    Raises RuntimeError on any failure.
+    Background outbound mail
+
+    send() only puts the message on a bounded in-memory queue, so request
+    latency does not depend on the mail server. A worker thread sends in
+    batches through the sink and retries transient failures with
+    exponential backoff, up to max_attempts per message.
     """
+
+    def __init__(
+        self,
+        sink,
+        max_queued: int = 10000,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        idle_timeout_seconds: float = 60.0
+    ):
+        self.sink = sink
+        self.batch_size = max(batch_size, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_base_seconds = retry_base_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._queue: "queue.Queue[Optional[Tuple[EmailMessage, int]]]" = queue.Queue(maxsize=max_queued)
+        self._retries: List[Tuple[float, int, EmailMessage, int]] = []  # (due, seq, message, attempts)
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "retrying": len(self._retries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    def send(self, message: EmailMessage) -> None:
+        """
+        Queue a message for delivery.
+        Raises RuntimeError if the queue is full.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((message, 0))
+        except queue.Full:
+            raise RuntimeError("Mail queue is full") from None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        """Send what is queued (pending retries are not waited for) and stop"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(None)  # Wake the worker
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        unsent = self._queue.qsize() + len(self._retries)
+        if unsent:
+            logger.error("Mail queue stopped with %d unsent message(s)", unsent)
+
+    # ── Worker ─────────────────────────────────────────────────────────────
+    def _run(self) -> None:
+        last_sent = time.monotonic()
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                if time.monotonic() - last_sent > self.idle_timeout_seconds:
+                    self.sink.close()
+                continue
+            self._deliver(batch)
+            last_sent = time.monotonic()
+        self.sink.close()
+
+    def _next_batch(self) -> List[Tuple[EmailMessage, int]]:
+        timeout = self.idle_timeout_seconds
+        if self._retries:
+            timeout = min(timeout, max(self._retries[0][0] - time.monotonic(), 0))
+
+        batch = []
+        try:
+            item = self._queue.get(timeout=timeout)
+            if item is not None:
+                batch.append(item)
+            while len(batch) < self.batch_size:
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, _, message, attempts = heapq.heappop(self._retries)
+            batch.append((message, attempts))
+        return batch
+
+    def _deliver(self, batch: List[Tuple[EmailMessage, int]]) -> None:
+        attempts_by_message = {id(message): attempts for message, attempts in batch}
+        try:
+            failures = self.sink.send_batch([message for message, _ in batch])
+        except Exception as exc:
+            failures = [(message, exc) for message, _ in batch]
+
+        self.sent += len(batch) - len(failures)
+        for message, exc in failures:
+            attempts = attempts_by_message[id(message)] + 1
+            if attempts >= self.max_attempts or _is_permanent(exc):
+                self.failed += 1
+                logger.error("Giving up on mail to %s after %d attempt(s): %s", message["To"], attempts, exc)
+                continue
+            self.retried += 1
+            delay = min(self.retry_base_seconds * 2 ** (attempts - 1), MAX_RETRY_DELAY_SECONDS)
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), message, attempts))
+        if failures:
+            # Start the next batch on a fresh connection
+            self.sink.close()
+
+
+def _make_sink():
+    if settings.MAIL_BACKEND == "console":
+        return ConsoleMailSink()
+    if settings.MAIL_BACKEND == "file":
+        return FileMailSink(settings.MAIL_FILE_PATH)
+    return SMTPMailSink(
+        settings.MAIL_SERVER,
+        settings.MAIL_PORT,
+        username=settings.MAIL_USERNAME,
+        password=settings.MAIL_PASSWORD,
+        starttls=settings.MAIL_USE_TLS
+    )
+
+
+mail_queue = MailQueue(
+    _make_sink(),
+    max_queued=settings.MAIL_QUEUE_SIZE,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_attempts=settings.MAIL_MAX_ATTEMPTS,
+    retry_base_seconds=settings.MAIL_RETRY_BASE_SECONDS
+)
+
+
+def build_welcome_email(to_email: str, raw_password: str) -> EmailMessage:
+    """Welcome e-mail that includes the user’s credentials."""
     msg             = EmailMessage()
     msg["Subject"]  = "Welcome to the MSU Roommate App"
     msg["From"]     = settings.MAIL_FROM           # e.g. "no-reply@mysite.com"
@@ -17,7 +300,7 @@ def send_welcome_email(to_email: str, raw_password: str) -> None:
     msg.set_content(
         f"""Hi,
 
-Your admin account has been created.
+Your account has been created.
 
 Login e-mail : {to_email}
 Temporary pwd : {raw_password}
@@ -28,10 +311,13 @@ Thanks,
 MSU Housing & Residence Life
 """
     )
+    return msg
+
 
-    try:
-        with smtplib.SMTP_SSL(settings.MAIL_SERVER, settings.MAIL_PORT) as smtp:
-            smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-            smtp.send_message(msg)
-    except Exception as exc:            # ⇐ bubble up a clean error
-        raise RuntimeError(f"SMTP error: {exc}") from exc
+def send_welcome_email(to_email: str, raw_password: str) -> None:
+    """
+    Queues a welcome e-mail that includes the user’s credentials.
+    Delivery happens in the background; raises RuntimeError only if the
+    mail queue is full.
+    """
+    mail_queue.send(build_welcome_email(to_email, raw_password))
@@ -0,0 +1,141 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Room, UserProfile
+
+# Rooms are keyed by (residence_hall_id, room_number)
+RoomKey = Tuple[int, int]
+
+
+def load_unallocated_students(db: Session, residence_hall_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Profiles without a room, ordered by profile id; restricted to students
+    of one residence hall when residence_hall_id is given
+    """
+    statement = (
+        select(UserProfile.id, UserProfile.user_id, UserProfile.gender)
+        .where(UserProfile.room_number.is_(None))
+        .order_by(UserProfile.id)
+    )
+    if residence_hall_id is not None:
+        statement = statement.where(UserProfile.residence_hall_id == residence_hall_id)
+    return [
+        {'id': profile_id, 'user_id': user_id, 'gender': gender}
+        for profile_id, user_id, gender in db.execute(statement)
+    ]
+
+
+def load_open_rooms(db: Session, residence_hall_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Rooms with at least one free place, in (hall, room number) order"""
+    occupants = func.coalesce(Room.current_occupants, 0)
+    statement = (
+        select(Room.residence_hall_id, Room.room_number, Room.capacity, occupants)
+        .where(Room.capacity > occupants)
+        .order_by(Room.residence_hall_id, Room.room_number)
+    )
+    if residence_hall_id is not None:
+        statement = statement.where(Room.residence_hall_id == residence_hall_id)
+    return [
+        {
+            'residence_hall_id': hall_id,
+            'room_number': room_number,
+            'capacity': capacity,
+            'current_occupants': current
+        }
+        for hall_id, room_number, capacity, current in db.execute(statement)
+    ]
+
+
+def load_room_occupants(db: Session, residence_hall_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Every allocated profile with the room it lives in"""
+    statement = (
+        select(UserProfile.user_id, UserProfile.gender, UserProfile.residence_hall_id, UserProfile.room_number)
+        .where(UserProfile.room_number.is_not(None))
+    )
+    if residence_hall_id is not None:
+        statement = statement.where(UserProfile.residence_hall_id == residence_hall_id)
+    return [
+        {'user_id': user_id, 'gender': gender, 'room': (hall_id, room_number)}
+        for user_id, gender, hall_id, room_number in db.execute(statement)
+    ]
+
+
+def commit_allocations(
+    db: Session,
+    placements: List[Tuple[int, RoomKey]],
+    expected_occupants: Dict[RoomKey, int],
+    residence_hall_id: Optional[int] = None
+) -> Tuple[int, int]:
+    """
+    Write (profile id, room) placements and the rooms' new occupancy in
+    one transaction
+
+    Every write is conditional, so assignments made elsewhere after the
+    solver read the hall are never overwritten: a profile is only placed
+    while it still has no room, and a room's occupancy is only raised while
+    it still equals expected_occupants. A room that fails its check gets
+    none of its placements (its savepoint is rolled back); students who got
+    a room meanwhile are skipped.
+
+    Returns:
+    - (placements written, placements skipped)
+    """
+    by_room: Dict[RoomKey, List[int]] = {}
+    for profile_id, key in placements:
+        if residence_hall_id is not None and key[0] != residence_hall_id:
+            continue
+        by_room.setdefault(key, []).append(profile_id)
+
+    written = 0
+    try:
+        for key, profile_ids in by_room.items():
+            written += _place_in_room(db, key, profile_ids, expected_occupants.get(key))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return written, len(placements) - written
+
+
+def _place_in_room(db: Session, key: RoomKey, profile_ids: List[int], expected: Optional[int]) -> int:
+    """Place profiles into one room under a savepoint; returns how many were placed"""
+    if expected is None:
+        return 0
+
+    savepoint = db.begin_nested()
+    placed = 0
+    for profile_id in profile_ids:
+        result = db.execute(
+            update(UserProfile)
+            .where(UserProfile.id == profile_id, UserProfile.room_number.is_(None))
+            .values(residence_hall_id=key[0], room_number=key[1])
+        )
+        placed += result.rowcount
+    if not placed:
+        savepoint.rollback()
+        return 0
+
+    occupants = func.coalesce(Room.current_occupants, 0)
+    result = db.execute(
+        update(Room)
+        .where(
+            Room.residence_hall_id == key[0],
+            Room.room_number == key[1],
+            occupants == expected,
+            Room.capacity >= occupants + placed
+        )
+        .values(
+            current_occupants=occupants + placed,
+            is_available=occupants + placed < Room.capacity,
+            room_status=case((occupants + placed >= Room.capacity, "full"), else_="partially_occupied")
+        )
+    )
+    if result.rowcount != 1:
+        savepoint.rollback()  # Someone else changed the room
+        return 0
+
+    savepoint.commit()
+    return placed
@@ -0,0 +1,173 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..ml.encoding import FeatureVocabulary
+from ..models import Feedback, Option, Question, UserProfile, UserResponse
+
+# Rows fetched from the cursor per round trip
+DEFAULT_BATCH_SIZE = 5000
+
+# Answer codes in the response matrix for questions a user hasn't answered
+UNANSWERED = -1
+
+
+def load_questions(db: Session) -> List[Dict[str, Any]]:
+    """
+    Questions ordered by id, each with its option texts in Option.id order
+    """
+    options_by_question: Dict[int, List[str]] = {}
+    for question_id, option_text in db.execute(
+        select(Option.question_id, Option.option_text).order_by(Option.question_id, Option.id)
+    ):
+        options_by_question.setdefault(question_id, []).append(option_text)
+
+    return [
+        {
+            'id': question_id,
+            'question_text': question_text,
+            'category': category,
+            'options': options_by_question.get(question_id, [])
+        }
+        for question_id, question_text, category in db.execute(
+            select(Question.id, Question.question_text, Question.category).order_by(Question.id)
+        )
+    ]
+
+
+def load_profile_columns(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Stream the profile columns the matcher needs, ordered by profile id
+
+    Only the bio's length is selected, never the text itself. Numeric
+    columns come back as NumPy arrays (NaN where NULL); gender and majors
+    stay lists of strings because they are encoded through the vocabulary,
+    and move-in dates and room numbers are only used for candidate filters.
+    """
+    statement = (
+        select(
+            UserProfile.id,
+            UserProfile.user_id,
+            UserProfile.age,
+            UserProfile.gender,
+            UserProfile.majors,
+            UserProfile.residence_hall_id,
+            func.coalesce(func.length(UserProfile.bio), 0),
+            UserProfile.move_in_date,
+            UserProfile.room_number
+        )
+        .order_by(UserProfile.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    profile_ids, user_ids, ages, genders, majors, hall_ids, bio_lengths = [], [], [], [], [], [], []
+    move_in_dates, room_numbers = [], []
+    for partition in db.execute(statement).partitions():
+        columns = list(zip(*partition))
+        profile_ids.extend(columns[0])
+        user_ids.extend(columns[1])
+        ages.extend(columns[2])
+        genders.extend(columns[3])
+        majors.extend(columns[4])
+        hall_ids.extend(columns[5])
+        bio_lengths.extend(columns[6])
+        move_in_dates.extend(columns[7])
+        room_numbers.extend(columns[8])
+
+    return {
+        'profile_ids': np.asarray(profile_ids, dtype=np.int64),
+        'user_ids': np.asarray(user_ids, dtype=np.int64),
+        'age': np.asarray(ages, dtype=np.float64),  # None -> NaN
+        'gender': genders,
+        'majors': majors,
+        'residence_hall_id': np.asarray(hall_ids, dtype=np.float64),
+        'bio_length': np.asarray(bio_lengths, dtype=np.float64),
+        'move_in_date': move_in_dates,
+        'room_number': room_numbers,
+    }
+
+
+def load_rating_totals(db: Session, profile_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum and count of the ratings each profile has received, aggregated in
+    the database, aligned with profile_ids (which must be sorted)
+    """
+    sums = np.zeros(len(profile_ids))
+    counts = np.zeros(len(profile_ids))
+    rows = db.execute(
+        select(Feedback.receiver_user_id, func.sum(Feedback.rating), func.count(Feedback.id))
+        .group_by(Feedback.receiver_user_id)
+    ).all()
+    if not rows or not len(profile_ids):
+        return sums, counts
+
+    receivers, rating_sums, rating_counts = (np.asarray(column, dtype=np.float64) for column in zip(*rows))
+    positions = np.minimum(np.searchsorted(profile_ids, receivers), len(profile_ids) - 1)
+    known = profile_ids[positions] == receivers
+    sums[positions[known]] = rating_sums[known]
+    counts[positions[known]] = rating_counts[known]
+    return sums, counts
+
+
+def get_rating_totals(db: Session, profile_id: int) -> Tuple[float, int]:
+    """Sum and count of the ratings one profile has received"""
+    total, count = db.execute(
+        select(func.coalesce(func.sum(Feedback.rating), 0), func.count(Feedback.id))
+        .where(Feedback.receiver_user_id == profile_id)
+    ).one()
+    return float(total), int(count)
+
+
+def load_answer_matrix(
+    db: Session,
+    profile_ids: np.ndarray,
+    vocabulary: FeatureVocabulary,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> np.ndarray:
+    """
+    Stream every questionnaire response into a preallocated
+    (user, question) matrix of option slots
+
+    Rows follow profile_ids (which must be sorted) and columns follow
+    vocabulary.question_ids; cells hold the answer's slot within its
+    question (see FeatureVocabulary.answer_slot) or UNANSWERED. Responses
+    for profiles or questions that are not in the layout are skipped.
+    """
+    question_ids = np.asarray(vocabulary.question_ids, dtype=np.int64)
+    answers = np.full((len(profile_ids), len(question_ids)), UNANSWERED, dtype=np.int16)
+    if not len(profile_ids) or not len(question_ids):
+        return answers
+
+    statement = (
+        select(UserResponse.user_profile_id, UserResponse.question_id, UserResponse.selected_option)
+        .execution_options(yield_per=batch_size)
+    )
+
+    # Option texts repeat across users, so each (question, text) is resolved once
+    slot_cache: Dict[Tuple[int, str], int] = {}
+
+    for partition in db.execute(statement).partitions():
+        response_profiles, response_questions, selected = zip(*partition)
+
+        rows = np.searchsorted(profile_ids, response_profiles)
+        cols = np.searchsorted(question_ids, response_questions)
+        rows_clipped = np.minimum(rows, len(profile_ids) - 1)
+        cols_clipped = np.minimum(cols, len(question_ids) - 1)
+        known = (
+            (profile_ids[rows_clipped] == response_profiles)
+            & (question_ids[cols_clipped] == response_questions)
+        )
+
+        slots = np.empty(len(selected), dtype=np.int16)
+        for i, key in enumerate(zip(response_questions, selected)):
+            slot = slot_cache.get(key)
+            if slot is None:
+                slot = vocabulary.answer_slot(*key)
+                slot_cache[key] = slot = UNANSWERED if slot is None else slot
+            slots[i] = slot
+
+        answers[rows[known], cols[known]] = slots[known]
+
+    return answers
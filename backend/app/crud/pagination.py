@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+# A position in a (timestamp, id) ordering
+CursorKey = Tuple[datetime, int]
+
+
+def encode_cursor(key: CursorKey) -> str:
+    """Opaque, URL-safe cursor for a row's (timestamp, id)"""
+    timestamp, row_id = key
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """Raises ValueError if the cursor was not made by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_window(timestamp_column, id_column, before: Optional[str] = None, after: Optional[str] = None):
+    """
+    Filter and ordering for one page of rows ordered by (timestamp, id)
+
+    Pages go back in time from before (or from the newest row) or forward
+    from after. Either way the database walks an index on
+    (..., timestamp, id) from the cursor, so a deep page costs the same as
+    the first.
+
+    Returns:
+    - (predicate or None, order_by clauses, older): older is False when
+      paging forward, in which case rows come back oldest first
+    """
+    if before and after:
+        raise ValueError("Pass either before or after, not both")
+
+    key = tuple_(timestamp_column, id_column)
+    if after:
+        return key > tuple_(*decode_cursor(after)), [timestamp_column.asc(), id_column.asc()], False
+    predicate = key < tuple_(*decode_cursor(before)) if before else None
+    return predicate, [timestamp_column.desc(), id_column.desc()], True
+
+
+def keyset_page(
+    rows: Sequence[Any],
+    limit: int,
+    key: Callable[[Any], CursorKey],
+    older: bool,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Turn up to limit + 1 rows fetched in keyset_window order into a page,
+    newest first
+
+    Returns:
+    - items: The page's rows
+    - next_cursor: Pass as before for older rows; None when there are none
+    - prev_cursor: Pass as after for newer rows (also to poll for new ones)
+    """
+    has_more = len(rows) > limit
+    items: List[Any] = list(rows[:limit])
+    if not older:
+        items.reverse()
+
+    if older:
+        next_cursor = encode_cursor(key(items[-1])) if has_more else None
+    else:
+        # Paging forward from a row, so older rows always exist
+        next_cursor = encode_cursor(key(items[-1])) if items else cursor
+    prev_cursor = encode_cursor(key(items[0])) if items else cursor
+
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
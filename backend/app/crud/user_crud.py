@@ -5,7 +5,7 @@ from datetime import timedelta, datetime, timezone
 from ..models.user_model import AuthUser, UserProfile
 from ..schemas.user_schema import AuthUserCreate, UserProfileCreate, AuthUserResponse
 from ..database import SessionLocal  # Changed from session_factory
-from ..core.auth import hash_password, create_access_token, verify_password
+from ..core.auth import hash_password, create_access_token, verify_password, token_claims
 from ..core.config import Settings 
 
 def get_db():
@@ -83,10 +83,7 @@ def authenticate_user(msu_email: str, password: str, db: Session):
     # Create access token
     access_token_expires = timedelta(minutes=Settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={
-            "sub": auth_user.msu_email, 
-            "role": auth_user.role
-        }, 
+        data=token_claims(auth_user), 
         expires_delta=access_token_expires
     )
 
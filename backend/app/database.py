@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker, Session
-from typing import Generator
+from typing import Any, AsyncGenerator, Callable, Generator, TypeVar
 from .core.config import Settings  # Assuming you have a Settings class
 
 
@@ -13,6 +16,28 @@ engine = create_engine(
     max_overflow=20  # Additional connections for peak load
 )
 
+# asyncio drivers for the same database, used by the async engine
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str):
+    """DATABASE_URL with its driver swapped for an asyncio one"""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+# Async engine for async def handlers, so they await database I/O instead
+# of blocking the event loop
+async_engine = create_async_engine(
+    async_database_url(Settings.DATABASE_URL),
+    echo=False,
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
 # Base class for declarative models
 class Base(DeclarativeBase):
     pass
@@ -24,6 +49,13 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Objects stay loaded after commit: lazy loads can't run outside an await
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Dependency to get database session
 def get_db() -> Generator[Session, None, None]:
     """
@@ -38,6 +70,40 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency that provides an async database session for async def
+    handlers. Sync service code can run on it with
+    `await db.run_sync(lambda session: ...)`; relationships that the
+    response needs must be loaded before returning (e.g. db.refresh(obj, ["members"])).
+    
+    :yield: Async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+T = TypeVar("T")
+
+# Threads for blocking database work started from async handlers (WebSockets),
+# sized to the connection pool so they don't queue on it
+db_executor = ThreadPoolExecutor(max_workers=Settings.DB_EXECUTOR_THREADS, thread_name_prefix="db")
+
+async def run_in_db_session(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run function(db, *args, **kwargs) on the database thread pool with a
+    session of its own, so blocking queries and commits don't stall the
+    event loop. The session is closed afterwards; return plain data, not
+    ORM objects that would lazy-load on the event loop.
+    """
+    def call() -> T:
+        db = SessionLocal()
+        try:
+            return function(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await asyncio.get_running_loop().run_in_executor(db_executor, call)
+
 def create_tables():
     """
     Create all tables defined in the models.
@@ -1,9 +1,10 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .database import engine, Base
+from .database import engine, async_engine, Base
 from .api.routes.users_routes import router as users_router
 from .api.routes.residence_halls_routes import router as residence_halls_router
 from .api.routes.rooms_routes import router as room_router
@@ -16,6 +17,13 @@ from .api.routes.feedbacks_routes import router as feedback_router
 from .api.routes.message_routes import router as message_router
 from .api.routes.group_routes import router as group_router
 from .api.routes.compatibility_routes import router as compatibility_router
+from .api.routes.allocation_routes import router as allocation_router
+from .api.routes.conversation_routes import router as conversation_router
+from .services.compatibility_services import index_manager
+from .websockets.broker import broker
+from .services.message_writer import message_writer
+from .services.chat_cache import chat_cache
+from .core.email_utils import mail_queue
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -28,11 +36,30 @@ async def lifespan(app: FastAPI):
     # Create all database tables on startup
     Base.metadata.create_all(bind=engine)
     
+    # Warm the compatibility index so the first match request doesn't pay for it
+    index_manager.rebuild_in_background()
+
+    # Chat fan-out across workers
+    await broker.start()
+    chat_cache.start()
+
+    # Batched chat message inserts
+    await message_writer.start()
+
+    # Outbound e-mail is sent from a background thread
+    mail_queue.start()
+
     # Any additional startup tasks can be added here
     print("Application is starting up...")
     
     yield
     
+    # Save queued chat messages before the broker goes away
+    await message_writer.stop()
+    await broker.stop()
+    await run_in_threadpool(mail_queue.stop)
+    await async_engine.dispose()
+
     # Any cleanup tasks can be added here
     print("Application is shutting down...")
 
@@ -78,4 +105,6 @@ app.include_router(feedback_router, prefix="/api")
 app.include_router(message_router, prefix="/api")
 app.include_router(message_router, prefix="/api")
 app.include_router(group_router, prefix="/api")
-app.include_router(compatibility_router, prefix="/api")
\ No newline at end of file
+app.include_router(compatibility_router, prefix="/api")
+app.include_router(allocation_router, prefix="/api")
+app.include_router(conversation_router, prefix="/api")
\ No newline at end of file
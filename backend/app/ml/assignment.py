@@ -0,0 +1,264 @@
+# app/ml/assignment.py
+
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .similarity import all_pairs_top_k
+
+# Rooms without an occupant yet accept any group
+OPEN_ROOM = -1
+
+# Improvements smaller than this are treated as noise
+_EPSILON = 1e-9
+
+ProgressCallback = Callable[[float, str], None]
+
+
+class Assignment:
+    """
+    Result of assign_roommates
+
+    - room_of: Room index for every student, or -1 if no room was left
+    - objective: Sum of pairwise cosine similarities inside every room
+      (existing occupants included)
+    - greedy_objective: The same sum right after greedy seeding
+    - swaps, moves: Improvements applied by the local search
+    """
+
+    def __init__(self, room_of: np.ndarray, objective: float, greedy_objective: float, swaps: int, moves: int):
+        self.room_of = room_of
+        self.objective = objective
+        self.greedy_objective = greedy_objective
+        self.swaps = swaps
+        self.moves = moves
+
+    @property
+    def unplaced(self) -> int:
+        return int(np.count_nonzero(self.room_of < 0))
+
+
+def _objective(room_sums: np.ndarray, room_sizes: np.ndarray, room_self: np.ndarray) -> float:
+    # sum over pairs of v_i . v_j == (|S|^2 - sum_i |v_i|^2) / 2 for each room
+    return float((np.einsum("ij,ij->i", room_sums, room_sums) - room_self).sum() / 2)
+
+
+def assign_roommates(
+    vectors: np.ndarray,
+    room_capacity: np.ndarray,
+    room_sums: Optional[np.ndarray] = None,
+    room_self: Optional[np.ndarray] = None,
+    groups: Optional[np.ndarray] = None,
+    room_groups: Optional[np.ndarray] = None,
+    n_neighbours: int = 30,
+    max_seconds: float = 10.0,
+    max_passes: int = 20,
+    progress: Optional[ProgressCallback] = None
+) -> Assignment:
+    """
+    Assign students to rooms so that the total compatibility inside rooms
+    is as high as possible
+
+    Greedy seeding fills partly occupied rooms with the students closest to
+    their occupants, then opens empty rooms one at a time, seeding each with
+    the unplaced student that has the strongest best match and filling it
+    from the occupants' nearest neighbours. A local search then applies the
+    best improving swap (or move into a free slot) among each student's
+    neighbours' rooms until a pass finds nothing or time runs out.
+
+    Parameters:
+    - vectors: L2-normalised feature vectors of the students to place
+    - room_capacity: Free places in every room
+    - room_sums: Sum of the vectors of every room's existing occupants
+    - room_self: Sum of |v|^2 of every room's existing occupants
+    - groups: Optional group code per student (e.g. gender); rooms never mix groups
+    - room_groups: Group of every room's existing occupants (0 when groups
+      aren't used), OPEN_ROOM if the room is empty
+    - n_neighbours: Nearest neighbours considered per student
+    - max_seconds: Time budget; the local search stops when it runs out
+    - max_passes: Maximum number of local-search passes
+    - progress: Called with (fraction done, message)
+
+    Returns:
+    - Assignment
+    """
+    started = time.perf_counter()
+    report = progress or (lambda fraction, message: None)
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+    n_students, dim = vectors.shape
+    n_rooms = len(room_capacity)
+
+    free = np.asarray(room_capacity, dtype=np.int64).copy()
+    sums = np.zeros((n_rooms, dim)) if room_sums is None else np.array(room_sums, dtype=np.float64)
+    self_sums = np.zeros(n_rooms) if room_self is None else np.array(room_self, dtype=np.float64)
+    sizes = np.zeros(n_rooms, dtype=np.int64)  # Placed students per room (occupants excluded)
+    groups = np.zeros(n_students, dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    room_group = (
+        np.full(n_rooms, OPEN_ROOM, dtype=np.int64) if room_groups is None
+        else np.asarray(room_groups, dtype=np.int64).copy()
+    )
+    occupied = room_group != OPEN_ROOM
+    squared = np.einsum("ij,ij->i", vectors, vectors)
+
+    room_of = np.full(n_students, -1, dtype=np.int64)
+    members: List[List[int]] = [[] for _ in range(n_rooms)]
+
+    def place(student: int, room: int) -> None:
+        room_of[student] = room
+        members[room].append(student)
+        sums[room] += vectors[student]
+        self_sums[room] += squared[student]
+        sizes[room] += 1
+        free[room] -= 1
+        room_group[room] = groups[student]
+
+    def best_unplaced(room: int, candidates: np.ndarray) -> int:
+        candidates = candidates[(room_of[candidates] < 0) & (groups[candidates] == room_group[room])]
+        if not len(candidates):
+            return -1
+        return int(candidates[np.argmax(vectors[candidates] @ sums[room])])
+
+    if n_students == 0 or n_rooms == 0:
+        return Assignment(room_of, 0.0, 0.0, 0, 0)
+
+    report(0.0, "Finding nearest neighbours")
+    neighbours, similarities = all_pairs_top_k(vectors, k=n_neighbours)
+    everyone = np.arange(n_students)
+
+    # ── Greedy seeding ─────────────────────────────────────────────────────
+    report(0.1, "Filling partly occupied rooms")
+    for room in np.flatnonzero(occupied & (free > 0)):
+        while free[room] > 0:
+            student = best_unplaced(room, everyone)
+            if student < 0:
+                break
+            place(student, room)
+
+    report(0.2, "Opening empty rooms")
+    # Students with the strongest best match open rooms first
+    best_match = similarities[:, 0] if similarities.shape[1] else np.zeros(n_students)
+    seeds = np.argsort(-best_match, kind="stable")
+    empty_rooms = iter(np.flatnonzero(~occupied & (free > 0)).tolist())
+    room = next(empty_rooms, None)
+
+    for seed in seeds.tolist():
+        if room is None:
+            break
+        if room_of[seed] >= 0:
+            continue
+        place(seed, room)
+        while free[room] > 0:
+            student = best_unplaced(room, neighbours[members[room]].ravel())
+            if student < 0:
+                student = best_unplaced(room, everyone)  # Neighbours all taken
+            if student < 0:
+                break
+            place(student, room)
+        room = next(empty_rooms, None)
+
+    greedy_objective = _objective(sums, sizes, self_sums)
+
+    # ── Local search ──────────────────────────────────────────────────────
+    swaps = moves = 0
+    for pass_number in range(max_passes):
+        elapsed = time.perf_counter() - started
+        if elapsed > max_seconds:
+            break
+        report(0.3 + 0.7 * min(elapsed / max_seconds, pass_number / max_passes), f"Local search pass {pass_number + 1}")
+
+        improved = 0
+        for student in range(n_students):
+            home = room_of[student]
+            v = vectors[student]
+            home_sum = sums[home] if home >= 0 else np.zeros(dim)
+            # Current contribution of this student to its room
+            stay = v @ home_sum - squared[student] if home >= 0 else 0.0
+
+            rooms = np.unique(room_of[neighbours[student]])
+            rooms = rooms[(rooms >= 0) & (rooms != home)]
+            if not len(rooms):
+                continue
+
+            best_delta, best_room, best_partner = _EPSILON, -1, -1
+
+            # Move into a free slot of a compatible room
+            open_rooms = rooms[(free[rooms] > 0) & ((room_group[rooms] == groups[student]) | (room_group[rooms] == OPEN_ROOM))]
+            if len(open_rooms):
+                gains = sums[open_rooms] @ v - stay
+                pick = int(np.argmax(gains))
+                if gains[pick] > best_delta:
+                    best_delta, best_room = gains[pick], int(open_rooms[pick])
+
+            # Swap with a student of the same group in a neighbour's room
+            partners = np.fromiter(
+                (other for r in rooms.tolist() for other in members[r]),
+                dtype=np.int64
+            )
+            partners = partners[groups[partners] == groups[student]]
+            if len(partners):
+                partner_vectors = vectors[partners]
+                partner_sums = sums[room_of[partners]]
+                cross = partner_vectors @ v
+                # i joins the partner's room without the partner, and vice versa
+                gain_student = partner_sums @ v - cross
+                gain_partner = (partner_vectors @ home_sum - cross) if home >= 0 else 0.0
+                partner_stay = np.einsum("ij,ij->i", partner_vectors, partner_sums) - squared[partners]
+                deltas = gain_student + gain_partner - stay - partner_stay
+                pick = int(np.argmax(deltas))
+                if deltas[pick] > best_delta:
+                    best_delta, best_room, best_partner = deltas[pick], int(room_of[partners[pick]]), int(partners[pick])
+
+            if best_room < 0:
+                continue
+
+            if best_partner >= 0:
+                _swap(student, best_partner, room_of, members, sums, self_sums, vectors, squared)
+                swaps += 1
+            else:
+                _move(student, best_room, room_of, members, sums, self_sums, sizes, free, vectors, squared)
+                if home >= 0 and not members[home] and not occupied[home]:
+                    room_group[home] = OPEN_ROOM
+                room_group[best_room] = groups[student]
+                moves += 1
+            improved += 1
+
+            if time.perf_counter() - started > max_seconds:
+                break
+
+        if not improved:
+            break
+
+    report(1.0, "Done")
+    return Assignment(room_of, _objective(sums, sizes, self_sums), greedy_objective, swaps, moves)
+
+
+def _swap(a, b, room_of, members, sums, self_sums, vectors, squared) -> None:
+    room_a, room_b = room_of[a], room_of[b]
+    members[room_b].remove(b)
+    members[room_b].append(a)
+    sums[room_b] += vectors[a] - vectors[b]
+    self_sums[room_b] += squared[a] - squared[b]
+    if room_a >= 0:
+        members[room_a].remove(a)
+        members[room_a].append(b)
+        sums[room_a] += vectors[b] - vectors[a]
+        self_sums[room_a] += squared[b] - squared[a]
+    room_of[a], room_of[b] = room_b, room_a
+
+
+def _move(student, room, room_of, members, sums, self_sums, sizes, free, vectors, squared) -> None:
+    home = room_of[student]
+    if home >= 0:
+        members[home].remove(student)
+        sums[home] -= vectors[student]
+        self_sums[home] -= squared[student]
+        sizes[home] -= 1
+        free[home] += 1
+    members[room].append(student)
+    sums[room] += vectors[student]
+    self_sums[room] += squared[student]
+    sizes[room] += 1
+    free[room] -= 1
+    room_of[student] = room
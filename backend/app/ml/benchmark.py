@@ -0,0 +1,336 @@
+# app/ml/benchmark.py
+"""
+Benchmarks for the matching pipeline.
+
+Run from the backend directory, e.g.:
+
+    python -m app.ml.benchmark --users 1000 10000 100000 --output bench.json
+
+For each population size a synthetic population (see ml.synthetic) is
+generated in memory and every stage MatchingService runs is timed: feature
+extraction, normalization, index build, all-pairs top-k, and per-query
+top-k for exact search and every approximate backend (with recall@k
+against exact). The JSON report carries latency percentiles and the
+process's peak RSS after each stage; every size runs in a fresh process so
+the peaks don't carry over. Pass --baseline with an earlier report to exit
+non-zero when a stage got slower, heavier or less accurate than allowed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .ann_index import ANN_BACKENDS
+from .candidate_filter import CandidateFilter, ProfileAttributes
+from .compatibility_index import CompatibilityIndex
+from .encoding import FeatureVocabulary
+from .feature_extraction import encode_feature_matrix
+from .feature_store import IncrementalFeatureStore
+from .synthetic import synthetic_population
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000  # seconds -> ms
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def _time_stage(function: Callable[[], Any], repeat: int = 1) -> Tuple[Any, Dict[str, Any]]:
+    """Run function repeat times; returns the last result and its timings"""
+    durations = []
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return result, {
+        "seconds": float(np.median(durations)),
+        "min_seconds": float(np.min(durations)),
+        "runs": len(durations),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _query_latencies(
+    index: CompatibilityIndex,
+    queries: List[int],
+    k: int,
+    mode: str,
+    filters: Optional[CandidateFilter] = None
+) -> Tuple[List[float], List[List[int]]]:
+    times, results = [], []
+    for user_id in queries:
+        started = time.perf_counter()
+        matches = index.top_k(user_id, k, mode=mode, filters=filters)
+        times.append(time.perf_counter() - started)
+        results.append([uid for uid, _ in matches])
+    return times, results
+
+
+def benchmark_population(
+    n_users: int,
+    k: int = 10,
+    n_queries: int = 200,
+    n_questions: int = 8,
+    n_personas: int = 20,
+    backends: Optional[List[str]] = None,
+    ann_params: Optional[Dict[str, Dict[str, Any]]] = None,
+    block_size: int = 1024,
+    n_jobs: int = 1,
+    rating_weight: float = 0.0,
+    all_pairs_max_users: Optional[int] = None,
+    repeat: int = 1,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Time every matching stage on a synthetic population of n_users
+
+    Parameters:
+    - n_users: Population size
+    - k: Matches per user for all-pairs and per-query top-k
+    - n_queries: Users queried for the top-k latency percentiles
+    - n_questions, n_personas: Shape of the synthetic questionnaire
+    - backends: Approximate backends to measure (default: all registered)
+    - ann_params: Parameters per backend name
+    - block_size, n_jobs: All-pairs tile size and worker processes
+    - rating_weight: Share of peer feedback in match scores
+    - all_pairs_max_users: Skip all-pairs above this size (None: never)
+    - repeat: Runs per stage; the median is reported
+    - seed: Random seed for the population and the queries
+
+    Returns:
+    - Dictionary with per-stage timings and peak RSS, and top-k latency
+      percentiles (plus recall@k for approximate backends)
+    """
+    backends = sorted(ANN_BACKENDS) if backends is None else backends
+    ann_params = ann_params or {}
+    stages: Dict[str, Any] = {}
+
+    (profiles, answers, questions), stages["generate"] = _time_stage(
+        lambda: synthetic_population(n_users, n_questions=n_questions, n_personas=n_personas, seed=seed)
+    )
+
+    def extract() -> Tuple[FeatureVocabulary, np.ndarray]:
+        vocabulary = FeatureVocabulary.from_columns(profiles['majors'], questions)
+        return vocabulary, encode_feature_matrix(profiles, answers, vocabulary)
+
+    (vocabulary, raw), stages["extraction"] = _time_stage(extract, repeat)
+    attributes, stages["attributes"] = _time_stage(lambda: ProfileAttributes.from_profile_columns(profiles), repeat)
+
+    user_ids = profiles['user_ids'].tolist()
+
+    def normalize() -> IncrementalFeatureStore:
+        store = IncrementalFeatureStore(user_ids, raw, vocabulary=vocabulary, attributes=attributes)
+        store.normalized_matrix()
+        return store
+
+    store, stages["normalization"] = _time_stage(normalize, repeat)
+    vectors = store.normalized_matrix()
+
+    def build(backend: str = "lsh") -> CompatibilityIndex:
+        return CompatibilityIndex(
+            user_ids,
+            vectors,
+            ann_backend=backend,
+            ann_params=ann_params.get(backend),
+            attributes=attributes,
+            rating_weight=rating_weight
+        )
+
+    index, stages["index_build"] = _time_stage(build, repeat)
+
+    if all_pairs_max_users is not None and n_users > all_pairs_max_users:
+        stages["all_pairs"] = {"skipped": True}
+    else:
+        _, stages["all_pairs"] = _time_stage(lambda: index.all_top_k(k, block_size=block_size, n_jobs=n_jobs), repeat)
+        stages["all_pairs"].update(block_size=block_size, workers=n_jobs)
+
+    # ── Per-query top-k ───────────────────────────────────────────────────
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(user_ids, size=min(n_queries, n_users), replace=False).tolist()
+    top_k: Dict[str, Any] = {}
+
+    exact_times, exact_results = _query_latencies(index, queries, k, "exact")
+    top_k["exact"] = _percentiles(exact_times)
+
+    filters = CandidateFilter(gender="female", unallocated_only=True)
+    filtered_times, _ = _query_latencies(index, queries, k, "exact", filters)
+    top_k["exact_filtered"] = _percentiles(filtered_times)
+
+    for backend in backends:
+        backend_index = index if backend == index.ann_backend else build(backend)
+        started = time.perf_counter()
+        backend_index.ann  # Build the backend up front so it isn't counted as query time
+        build_seconds = time.perf_counter() - started
+
+        times, results = _query_latencies(backend_index, queries, k, "approximate")
+        recalls = [
+            len(set(expected) & set(found)) / max(len(expected), 1)
+            for expected, found in zip(exact_results, results)
+        ]
+        top_k[backend] = {
+            **_percentiles(times),
+            "recall_at_k": float(np.mean(recalls)),
+            "build_seconds": build_seconds,
+            "params": ann_params.get(backend, {}),
+        }
+
+    return {
+        "users": n_users,
+        "dim": int(vectors.shape[1]),
+        "k": k,
+        "queries": len(queries),
+        "stages": stages,
+        "top_k": top_k,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_isolated(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """benchmark_population in a fresh process, so its peak RSS is its own"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(benchmark_population, **kwargs).result()
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.25,
+    recall_tolerance: float = 0.02,
+    min_delta_ms: float = 5.0,
+    min_delta_mb: float = 32.0
+) -> List[str]:
+    """
+    Regressions of current against baseline, matched by population size:
+    stage times, top-k p95 latency or peak RSS more than tolerance
+    (relative) above the baseline, or recall more than recall_tolerance
+    (absolute) below it. Increases under min_delta_ms / min_delta_mb are
+    timer and allocator noise and never count.
+
+    Returns:
+    - One message per regression (empty if none)
+    """
+    regressions = []
+    previous_runs = {run["users"]: run for run in baseline.get("runs", [])}
+
+    def check(label: str, old: Optional[float], new: Optional[float], min_delta: float) -> None:
+        if old is None or new is None or old <= 0:
+            return
+        if new > old * (1 + tolerance) and new - old > min_delta:
+            regressions.append(f"{label}: {new:.4g} vs baseline {old:.4g} (+{(new / old - 1) * 100:.0f}%)")
+
+    for run in current.get("runs", []):
+        previous = previous_runs.get(run["users"])
+        if previous is None:
+            continue
+        prefix = f"{run['users']} users"
+
+        for stage, timing in run["stages"].items():
+            check(f"{prefix} {stage} seconds", previous["stages"].get(stage, {}).get("seconds"), timing.get("seconds"), min_delta_ms / 1000)
+
+        for mode, stats in run["top_k"].items():
+            old_stats = previous["top_k"].get(mode, {})
+            check(f"{prefix} top-k {mode} p95_ms", old_stats.get("p95_ms"), stats.get("p95_ms"), min_delta_ms)
+            if "recall_at_k" in stats and "recall_at_k" in old_stats:
+                if stats["recall_at_k"] < old_stats["recall_at_k"] - recall_tolerance:
+                    regressions.append(
+                        f"{prefix} top-k {mode} recall_at_k: {stats['recall_at_k']:.3f} "
+                        f"vs baseline {old_stats['recall_at_k']:.3f}"
+                    )
+
+        check(f"{prefix} peak_rss_mb", previous.get("peak_rss_mb"), run.get("peak_rss_mb"), min_delta_mb)
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Matching pipeline benchmark on synthetic populations")
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--questions", type=int, default=8)
+    parser.add_argument("--personas", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=sorted(ANN_BACKENDS), choices=sorted(ANN_BACKENDS))
+    parser.add_argument("--tables", type=int, default=32, help="LSH hash tables")
+    parser.add_argument("--bits", type=int, default=None, help="LSH bits per table (default: from --users)")
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1, help="All-pairs worker processes")
+    parser.add_argument("--all-pairs-max-users", type=int, default=None, help="Skip all-pairs above this size")
+    parser.add_argument("--rating-weight", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage (median reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-isolate", action="store_true", help="Run every size in this process")
+    parser.add_argument("--output", help="Write the report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for n_users in args.users:
+        kwargs = dict(
+            n_users=n_users,
+            k=args.k,
+            n_queries=args.queries,
+            n_questions=args.questions,
+            n_personas=args.personas,
+            backends=args.backends,
+            ann_params={"lsh": {"n_tables": args.tables, "n_bits": args.bits}},
+            block_size=args.block_size,
+            n_jobs=args.workers,
+            rating_weight=args.rating_weight,
+            all_pairs_max_users=args.all_pairs_max_users,
+            repeat=args.repeat,
+            seed=args.seed
+        )
+        runs.append(benchmark_population(**kwargs) if args.no_isolate else _run_isolated(kwargs))
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "runs": runs,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# app/ml/candidate_filter.py
+
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .encoding import gender_slot
+from .scoring import rating_scores
+
+ATTRIBUTE_COLUMNS = (
+    "residence_hall_id", "gender", "move_in", "age", "allocated", "rating_sum", "rating_count"
+)
+
+
+def to_epoch(value: Any) -> float:
+    """
+    Seconds since the epoch for a date or datetime (naive values are taken
+    as UTC), or NaN for None
+    """
+    if value is None:
+        return float("nan")
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CandidateFilter:
+    """
+    Restrictions on who may be proposed as a match. Every criterion left as
+    None (or False) is not applied.
+    """
+
+    def __init__(
+        self,
+        residence_hall_id: Optional[int] = None,
+        gender: Optional[str] = None,
+        move_in_from: Optional[date] = None,
+        move_in_to: Optional[date] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        unallocated_only: bool = False
+    ):
+        self.residence_hall_id = residence_hall_id
+        self.gender = gender
+        self.move_in_from = move_in_from
+        self.move_in_to = move_in_to
+        self.min_age = min_age
+        self.max_age = max_age
+        self.unallocated_only = unallocated_only
+
+    @property
+    def is_empty(self) -> bool:
+        return (
+            self.residence_hall_id is None
+            and self.gender is None
+            and self.move_in_from is None
+            and self.move_in_to is None
+            and self.min_age is None
+            and self.max_age is None
+            and not self.unallocated_only
+        )
+
+    @property
+    def equality_key(self) -> Optional[Tuple[Any, ...]]:
+        """
+        Hashable key when the filter uses only equality criteria (hall,
+        gender, allocation), whose candidate sets are worth caching;
+        None when it also has a range criterion
+        """
+        if (
+            self.move_in_from is not None
+            or self.move_in_to is not None
+            or self.min_age is not None
+            or self.max_age is not None
+        ):
+            return None
+        return (
+            self.residence_hall_id,
+            gender_slot(self.gender) if self.gender is not None else None,
+            self.unallocated_only
+        )
+
+
+class ProfileAttributes:
+    """
+    Profile attributes used to filter and score candidates, one row per
+    user in the same row order as the feature store and the
+    CompatibilityIndex. Besides the filterable columns, every row carries
+    the sum and count of the ratings the user has received.
+
+    Equality criteria (hall, gender, allocation) resolve to boolean masks
+    that are cached until the next change; range criteria (move-in date,
+    age) are a single vectorised comparison. Either way a filter costs
+    O(N) cheap comparisons and shrinks the set of rows that get scored.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        size = len(columns["residence_hall_id"])
+        self._columns = {
+            "residence_hall_id": np.asarray(columns["residence_hall_id"], dtype=np.float64),
+            "gender": np.asarray(columns["gender"], dtype=np.int8),
+            "move_in": np.asarray(columns["move_in"], dtype=np.float64),
+            "age": np.asarray(columns["age"], dtype=np.float64),
+            "allocated": np.asarray(columns["allocated"], dtype=bool),
+            "rating_sum": np.asarray(columns["rating_sum"], dtype=np.float64),
+            "rating_count": np.asarray(columns["rating_count"], dtype=np.float64),
+        }
+        if any(len(values) != size for values in self._columns.values()):
+            raise ValueError("attribute columns must have the same length")
+        self._size = size
+        self._cache: Dict[Tuple[Any, ...], np.ndarray] = {}
+
+    @classmethod
+    def from_profile_columns(cls, profile_columns: Dict[str, Any]) -> "ProfileAttributes":
+        """
+        Build from the columns of crud.matching_crud.load_profile_columns,
+        plus optional 'rating_sum' and 'rating_count' columns
+        """
+        n_users = len(profile_columns['user_ids'])
+        return cls({
+            "residence_hall_id": profile_columns['residence_hall_id'],
+            "gender": [gender_slot(gender) for gender in profile_columns['gender']],
+            "move_in": [to_epoch(value) for value in profile_columns['move_in_date']],
+            "age": profile_columns['age'],
+            "allocated": [room is not None for room in profile_columns['room_number']],
+            "rating_sum": profile_columns.get('rating_sum', np.zeros(n_users)),
+            "rating_count": profile_columns.get('rating_count', np.zeros(n_users)),
+        })
+
+    @staticmethod
+    def row_from_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Filter attribute values for one profile dictionary (ratings are kept)"""
+        hall_id = profile.get('residence_hall_id')
+        age = profile.get('age')
+        return {
+            "residence_hall_id": float(hall_id) if hall_id is not None else np.nan,
+            "gender": gender_slot(profile.get('gender')),
+            "move_in": to_epoch(profile.get('move_in_date')),
+            "age": float(age) if age is not None else np.nan,
+            "allocated": profile.get('room_number') is not None,
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def set_row(self, row: int, values: Dict[str, Any]) -> None:
+        """
+        Write the given columns of one row, appending a zeroed row when
+        row == len(self)
+        """
+        if row == self._size:
+            self._reserve(row + 1)
+            for column in self._columns.values():
+                column[row] = 0
+            self._size += 1
+        for name, value in values.items():
+            self._columns[name][row] = value
+        self._cache.clear()
+
+    def add_rating(self, row: int, rating_delta: float, count_delta: int) -> None:
+        """Apply a change in the ratings one user has received"""
+        self._columns["rating_sum"][row] += rating_delta
+        self._columns["rating_count"][row] += count_delta
+        self._cache.clear()
+
+    def rating_scores(self, prior_mean: float, prior_count: float) -> np.ndarray:
+        """Peer-feedback score (0-100) of every row, cached until the next change"""
+        key = ("rating_scores", prior_mean, prior_count)
+        scores = self._cache.get(key)
+        if scores is None:
+            scores = self._cache[key] = rating_scores(
+                self.column("rating_sum"), self.column("rating_count"), prior_mean, prior_count
+            )
+        return scores
+
+    def remove_row(self, row: int) -> None:
+        """Drop a row, moving the last row into its slot"""
+        last = self._size - 1
+        if row != last:
+            for values in self._columns.values():
+                values[row] = values[last]
+        self._size -= 1
+        self._cache.clear()
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._columns["age"])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name, values in self._columns.items():
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            self._columns[name] = grown
+
+    def _equal_mask(self, name: str, value: Any) -> np.ndarray:
+        key = (name, value)
+        mask = self._cache.get(key)
+        if mask is None:
+            mask = self._cache[key] = self.column(name) == value
+        return mask
+
+    def mask(self, filters: CandidateFilter) -> np.ndarray:
+        """Boolean mask of the rows that satisfy every criterion"""
+        mask = np.ones(self._size, dtype=bool)
+
+        if filters.residence_hall_id is not None:
+            mask &= self._equal_mask("residence_hall_id", float(filters.residence_hall_id))
+        if filters.gender is not None:
+            mask &= self._equal_mask("gender", gender_slot(filters.gender))
+        if filters.unallocated_only:
+            mask &= self._equal_mask("allocated", False)
+
+        # NaN compares False, so users without a value are excluded by ranges
+        if filters.move_in_from is not None:
+            mask &= self.column("move_in") >= to_epoch(filters.move_in_from)
+        if filters.move_in_to is not None:
+            # Inclusive of the whole end day when given as a date
+            end = filters.move_in_to
+            mask &= self.column("move_in") < to_epoch(end) + (0 if isinstance(end, datetime) else 86400)
+        if filters.min_age is not None:
+            mask &= self.column("age") >= filters.min_age
+        if filters.max_age is not None:
+            mask &= self.column("age") <= filters.max_age
+
+        return mask
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {f"attr_{name}": self.column(name) for name in ATTRIBUTE_COLUMNS}
+
+    @classmethod
+    def from_arrays(cls, data: Any) -> Optional["ProfileAttributes"]:
+        if any(f"attr_{name}" not in data for name in ATTRIBUTE_COLUMNS):
+            return None
+        return cls({name: data[f"attr_{name}"] for name in ATTRIBUTE_COLUMNS})
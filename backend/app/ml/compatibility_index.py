@@ -0,0 +1,281 @@
+# app/ml/compatibility_index.py
+
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ann_index import ApproximateIndex, make_ann_index
+from .candidate_filter import CandidateFilter, ProfileAttributes
+from .scoring import similarity_weight
+from .similarity import all_pairs_top_k, get_top_matches, get_top_matches_among
+
+SEARCH_MODES = ("exact", "approximate")
+
+# Gathered candidate matrices kept for repeated equality-only filters
+MAX_CACHED_SUBSETS = 16
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale every row of a matrix to unit L2 norm (zero rows stay zero)
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class CompatibilityIndex:
+    """
+    In-memory index of precomputed, L2-normalised user feature vectors.
+
+    Because every row has unit length, the cosine similarity between two
+    users is a single dot product and one user's similarity to everybody
+    else is a single matrix-vector product, so no N x N matrix is ever built.
+    Approximate search builds an ANN backend lazily on first use and keeps
+    it in sync with upsert/remove. Candidate filters are resolved against
+    ProfileAttributes kept in the same row order (owned and updated by the
+    feature store), so a filtered query only scores the rows that pass.
+    The rows of common equality-only filters (a hall, a gender, unallocated
+    users) are gathered once and cached until the index changes.
+
+    With a rating_weight above zero, top-k scores blend the questionnaire
+    similarity with the candidate's peer-feedback score:
+    (1 - rating_weight) * similarity + rating_weight * rating. This ranks
+    one user's candidates; a pair's compatibility stays pure similarity so
+    it is the same whichever user asks.
+    """
+
+    def __init__(
+        self,
+        user_ids: List[int],
+        vectors: np.ndarray,
+        built_at: Optional[float] = None,
+        ann_backend: str = "lsh",
+        ann_params: Optional[Dict[str, Any]] = None,
+        attributes: Optional[ProfileAttributes] = None,
+        rating_weight: float = 0.0,
+        rating_prior: Tuple[float, float] = (3.0, 5.0)
+    ):
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if vectors.ndim != 2 or vectors.shape[0] != len(user_ids):
+            raise ValueError("vectors must have one row per user")
+
+        self.user_ids: List[int] = [int(uid) for uid in user_ids]
+        self.row_of: Dict[int, int] = {uid: row for row, uid in enumerate(self.user_ids)}
+        self._vectors = _unit_rows(vectors)
+        self.built_at = built_at if built_at is not None else time.time()
+        self.attributes = attributes
+        self.rating_weight = rating_weight
+        self.similarity_weight = similarity_weight(rating_weight)
+        self.rating_prior = rating_prior
+
+        self.ann_backend = ann_backend
+        self.ann_params = ann_params or {}
+        self._ann: Optional[ApproximateIndex] = None
+        self._ann_lock = threading.Lock()
+        self._subsets: Dict[Tuple[Any, ...], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.row_of
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Unit-length feature matrix, one row per user in user_ids order"""
+        return self._vectors[:len(self.user_ids)]
+
+    @property
+    def age(self) -> float:
+        """Seconds since the index was built"""
+        return time.time() - self.built_at
+
+    def _rating_bias(self) -> Optional[np.ndarray]:
+        """Weighted peer-feedback score of every row, or None when unused"""
+        if self.rating_weight == 0 or self.attributes is None:
+            return None
+        # A concurrent update may have resized the attributes first
+        bias = np.zeros(len(self))
+        scores = self.attributes.rating_scores(*self.rating_prior)[:len(bias)]
+        bias[:len(scores)] = self.rating_weight * scores
+        return bias
+
+    def similarity(self, user1_id: int, user2_id: int) -> Optional[float]:
+        """
+        Cosine similarity in [-1, 1] between two indexed users, or None if
+        either user is not in the index
+        """
+        row1 = self.row_of.get(user1_id)
+        row2 = self.row_of.get(user2_id)
+        if row1 is None or row2 is None:
+            return None
+        return float(self._vectors[row1] @ self._vectors[row2])
+
+    def top_k(
+        self,
+        user_id: int,
+        n: int = 10,
+        skip: int = 0,
+        mode: str = "exact",
+        filters: Optional[CandidateFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Get the top N most compatible users for a given user, after skipping
+        the best ``skip`` matches
+
+        Parameters:
+        - mode: "exact" scans every user; "approximate" re-ranks only the
+          candidates proposed by the ANN backend
+        - filters: Only users passing these criteria are returned
+
+        Returns:
+        - List of tuples (user_id, compatibility_score) sorted by score (0-100)
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from {SEARCH_MODES}")
+
+        row = self.row_of.get(user_id)
+        if row is None:
+            return []
+
+        blend = {"weight": self.similarity_weight, "bias": self._rating_bias()}
+
+        allowed = None
+        if filters is not None and not filters.is_empty:
+            if self.attributes is None:
+                raise ValueError("This index has no profile attributes to filter on")
+            if mode == "exact":
+                subset = self._cached_subset(filters)
+                if subset is not None:
+                    rows, matrix = subset
+                    return get_top_matches_among(
+                        row, rows, self.vectors, self.user_ids, n=n, skip=skip, candidate_matrix=matrix, **blend
+                    )
+            allowed = self._allowed_rows(filters)
+
+        if mode == "approximate":
+            candidates = self.ann.candidates(self._vectors[row], skip + n + 1)
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            # Too few candidates to fill the page: fall back to the exact scan
+            if len(candidates) > skip + n or len(candidates) >= len(self):
+                return get_top_matches_among(row, candidates, self.vectors, self.user_ids, n=n, skip=skip, **blend)
+
+        if allowed is not None:
+            # Score only the rows that pass the filters
+            return get_top_matches_among(
+                row, np.flatnonzero(allowed), self.vectors, self.user_ids, n=n, skip=skip, **blend
+            )
+
+        return get_top_matches(row, self.vectors, self.user_ids, n=n, skip=skip, **blend)
+
+    def all_top_k(self, n: int = 10, block_size: int = 1024, n_jobs: int = 1) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Get the top N most compatible users for every indexed user at once,
+        for batch jobs (see all_pairs_top_k for the memory bound)
+
+        Returns:
+        - Dictionary mapping user_id to a list of (user_id, compatibility_score)
+        """
+        # The blend is applied in similarity units so it can be ranked on:
+        # weight * (s + 1) * 50 + bias == weight * ((s + bias / (50 * weight)) + 1) * 50
+        bias = self._rating_bias()
+        column_bias = None if bias is None else bias / (50 * self.similarity_weight)
+        indices, similarities = all_pairs_top_k(
+            self.vectors, k=n, block_size=block_size, n_jobs=n_jobs, column_bias=column_bias
+        )
+        scores = self.similarity_weight * (similarities.astype(np.float64) + 1) / 2 * 100
+        user_ids = np.asarray(self.user_ids)
+        return {
+            user_id: list(zip(user_ids[row_idx].tolist(), row_scores.tolist()))
+            for user_id, row_idx, row_scores in zip(self.user_ids, indices, scores)
+        }
+
+    def _allowed_rows(self, filters: CandidateFilter) -> np.ndarray:
+        # A concurrent update may have resized the attributes first
+        allowed = np.zeros(len(self), dtype=bool)
+        mask = self.attributes.mask(filters)[:len(allowed)]
+        allowed[:len(mask)] = mask
+        return allowed
+
+    def _cached_subset(self, filters: CandidateFilter) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Candidate rows and their vectors for an equality-only filter"""
+        key = filters.equality_key
+        if key is None:
+            return None
+        subset = self._subsets.get(key)
+        if subset is None:
+            rows = np.flatnonzero(self._allowed_rows(filters))
+            subset = (rows, self.vectors[rows])
+            if len(self._subsets) >= MAX_CACHED_SUBSETS:
+                self._subsets.pop(next(iter(self._subsets)))
+            self._subsets[key] = subset
+        return subset
+
+    @property
+    def ann(self) -> ApproximateIndex:
+        """The approximate backend, built on first use"""
+        if self._ann is None:
+            with self._ann_lock:
+                if self._ann is None:
+                    self._ann = make_ann_index(self.ann_backend, **self.ann_params).fit(self.vectors)
+        return self._ann
+
+    def upsert(self, user_id: int, vector: np.ndarray) -> None:
+        """Insert or replace one user's (already z-scored) feature vector"""
+        row = self.row_of.get(user_id)
+        if row is None:
+            row = len(self.user_ids)
+            self._reserve(row + 1)
+            self.user_ids.append(user_id)
+            self.row_of[user_id] = row
+        self._vectors[row] = _unit_rows(np.asarray(vector, dtype=np.float64))
+        self._subsets = {}
+        if self._ann is not None:
+            self._ann.add(row, self._vectors[row])
+
+    def remove(self, user_id: int) -> bool:
+        """Drop a user, moving the last row into its slot"""
+        row = self.row_of.pop(user_id, None)
+        if row is None:
+            return False
+
+        last = len(self.user_ids) - 1
+        self._subsets = {}
+        if self._ann is not None:
+            self._ann.remove(row)
+        if row != last:
+            moved_id = self.user_ids[last]
+            self._vectors[row] = self._vectors[last]
+            self.user_ids[row] = moved_id
+            self.row_of[moved_id] = row
+            if self._ann is not None:
+                self._ann.move(last, row)
+        self.user_ids.pop()
+        return True
+
+    def replace_vectors(self, vectors: np.ndarray, user_ids: Optional[List[int]] = None) -> None:
+        """
+        Swap in re-normalised vectors for every user. Pass user_ids (the
+        store's row order) to re-align rows as well; otherwise the current
+        row order is kept.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if user_ids is not None:
+            self.user_ids = [int(uid) for uid in user_ids]
+            self.row_of = {uid: row for row, uid in enumerate(self.user_ids)}
+        if vectors.ndim != 2 or vectors.shape[0] != len(self.user_ids):
+            raise ValueError("vectors must have one row per user")
+        self._vectors = _unit_rows(vectors)
+        self._ann = None  # Rebuilt lazily from the new vectors
+        self._subsets = {}
+
+    def _reserve(self, size: int) -> None:
+        # Grow geometrically so appending new users stays amortised O(dim)
+        if size <= self._vectors.shape[0]:
+            return
+        grown = np.zeros((max(size, 2 * self._vectors.shape[0], 16), self._vectors.shape[1]))
+        grown[:self._vectors.shape[0]] = self._vectors
+        self._vectors = grown
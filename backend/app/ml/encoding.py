@@ -0,0 +1,184 @@
+# app/ml/encoding.py
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Anything else (or nothing) is encoded in the trailing "other" slot
+GENDERS = ("male", "female")
+
+# Age, residence hall and bio length
+NUMERIC_PROFILE_FEATURES = 3
+
+
+def _normalize(text: Any) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+def split_majors(majors: Optional[str]) -> List[str]:
+    """
+    Split a free-text majors field ("Computer Science, Math") into
+    normalised tokens
+    """
+    if not majors:
+        return []
+    return [token for token in (_normalize(part) for part in majors.split(",")) if token]
+
+
+def gender_slot(gender: Optional[str]) -> int:
+    """Position of a gender among GENDERS, or the trailing "other" slot"""
+    gender = _normalize(gender or "")
+    return GENDERS.index(gender) if gender in GENDERS else len(GENDERS)
+
+
+class FeatureVocabulary:
+    """
+    Deterministic encoding of the categorical parts of a user's features.
+
+    Gender is one-hot over GENDERS plus an "other" slot, majors are multi-hot
+    over a sorted vocabulary plus an "unknown" slot, and every questionnaire
+    answer is one-hot over that question's options (in Option.id order) plus
+    an "unknown" slot for answers that match no option. Unlike hash(), the
+    layout depends only on the vocabulary, so vectors are identical across
+    worker processes, restarts and snapshots built with the same vocabulary.
+
+    Feature layout:
+    [age, gender..., majors..., residence hall, bio length, answers...]
+    """
+
+    def __init__(self, majors: Iterable[str], question_options: List[Tuple[int, List[str]]]):
+        self.majors: List[str] = sorted({_normalize(major) for major in majors if major})
+        self.question_options: List[Tuple[int, List[str]]] = [
+            (int(question_id), [str(option) for option in options])
+            for question_id, options in question_options
+        ]
+
+        self._major_slot = {major: slot for slot, major in enumerate(self.majors)}
+        self._option_slot: Dict[int, Dict[str, int]] = {}
+        self._unknown_slot: Dict[int, int] = {}
+        self._answer_offset: Dict[int, int] = {}
+
+        offset = self.profile_dim
+        for question_id, options in self.question_options:
+            self._answer_offset[question_id] = offset
+            slots: Dict[str, int] = {}
+            for slot, option in enumerate(options):
+                slots.setdefault(_normalize(option), slot)
+            self._option_slot[question_id] = slots
+            self._unknown_slot[question_id] = len(options)
+            offset += len(options) + 1  # + unknown answer
+
+        self.dim = offset
+
+    @classmethod
+    def from_data(
+        cls,
+        user_profiles: List[Dict[str, Any]],
+        all_questions: List[Dict[str, Any]]
+    ) -> "FeatureVocabulary":
+        """
+        Build the vocabulary from profile dictionaries and question
+        dictionaries carrying an 'options' list
+        """
+        majors = [
+            token
+            for profile in user_profiles
+            for token in split_majors(profile.get('majors'))
+        ]
+        question_options = [(q['id'], q.get('options') or []) for q in all_questions]
+        return cls(majors, question_options)
+
+    @classmethod
+    def from_columns(
+        cls,
+        majors: Iterable[Optional[str]],
+        all_questions: List[Dict[str, Any]]
+    ) -> "FeatureVocabulary":
+        """Build the vocabulary from a column of majors fields"""
+        return cls.from_data([{'majors': value} for value in set(majors)], all_questions)
+
+    @property
+    def question_ids(self) -> List[int]:
+        return [question_id for question_id, _ in self.question_options]
+
+    @property
+    def gender_dim(self) -> int:
+        return len(GENDERS) + 1
+
+    @property
+    def major_dim(self) -> int:
+        return len(self.majors) + 1
+
+    @property
+    def profile_dim(self) -> int:
+        return NUMERIC_PROFILE_FEATURES + self.gender_dim + self.major_dim
+
+    def gender_slot(self, gender: Optional[str]) -> int:
+        return gender_slot(gender)
+
+    def major_slots(self, majors: Optional[str]) -> List[int]:
+        """Slots of the given majors; unrecognised ones share the last slot"""
+        return sorted({self._major_slot.get(token, len(self.majors)) for token in split_majors(majors)})
+
+    def knows_majors(self, majors: Optional[str]) -> bool:
+        return all(token in self._major_slot for token in split_majors(majors))
+
+    @property
+    def answer_offsets(self) -> List[int]:
+        """Position of each question's first option slot, in question order"""
+        return [self._answer_offset[question_id] for question_id in self.question_ids]
+
+    def answer_slot(self, question_id: int, selected_option: Any) -> Optional[int]:
+        """
+        Slot of an answer within its question's block (the last slot for
+        unrecognised answers), or None if the question is not part of the
+        vocabulary
+        """
+        slots = self._option_slot.get(question_id)
+        if slots is None:
+            return None
+        return slots.get(_normalize(selected_option), self._unknown_slot[question_id])
+
+    def answer_position(self, question_id: int, selected_option: Any) -> Optional[int]:
+        """
+        Absolute feature position of an answer, or None if the question is
+        not part of the vocabulary
+        """
+        slot = self.answer_slot(question_id, selected_option)
+        return None if slot is None else self._answer_offset[question_id] + slot
+
+    def column_weights(self, categories: Dict[int, str], category_weights: Dict[str, float]) -> np.ndarray:
+        """
+        Per-feature weights that scale each question's answer block by the
+        weight of the question's category (profile features weigh 1)
+        """
+        weights = np.ones(self.dim)
+        for question_id, options in self.question_options:
+            category = (categories.get(question_id) or "").lower()
+            offset = self._answer_offset[question_id]
+            weights[offset:offset + len(options) + 1] = category_weights.get(category, 1.0)
+        return weights
+
+    def same_questions(self, all_questions: List[Dict[str, Any]]) -> bool:
+        """Whether the questions and their options still match this layout"""
+        return self.question_options == [
+            (q['id'], [str(option) for option in q.get('options') or []])
+            for q in all_questions
+        ]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "majors": self.majors,
+            "question_options": self.question_options,
+        })
+
+    @classmethod
+    def from_json(cls, data: str) -> "FeatureVocabulary":
+        payload = json.loads(data)
+        return cls(payload["majors"], [tuple(item) for item in payload["question_options"]])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FeatureVocabulary):
+            return NotImplemented
+        return self.majors == other.majors and self.question_options == other.question_options
@@ -1,5 +1,7 @@
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
+
+from .encoding import FeatureVocabulary
 
 
 # def extract_user_features(
@@ -78,59 +80,55 @@ from typing import Dict, List, Any, Tuple
 def extract_user_features(
     user_profile: Dict[str, Any],
     user_responses: List[Dict[str, Any]],
-    all_questions: List[Dict[str, Any]]
+    all_questions: List[Dict[str, Any]],
+    vocabulary: Optional[FeatureVocabulary] = None
 ) -> np.ndarray:
     """
     Extract features for a single user based on profile and question responses
+
+    Categorical fields are encoded through the vocabulary (see
+    FeatureVocabulary for the layout). Pass the vocabulary the rest of the
+    population was encoded with; without one, a vocabulary is built from
+    this user and all_questions alone.
     """
-    features: list[float] = []
+    if vocabulary is None:
+        vocabulary = FeatureVocabulary.from_data([user_profile], all_questions)
+
+    features = np.zeros(vocabulary.dim)
 
     # ── Profile features ────────────────────────────────────────────────
     # 1️⃣ Age  ── guard against None so float() never fails
     age_val = user_profile.get("age")          # may be None
     if age_val is None:
         age_val = 20                           # <-- fallback of your choice
-    features.append(float(age_val))            # ← safe float()
-
-    # 2️⃣ Gender (one-hot encoding)
-    gender = (user_profile.get("gender") or "").lower()
-    if gender == "male":
-        features.append(1.0)
-    elif gender == "female":
-        features.append(0.0)
-    else:
-        features.append(0.5)                   # other / non-binary
-
-    # 3️⃣ Major  (hash → 0-1)
-    major = user_profile.get("majors", "")
-    if major:
-        major_hash = abs(hash(major)) % 100 / 100.0
-        features.append(major_hash)
-    else:
-        features.append(0.5)
+    features[0] = float(age_val)               # ← safe float()
+    offset = 1
+
+    # 2️⃣ Gender (one-hot: male, female, other / non-binary)
+    features[offset + vocabulary.gender_slot(user_profile.get("gender"))] = 1.0
+    offset += vocabulary.gender_dim
+
+    # 3️⃣ Majors (multi-hot over the vocabulary, unknown majors share a slot)
+    for slot in vocabulary.major_slots(user_profile.get("majors")):
+        features[offset + slot] = 1.0
+    offset += vocabulary.major_dim
 
     # 4️⃣ Residence hall ID (also guard against None)
     hall_id = user_profile.get("residence_hall_id")
-    features.append(float(hall_id) if hall_id is not None else -1.0)
+    features[offset] = float(hall_id) if hall_id is not None else -1.0
 
     # 5️⃣ Bio length (0-1)
     bio = user_profile.get("bio") or ""
-    features.append(min(len(bio) / 500.0, 1.0))
+    features[offset + 1] = min(len(bio) / 500.0, 1.0)
 
     # ── Question-response features ──────────────────────────────────────
-    response_map = {
-        resp["question_id"]: resp["selected_option"] for resp in user_responses
-    }
-
-    for q in all_questions:
-        qid = q["id"]
-        if qid in response_map:
-            opt_val = abs(hash(str(response_map[qid]))) % 1000 / 1000.0
-            features.append(opt_val)
-        else:
-            features.append(-1.0)              # missing answer marker
+    # One-hot per question; unanswered questions stay all zero
+    for resp in user_responses:
+        position = vocabulary.answer_position(resp["question_id"], resp["selected_option"])
+        if position is not None:
+            features[position] = 1.0
 
-    return np.array(features)
+    return features
 
 
 def normalize_features(features_list: List[np.ndarray]) -> List[np.ndarray]:
@@ -172,47 +170,137 @@ def normalize_features(features_list: List[np.ndarray]) -> List[np.ndarray]:
     return normalized_features
 
 
-def extract_features_for_all_users(
+def extract_raw_features_for_all_users(
     user_profiles: List[Dict[str, Any]],
     all_responses: List[Dict[str, Any]],
-    all_questions: List[Dict[str, Any]]
-) -> Tuple[Dict[int, np.ndarray], List[int]]:
+    all_questions: List[Dict[str, Any]],
+    vocabulary: Optional[FeatureVocabulary] = None
+) -> Tuple[np.ndarray, List[int]]:
     """
-    Extract and normalize features for all users
+    Extract un-normalised features for all users
     
     Parameters:
     - user_profiles: List of user profile dictionaries
     - all_responses: List of all question responses
-    - all_questions: List of all questions
+    - all_questions: List of all questions (with their 'options')
+    - vocabulary: Encoding to use; built from the profiles and questions if omitted
     
     Returns:
-    - Dictionary mapping user_id to normalized feature vector
-    - List of user IDs in the same order as the feature vectors
+    - Matrix with one raw feature vector per user
+    - List of user IDs in the same order as the matrix rows
     """
-    # Group responses by user_id
-    responses_by_user = {}
+    if vocabulary is None:
+        vocabulary = FeatureVocabulary.from_data(user_profiles, all_questions)
+    
+    # Group responses by the profile they belong to
+    responses_by_profile = {}
     for response in all_responses:
-        user_id = response['user_profile_id']
-        if user_id not in responses_by_user:
-            responses_by_user[user_id] = []
-        responses_by_user[user_id].append(response)
+        profile_id = response['user_profile_id']
+        if profile_id not in responses_by_profile:
+            responses_by_profile[profile_id] = []
+        responses_by_profile[profile_id].append(response)
     
     # Extract features for each user
     features_list = []
     user_ids = []
     
     for profile in user_profiles:
-        user_id = profile['user_id']
-        user_responses = responses_by_user.get(user_id, [])
+        user_responses = responses_by_profile.get(profile['id'], [])
         
-        features = extract_user_features(profile, user_responses, all_questions)
+        features = extract_user_features(profile, user_responses, all_questions, vocabulary)
         features_list.append(features)
-        user_ids.append(user_id)
+        user_ids.append(profile['user_id'])
+    
+    if not features_list:
+        return np.zeros((0, vocabulary.dim)), user_ids
+    
+    return np.array(features_list), user_ids
+
+
+def extract_features_for_all_users(
+    user_profiles: List[Dict[str, Any]],
+    all_responses: List[Dict[str, Any]],
+    all_questions: List[Dict[str, Any]]
+) -> Tuple[Dict[int, np.ndarray], List[int]]:
+    """
+    Extract and normalize features for all users
+    
+    Parameters:
+    - user_profiles: List of user profile dictionaries
+    - all_responses: List of all question responses
+    - all_questions: List of all questions
+    
+    Returns:
+    - Dictionary mapping user_id to normalized feature vector
+    - List of user IDs in the same order as the feature vectors
+    """
+    raw_features, user_ids = extract_raw_features_for_all_users(user_profiles, all_responses, all_questions)
+    if not user_ids:
+        return {}, user_ids
     
     # Normalize features
-    normalized_features = normalize_features(features_list)
+    normalized_features = normalize_features(list(raw_features))
     
     # Create dictionary mapping user_id to features
     user_features = {user_ids[i]: normalized_features[i] for i in range(len(user_ids))}
     
-    return user_features, user_ids
\ No newline at end of file
+    return user_features, user_ids
+
+
+def encode_feature_matrix(
+    profile_columns: Dict[str, Any],
+    answers: np.ndarray,
+    vocabulary: FeatureVocabulary
+) -> np.ndarray:
+    """
+    Vectorised equivalent of extract_user_features for a whole population
+    
+    Parameters:
+    - profile_columns: Columns from crud.matching_crud.load_profile_columns
+    - answers: (user, question) option slots from load_answer_matrix,
+      negative where unanswered
+    - vocabulary: Encoding to use
+    
+    Returns:
+    - Matrix with one raw feature vector per user, in profile_columns order
+    """
+    n_users = len(profile_columns['user_ids'])
+    rows = np.arange(n_users)
+    features = np.zeros((n_users, vocabulary.dim))
+    
+    # Age (20 when missing, as in extract_user_features)
+    ages = profile_columns['age']
+    features[:, 0] = np.where(np.isnan(ages), 20.0, ages)
+    offset = 1
+    
+    # Gender one-hot; each distinct value is resolved once
+    gender_slots = {gender: vocabulary.gender_slot(gender) for gender in set(profile_columns['gender'])}
+    genders = np.fromiter(
+        (gender_slots[gender] for gender in profile_columns['gender']),
+        dtype=np.int64,
+        count=n_users
+    )
+    features[rows, offset + genders] = 1.0
+    offset += vocabulary.gender_dim
+    
+    # Majors multi-hot
+    major_slots = {majors: vocabulary.major_slots(majors) for majors in set(profile_columns['majors'])}
+    major_rows, major_cols = [], []
+    for row, majors in enumerate(profile_columns['majors']):
+        slots = major_slots[majors]
+        major_rows.extend([row] * len(slots))
+        major_cols.extend(slots)
+    features[np.asarray(major_rows, dtype=np.int64), offset + np.asarray(major_cols, dtype=np.int64)] = 1.0
+    offset += vocabulary.major_dim
+    
+    # Residence hall ID (-1 when missing) and bio length (0-1)
+    hall_ids = profile_columns['residence_hall_id']
+    features[:, offset] = np.where(np.isnan(hall_ids), -1.0, hall_ids)
+    features[:, offset + 1] = np.minimum(profile_columns['bio_length'] / 500.0, 1.0)
+    
+    # Answers one-hot; unanswered questions stay all zero
+    answered_rows, answered_questions = np.nonzero(answers >= 0)
+    positions = np.asarray(vocabulary.answer_offsets, dtype=np.int64)[answered_questions]
+    features[answered_rows, positions + answers[answered_rows, answered_questions]] = 1.0
+    
+    return features
@@ -0,0 +1,191 @@
+# app/ml/feature_store.py
+
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from .candidate_filter import ProfileAttributes
+from .encoding import FeatureVocabulary
+
+
+class IncrementalFeatureStore:
+    """
+    Raw (un-normalised) feature vectors for every user, plus running column
+    sums and sums of squares for the z-score statistics.
+
+    Changing one user only touches that user's row and the running sums, so
+    the cost of an update does not grow with the number of users. The
+    statistics used to normalise vectors ("published" stats) stay fixed until
+    the live statistics drift past ``drift_threshold``; until then every
+    previously normalised vector remains valid. The vocabulary the raw
+    vectors were encoded with and the filterable profile attributes (same
+    row order) are kept, and snapshotted, alongside them. Normalised vectors
+    are z-scores multiplied by column_weights (per-category question
+    weights), which follow the current configuration and aren't snapshotted.
+    """
+
+    def __init__(
+        self,
+        user_ids: List[int],
+        raw_matrix: np.ndarray,
+        vocabulary: Optional[FeatureVocabulary] = None,
+        attributes: Optional[ProfileAttributes] = None,
+        drift_threshold: float = 0.1,
+        built_at: Optional[float] = None
+    ):
+        raw_matrix = np.asarray(raw_matrix, dtype=np.float64)
+        if raw_matrix.ndim != 2 or raw_matrix.shape[0] != len(user_ids):
+            raise ValueError("raw_matrix must have one row per user")
+
+        self.vocabulary = vocabulary
+        if attributes is not None and len(attributes) != len(user_ids):
+            raise ValueError("attributes must have one row per user")
+        self.attributes = attributes
+        self.drift_threshold = drift_threshold
+        self.built_at = built_at if built_at is not None else time.time()
+        self.dim = raw_matrix.shape[1]
+        self.user_ids: List[int] = [int(uid) for uid in user_ids]
+        self.row_of: Dict[int, int] = {uid: row for row, uid in enumerate(self.user_ids)}
+
+        self._raw = raw_matrix.copy()
+        self.col_sum = raw_matrix.sum(axis=0)
+        self.col_sq_sum = np.square(raw_matrix).sum(axis=0)
+
+        self.means, self.stds = self.live_stats()
+        self.column_weights = np.ones(self.dim)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def raw(self) -> np.ndarray:
+        """Raw feature matrix, one row per user in user_ids order"""
+        return self._raw[:len(self.user_ids)]
+
+    def live_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Current column means and standard deviations, derived from the
+        running sums (zero stds are replaced with 1 as in normalize_features)
+        """
+        n = max(len(self.user_ids), 1)
+        means = self.col_sum / n
+        variances = np.maximum(self.col_sq_sum / n - np.square(means), 0.0)
+        stds = np.sqrt(variances)
+        stds[stds == 0] = 1.0
+        return means, stds
+
+    def normalize(self, raw: np.ndarray) -> np.ndarray:
+        """
+        Z-score one vector or a matrix of vectors with the published stats
+        and apply the column weights
+        """
+        return (raw - self.means) / self.stds * self.column_weights
+
+    def normalized_matrix(self) -> np.ndarray:
+        return self.normalize(self.raw)
+
+    def drift(self) -> float:
+        """
+        Largest change of any column mean or std since the stats were last
+        published, measured in published standard deviations
+        """
+        means, stds = self.live_stats()
+        mean_shift = np.abs(means - self.means) / self.stds
+        std_shift = np.abs(stds - self.stds) / self.stds
+        return float(max(mean_shift.max(initial=0.0), std_shift.max(initial=0.0)))
+
+    def needs_renormalization(self) -> bool:
+        return self.drift() > self.drift_threshold
+
+    def publish_stats(self) -> None:
+        """Adopt the live statistics; every stored vector must be re-normalised"""
+        self.means, self.stds = self.live_stats()
+
+    def upsert(
+        self,
+        user_id: int,
+        raw_vector: np.ndarray,
+        attributes: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Insert or replace one user's raw feature vector (and attributes)"""
+        raw_vector = np.asarray(raw_vector, dtype=np.float64)
+        if raw_vector.shape != (self.dim,):
+            raise ValueError(f"Expected a feature vector of length {self.dim}, got {raw_vector.shape}")
+
+        row = self.row_of.get(user_id)
+        if row is None:
+            row = len(self.user_ids)
+            self._reserve(row + 1)
+            self.user_ids.append(user_id)
+            self.row_of[user_id] = row
+        else:
+            old = self._raw[row]
+            self.col_sum -= old
+            self.col_sq_sum -= np.square(old)
+
+        self._raw[row] = raw_vector
+        self.col_sum += raw_vector
+        self.col_sq_sum += np.square(raw_vector)
+
+        if self.attributes is not None:
+            self.attributes.set_row(row, attributes or ProfileAttributes.row_from_profile({}))
+
+    def remove(self, user_id: int) -> bool:
+        """Drop a user, moving the last row into its slot"""
+        row = self.row_of.pop(user_id, None)
+        if row is None:
+            return False
+
+        old = self._raw[row]
+        self.col_sum -= old
+        self.col_sq_sum -= np.square(old)
+
+        last = len(self.user_ids) - 1
+        if row != last:
+            moved_id = self.user_ids[last]
+            self._raw[row] = self._raw[last]
+            self.user_ids[row] = moved_id
+            self.row_of[moved_id] = row
+        self.user_ids.pop()
+
+        if self.attributes is not None:
+            self.attributes.remove_row(row)
+        return True
+
+    def _reserve(self, size: int) -> None:
+        # Grow geometrically so appending new users stays amortised O(dim)
+        if size <= self._raw.shape[0]:
+            return
+        grown = np.zeros((max(size, 2 * self._raw.shape[0], 16), self.dim))
+        grown[:self._raw.shape[0]] = self._raw
+        self._raw = grown
+
+    def save(self, path: str) -> None:
+        """Persist raw vectors and published stats to a .npz snapshot"""
+        with open(path, "wb") as fh:
+            np.savez(
+                fh,
+                user_ids=np.asarray(self.user_ids, dtype=np.int64),
+                raw=self.raw,
+                vocabulary=np.asarray(self.vocabulary.to_json() if self.vocabulary else ""),
+                means=self.means,
+                stds=self.stds,
+                drift_threshold=np.float64(self.drift_threshold),
+                built_at=np.float64(self.built_at),
+                **(self.attributes.to_arrays() if self.attributes is not None else {})
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "IncrementalFeatureStore":
+        """Load a store previously written by save()"""
+        with np.load(path) as data:
+            store = cls(
+                data["user_ids"].tolist(),
+                data["raw"],
+                vocabulary=FeatureVocabulary.from_json(str(data["vocabulary"])) if str(data["vocabulary"]) else None,
+                attributes=ProfileAttributes.from_arrays(data),
+                drift_threshold=float(data["drift_threshold"]),
+                built_at=float(data["built_at"])
+            )
+            store.means, store.stds = data["means"], data["stds"]
+        return store
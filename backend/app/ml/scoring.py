@@ -0,0 +1,60 @@
+# app/ml/scoring.py
+
+import json
+from typing import Dict, Optional
+
+import numpy as np
+
+# Ratings are given on a 1-5 scale
+MIN_RATING = 1.0
+MAX_RATING = 5.0
+
+
+def rating_scores(
+    rating_sum: np.ndarray,
+    rating_count: np.ndarray,
+    prior_mean: float = 3.0,
+    prior_count: float = 5.0
+) -> np.ndarray:
+    """
+    Peer-feedback score (0-100) for every user from their rating aggregates
+
+    The average rating is shrunk towards prior_mean as if every user had
+    received prior_count extra ratings of that value, so one 5-star review
+    doesn't outrank a long record of 4-star ones, and users without
+    feedback sit at the prior.
+
+    Parameters:
+    - rating_sum: Sum of the ratings each user received
+    - rating_count: Number of ratings each user received
+    - prior_mean: Rating assumed for users without feedback
+    - prior_count: Weight of the prior, in ratings
+
+    Returns:
+    - Array of scores on a 0-100 scale
+    """
+    mean = (rating_sum + prior_mean * prior_count) / np.maximum(rating_count + prior_count, 1e-9)
+    return (mean - MIN_RATING) / (MAX_RATING - MIN_RATING) * 100
+
+
+def similarity_weight(rating_weight: float) -> float:
+    """
+    Weight of the questionnaire similarity when peer feedback contributes
+    rating_weight of the final score
+    """
+    if not 0.0 <= rating_weight < 1.0:
+        raise ValueError("rating_weight must be in [0, 1)")
+    return 1.0 - rating_weight
+
+
+def parse_category_weights(value: Optional[str]) -> Dict[str, float]:
+    """
+    Parse per-category question weights from JSON, e.g.
+    '{"lifestyle": 2, "social": 0.5}'; categories not listed weigh 1
+    """
+    if not value:
+        return {}
+    weights = json.loads(value)
+    if not isinstance(weights, dict):
+        raise ValueError("Category weights must be a JSON object")
+    return {str(category).lower(): float(weight) for category, weight in weights.items()}
@@ -1,98 +1,283 @@
 # app/ml/similarity.py
 
 import numpy as np
-from typing import Dict, List, Tuple, Any
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Optional, Tuple
 
 
-def calculate_similarity_matrix(user_features: Dict[int, np.ndarray], user_ids: List[int]) -> Dict[int, Dict[int, float]]:
+def calculate_compatibility_score(
+    user1_features: np.ndarray,
+    user2_features: np.ndarray
+) -> float:
     """
-    Calculate similarity matrix between all users
+    Calculate compatibility score between two users
     
     Parameters:
-    - user_features: Dictionary mapping user_id to feature vector
-    - user_ids: List of user IDs
+    - user1_features: Normalized feature vector of the first user
+    - user2_features: Normalized feature vector of the second user
     
     Returns:
-    - Dictionary mapping each user_id to a dictionary of {other_user_id: similarity_score}
+    - Compatibility score (0-100 scale)
     """
-    # Create feature matrix
-    feature_matrix = np.array([user_features[uid] for uid in user_ids])
-    
-    # Calculate cosine similarity
-    similarity_matrix = cosine_similarity(feature_matrix)
+    norms = np.linalg.norm(user1_features) * np.linalg.norm(user2_features)
+    if norms == 0:
+        return 50.0  # Cosine similarity of a zero vector is taken as 0
     
-    # Convert to dictionary format
-    similarity_dict = {}
-    for i, user_id in enumerate(user_ids):
-        similarity_dict[user_id] = {
-            user_ids[j]: (similarity_matrix[i, j] + 1) / 2  # Normalize from [-1,1] to [0,1]
-            for j in range(len(user_ids)) if i != j  # Exclude self
-        }
+    # Cosine similarity as a plain dot product
+    similarity = float(user1_features @ user2_features) / norms
     
-    return similarity_dict
+    # Convert from [-1,1] to [0,100] scale
+    return (similarity + 1) / 2 * 100
 
 
-def calculate_compatibility_score(
-    user1_id: int,
-    user2_id: int,
-    user_features: Dict[int, np.ndarray]
-) -> float:
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
     """
-    Calculate compatibility score between two users
+    Get the positions of the k largest scores, highest first
+    
+    Uses np.argpartition so only the k winners are sorted, which is O(N)
+    instead of the O(N log N) of sorting the whole row. Ties are broken by
+    position so results are deterministic.
     
     Parameters:
-    - user1_id: ID of first user
-    - user2_id: ID of second user
-    - user_features: Dictionary mapping user_id to feature vector
+    - scores: 1-D array of scores
+    - k: Number of positions to return
     
     Returns:
-    - Compatibility score (0-5 scale)
+    - Array of at most k positions into scores
     """
-    # Get feature vectors for both users
-    if user1_id not in user_features or user2_id not in user_features:
-        return 0.0  # No data for one or both users
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
     
-    user1_features = user_features[user1_id]
-    user2_features = user_features[user2_id]
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
     
-    # Calculate cosine similarity
-    similarity = cosine_similarity([user1_features], [user2_features])[0][0]
-    
-    # Convert from [-1,1] to [0,100] scale
-    compatibility_score = (similarity + 1) / 2 * 100
-    
-    return compatibility_score
+    # lexsort uses the last key as the primary one
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def _to_scores(similarities: np.ndarray, weight: float = 1.0, bias: Optional[np.ndarray] = None) -> np.ndarray:
+    # Convert similarity [-1,1] to compatibility score [0,100], then blend
+    scores = (similarities + 1) / 2 * 100
+    if weight != 1.0:
+        scores *= weight
+    if bias is not None:
+        scores += bias
+    return scores
 
 
 def get_top_matches(
-    user_id: int,
-    similarity_dict: Dict[int, Dict[int, float]],
-    n: int = 10
+    user_row: int,
+    feature_matrix: np.ndarray,
+    user_ids: List[int],
+    n: int = 10,
+    skip: int = 0,
+    weight: float = 1.0,
+    bias: Optional[np.ndarray] = None
 ) -> List[Tuple[int, float]]:
     """
     Get top N compatible users for a given user
     
+    Only the user's own similarity row is computed, as one matrix-vector
+    product, so memory and latency scale with N rather than N^2.
+    
+    Parameters:
+    - user_row: Row of the user in feature_matrix
+    - feature_matrix: Matrix of L2-normalized feature vectors, one row per user
+    - user_ids: User IDs in the same order as feature_matrix rows
+    - n: Number of matches to return
+    - skip: Number of best matches to skip (for pagination)
+    - weight: Weight of the similarity score in the final score
+    - bias: Optional per-row amount added to the weighted score (e.g. a
+      weighted peer-feedback score)
+    
+    Returns:
+    - List of tuples (user_id, compatibility_score) sorted by score
+    """
+    if n <= 0 or skip < 0:
+        return []
+    
+    similarities = feature_matrix @ feature_matrix[user_row]
+    scores = _to_scores(similarities, weight, bias)
+    scores[user_row] = -np.inf  # Exclude self
+    
+    # Self always ranks last, so it never reaches the page unless asked for everyone
+    top = top_k_indices(scores, min(skip + n, len(user_ids) - 1))[skip:]
+    
+    return [(user_ids[i], float(scores[i])) for i in top]
+
+
+def get_top_matches_among(
+    user_row: int,
+    candidate_rows: np.ndarray,
+    feature_matrix: np.ndarray,
+    user_ids: List[int],
+    n: int = 10,
+    skip: int = 0,
+    candidate_matrix: Optional[np.ndarray] = None,
+    weight: float = 1.0,
+    bias: Optional[np.ndarray] = None
+) -> List[Tuple[int, float]]:
+    """
+    Get top N compatible users for a given user, considering only a subset
+    of candidate rows (e.g. proposed by an approximate index)
+    
     Parameters:
-    - user_id: ID of the user to find matches for
-    - similarity_dict: Dictionary of user similarities
+    - user_row: Row of the user in feature_matrix
+    - candidate_rows: Rows of feature_matrix eligible to be returned
+    - feature_matrix: Matrix of L2-normalized feature vectors, one row per user
+    - user_ids: User IDs in the same order as feature_matrix rows
     - n: Number of matches to return
+    - skip: Number of best matches to skip (for pagination)
+    - candidate_matrix: feature_matrix[candidate_rows], if already gathered
+    - weight: Weight of the similarity score in the final score
+    - bias: Optional per-row amount added to the weighted score, indexed
+      like feature_matrix rows
     
     Returns:
     - List of tuples (user_id, compatibility_score) sorted by score
     """
-    if user_id not in similarity_dict:
+    if n <= 0 or skip < 0:
         return []
     
-    # Get similarities for this user
-    user_similarities = similarity_dict[user_id]
+    if candidate_matrix is None:
+        candidate_matrix = feature_matrix[candidate_rows]
+    similarities = candidate_matrix @ feature_matrix[user_row]
+    scores = _to_scores(similarities, weight, None if bias is None else bias[candidate_rows])
+    
+    is_self = candidate_rows == user_row
+    scores[is_self] = -np.inf  # Exclude self
+    
+    top = top_k_indices(scores, min(skip + n, len(candidate_rows) - int(is_self.sum())))[skip:]
+    return [(user_ids[candidate_rows[i]], float(scores[i])) for i in top]
+
+
+# Set in each worker process by _init_all_pairs_worker so blocks can be
+# dispatched by row range instead of pickling the matrix for every task
+_all_pairs_vectors = None
+_all_pairs_bias = None
+
+
+def _init_all_pairs_worker(vectors: np.ndarray, column_bias: Optional[np.ndarray]) -> None:
+    global _all_pairs_vectors, _all_pairs_bias
+    _all_pairs_vectors, _all_pairs_bias = vectors, column_bias
+
+
+def _all_pairs_worker_block(start: int, stop: int, k: int, block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _block_top_k(_all_pairs_vectors, start, stop, k, block_size, _all_pairs_bias)
+
+
+def _block_top_k(
+    vectors: np.ndarray,
+    start: int,
+    stop: int,
+    k: int,
+    block_size: int,
+    column_bias: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k neighbours (excluding self) for rows start..stop of vectors
+    
+    The columns are processed in tiles of block_size, merging each tile's
+    scores into a running (rows, k) best list, so at most
+    (stop - start) x (block_size + k) scores exist at any time.
+    """
+    rows = vectors[start:stop]
+    n_rows = stop - start
+    row_positions = np.arange(n_rows)
+    
+    best_idx = np.full((n_rows, k), -1, dtype=np.int64)
+    best_scores = np.full((n_rows, k), -np.inf, dtype=vectors.dtype)
+    
+    for col_start in range(0, len(vectors), block_size):
+        col_stop = min(col_start + block_size, len(vectors))
+        tile = rows @ vectors[col_start:col_stop].T
+        if column_bias is not None:
+            tile += column_bias[col_start:col_stop]
+        
+        # Exclude self where the row block overlaps this column tile
+        self_cols = np.arange(start, stop) - col_start
+        in_tile = (self_cols >= 0) & (self_cols < col_stop - col_start)
+        tile[row_positions[in_tile], self_cols[in_tile]] = -np.inf
+        
+        scores = np.concatenate([best_scores, tile], axis=1)
+        idx = np.concatenate([
+            best_idx,
+            np.broadcast_to(np.arange(col_start, col_stop), tile.shape)
+        ], axis=1)
+        
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_idx = np.take_along_axis(idx, keep, axis=1)
+    
+    # Highest score first, ties broken by column so results are deterministic
+    order = np.lexsort((best_idx, -best_scores), axis=1)
+    return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def all_pairs_top_k(
+    feature_matrix: np.ndarray,
+    k: int = 10,
+    block_size: int = 1024,
+    dtype: type = np.float32,
+    n_jobs: int = 1,
+    column_bias: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the top k most similar rows for every row of a feature matrix
+    
+    Unlike building the full N x N similarity matrix, the work is split into
+    block_size x block_size tiles, so peak memory is O(block_size^2 + N*k)
+    instead of O(N^2). Scores are computed in float32 by default, which is
+    plenty to rank cosine similarities and halves memory and bandwidth.
+    
+    Parameters:
+    - feature_matrix: Matrix of L2-normalized feature vectors, one row per user
+    - k: Number of neighbours per row (self is excluded)
+    - block_size: Rows and columns per tile
+    - dtype: Floating point type used for the products
+    - n_jobs: Number of worker processes (1 runs in-process)
+    - column_bias: Optional per-row amount added to every similarity with
+      that row before ranking (included in the returned values)
+    
+    Returns:
+    - Tuple (indices, similarities) of (N, k) arrays sorted by similarity,
+      where similarities are cosine values in [-1, 1] plus any column_bias
+    """
+    vectors = np.ascontiguousarray(feature_matrix, dtype=dtype)
+    if column_bias is not None:
+        column_bias = np.asarray(column_bias, dtype=dtype)
+    n_rows = len(vectors)
+    k = min(k, n_rows - 1)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.int64), np.empty((n_rows, 0), dtype=dtype)
+    
+    block_size = max(int(block_size), 1)
+    starts = list(range(0, n_rows, block_size))
     
-    # Sort by similarity score (descending)
-    sorted_matches = sorted(
-        user_similarities.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )
+    if n_jobs == 1 or len(starts) == 1:
+        blocks = [
+            _block_top_k(vectors, start, min(start + block_size, n_rows), k, block_size, column_bias)
+            for start in starts
+        ]
+    else:
+        # Imported lazily: only batch jobs ever need a process pool
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(
+            max_workers=None if n_jobs < 1 else n_jobs,
+            initializer=_init_all_pairs_worker,
+            initargs=(vectors, column_bias)
+        ) as pool:
+            blocks = list(pool.map(
+                _all_pairs_worker_block,
+                starts,
+                [min(start + block_size, n_rows) for start in starts],
+                [k] * len(starts),
+                [block_size] * len(starts)
+            ))
     
-    # Convert similarity (0-1) to compatibility score (0-100)
-    return [(uid, score * 100) for uid, score in sorted_matches[:n]]
\ No newline at end of file
+    indices = np.concatenate([block[0] for block in blocks])
+    similarities = np.concatenate([block[1] for block in blocks])
+    return indices, similarities
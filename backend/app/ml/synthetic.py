@@ -0,0 +1,132 @@
+# app/ml/synthetic.py
+"""
+Synthetic matching populations generated directly in memory, in the same
+shapes the bulk loaders in crud.matching_crud return, so the matching
+pipeline can be exercised at any size without a database.
+"""
+
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Same questionnaire the seed scripts load
+QUESTIONS = [
+    ("What time do you usually go to bed?", "lifestyle", ["Before 10 PM", "10–12 PM", "After midnight"]),
+    ("How clean do you keep your living space?", "habits", ["Very clean", "Moderate", "Messy"]),
+    ("Do you prefer quiet or noise while studying?", "study", ["Quiet", "Some noise", "Doesn’t matter"]),
+    ("Are you a morning or night person?", "personality", ["Morning", "Night", "Depends"]),
+    ("How often do you invite guests?", "social", ["Rarely", "Occasionally", "Frequently"]),
+    ("How do you feel about sharing food?", "social", ["Fine with it", "Depends", "Prefer not to"]),
+    ("Do you like to listen to music out loud?", "habits", ["Often", "Sometimes", "Never"]),
+    ("What’s your ideal room temperature?", "preferences", ["Cold", "Mild", "Warm"]),
+]
+
+MAJORS = [
+    "Computer Science", "Biology", "Psychology", "Business", "Engineering", "Education",
+    "Mathematics", "Nursing", "History", "Chemistry", "Economics", "Art",
+]
+
+GENDERS = ["Male", "Female", "Other", None]
+
+# Answer code for unanswered questions (crud.matching_crud.UNANSWERED)
+UNANSWERED = -1
+
+
+def synthetic_questions(n_questions: int = len(QUESTIONS)) -> List[Dict[str, Any]]:
+    """
+    Question dictionaries (as crud.matching_crud.load_questions returns),
+    cycling through the seed questionnaire when more are requested
+    """
+    questions = []
+    for i in range(n_questions):
+        text, category, options = QUESTIONS[i % len(QUESTIONS)]
+        if i >= len(QUESTIONS):
+            text = f"{text} ({i // len(QUESTIONS) + 1})"
+        questions.append({'id': i + 1, 'question_text': text, 'category': category, 'options': list(options)})
+    return questions
+
+
+def synthetic_population(
+    n_users: int,
+    n_questions: int = len(QUESTIONS),
+    n_personas: int = 20,
+    answer_noise: float = 0.2,
+    unanswered_rate: float = 0.05,
+    allocated_rate: float = 0.1,
+    n_halls: int = 5,
+    seed: int = 0
+) -> Tuple[Dict[str, Any], np.ndarray, List[Dict[str, Any]]]:
+    """
+    Generate profiles and questionnaire responses for n_users students
+
+    Every user follows one of n_personas answer patterns and deviates from
+    it on a fraction answer_noise of the questions, so populations have the
+    cluster structure real questionnaires show instead of uniform noise.
+
+    Parameters:
+    - n_users: Number of profiles
+    - n_questions: Number of questions (options as in the seed questionnaire)
+    - n_personas: Number of answer patterns users are drawn around
+    - answer_noise: Probability that an answer ignores the user's persona
+    - unanswered_rate: Probability that a question is left unanswered
+    - allocated_rate: Share of users who already have a room
+    - n_halls: Number of residence halls
+    - seed: Random seed; the same arguments always give the same population
+
+    Returns:
+    - (profile_columns, answers, questions) shaped like the results of
+      load_profile_columns (plus rating totals), load_answer_matrix and
+      load_questions
+    """
+    rng = np.random.default_rng(seed)
+    questions = synthetic_questions(n_questions)
+    n_options = np.asarray([len(q['options']) for q in questions], dtype=np.int64)
+
+    # ── Questionnaire answers ──────────────────────────────────────────────
+    personas = (rng.random((n_personas, n_questions)) * n_options).astype(np.int16)
+    labels = rng.integers(0, n_personas, size=n_users)
+    answers = personas[labels]
+    noisy = rng.random((n_users, n_questions)) < answer_noise
+    random_answers = (rng.random((n_users, n_questions)) * n_options).astype(np.int16)
+    answers = np.where(noisy, random_answers, answers).astype(np.int16)
+    answers[rng.random((n_users, n_questions)) < unanswered_rate] = UNANSWERED
+
+    # ── Profiles ───────────────────────────────────────────────────────────
+    ages = rng.integers(18, 31, size=n_users).astype(np.float64)
+    ages[rng.random(n_users) < 0.02] = np.nan
+
+    first_major = rng.integers(0, len(MAJORS), size=n_users)
+    second_major = rng.integers(0, len(MAJORS), size=n_users)
+    double = (rng.random(n_users) < 0.1) & (first_major != second_major)
+    majors = [
+        f"{MAJORS[a]}, {MAJORS[b]}" if d else MAJORS[a]
+        for a, b, d in zip(first_major.tolist(), second_major.tolist(), double.tolist())
+    ]
+
+    halls = rng.integers(1, n_halls + 1, size=n_users).astype(np.float64)
+    halls[rng.random(n_users) < 0.05] = np.nan
+
+    semester_start = date(2025, 8, 15)
+    move_in_offsets = rng.integers(-14, 15, size=n_users).tolist()
+
+    allocated = (rng.random(n_users) < allocated_rate) & ~np.isnan(halls)
+    room_numbers = rng.integers(100, 500, size=n_users).tolist()
+
+    rating_count = rng.poisson(0.5, size=n_users).astype(np.float64)
+    rating_sum = rating_count * rng.uniform(1.0, 5.0, size=n_users)
+
+    profile_columns = {
+        'profile_ids': np.arange(1, n_users + 1, dtype=np.int64),
+        'user_ids': np.arange(1, n_users + 1, dtype=np.int64),
+        'age': ages,
+        'gender': [GENDERS[i] for i in rng.choice(len(GENDERS), size=n_users, p=[0.48, 0.48, 0.03, 0.01])],
+        'majors': majors,
+        'residence_hall_id': halls,
+        'bio_length': rng.integers(0, 600, size=n_users).astype(np.float64),
+        'move_in_date': [semester_start + timedelta(days=offset) for offset in move_in_offsets],
+        'room_number': [room if a else None for room, a in zip(room_numbers, allocated.tolist())],
+        'rating_sum': rating_sum,
+        'rating_count': rating_count,
+    }
+    return profile_columns, answers, questions
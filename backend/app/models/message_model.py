@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Table, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, Table, ForeignKey, Text, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.database import Base
@@ -24,6 +24,11 @@ class Message(Base):
     sender = relationship("UserProfile", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("UserProfile", foreign_keys=[receiver_id], back_populates="received_messages")
 
+    __table_args__ = (
+        # Keyset pagination of a conversation, one direction at a time
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp", "id"),
+    )
+
 
 class ChatGroup(Base):
     __tablename__ = "chat_groups"
@@ -53,4 +58,48 @@ class GroupMessage(Base):
     group = relationship("ChatGroup", back_populates="messages")
     sender = relationship("UserProfile", foreign_keys=[sender_id], back_populates="sent_group_messages")
 
+    __table_args__ = (
+        # Keyset pagination of a group's history
+        Index("ix_group_messages_group_timestamp", "group_id", "timestamp", "id"),
+    )
+
+
+class Conversation(Base):
+    """
+    A direct conversation (a pair of users) or a group chat, with its last
+    message denormalized for inboxes
+    """
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(10), nullable=False)  # "direct" or "group"
+    group_id = Column(Integer, ForeignKey("chat_groups.id", ondelete="CASCADE"), unique=True, nullable=True)
+    # Direct conversations: the pair's profile ids, lower first
+    user_low_id = Column(Integer, ForeignKey("user_profiles.id", ondelete="CASCADE"), nullable=True)
+    user_high_id = Column(Integer, ForeignKey("user_profiles.id", ondelete="CASCADE"), nullable=True)
+    last_message_id = Column(Integer, nullable=True)
+    last_message = Column(Text, nullable=True)
+    last_sender_id = Column(Integer, nullable=True)
+    last_activity_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_direct_pair"),
+    )
+
+
+class ConversationMember(Base):
+    """A user's unread counter and read position in one conversation"""
+    __tablename__ = "conversation_members"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("user_profiles.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    # Copy of Conversation.last_activity_at so a user's inbox is one index range
+    last_activity_at = Column(DateTime, nullable=False)
+    last_read_message_id = Column(Integer, nullable=True)
+    last_read_message_at = Column(DateTime, nullable=True)  # timestamp of that message
+    read_at = Column(DateTime, nullable=True)  # when the read receipt was sent
 
+    __table_args__ = (
+        Index("ix_conversation_members_user_activity", "user_id", "last_activity_at", "conversation_id"),
+    )
@@ -15,6 +15,7 @@ class AuthUser(Base):
     role = Column(String(50), nullable=False, default="user")
 
     is_blocked = Column(Boolean, default=False, nullable=False) 
+    token_epoch = Column(Integer, default=0, nullable=False)  # bumped to revoke all issued tokens
 
     created_at = Column(DateTime(timezone=True),default=None, nullable=True)
     modified_at = Column(DateTime(timezone=True),default=None, nullable=True)
@@ -0,0 +1,44 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class AllocationRequest(BaseModel):
+    residence_hall_id: Optional[int] = None
+    same_gender: bool = True
+    dry_run: bool = False
+    max_seconds: Optional[float] = Field(None, gt=0, le=300)
+
+
+class AllocationPlacement(BaseModel):
+    user_id: int
+    residence_hall_id: int
+    room_number: int
+
+
+class AllocationResult(BaseModel):
+    students: int
+    rooms: int
+    assigned: int
+    unplaced: int
+    objective: float
+    greedy_objective: float
+    swaps: int
+    moves: int
+    committed: int
+    skipped: int
+    placements: Optional[List[AllocationPlacement]] = None
+
+
+class AllocationJobResponse(BaseModel):
+    id: str
+    status: str
+    progress: float
+    message: str
+    residence_hall_id: Optional[int]
+    same_gender: bool
+    dry_run: bool
+    created_at: datetime
+    finished_at: Optional[datetime]
+    result: Optional[AllocationResult]
+    error: Optional[str]
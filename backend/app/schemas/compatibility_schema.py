@@ -15,4 +15,5 @@ class UserMatch(BaseModel):
 
 
 class TopMatches(BaseModel):
-    matches: List[UserMatch]
\ No newline at end of file
+    matches: List[UserMatch]
+    mode: str = "exact"
\ No newline at end of file
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class InboxItem(BaseModel):
+    conversation_id: int
+    kind: str  # "direct" or "group"
+    group_id: Optional[int] = None
+    other_user_id: Optional[int] = None  # direct conversations
+    name: Optional[str] = None
+    image: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_message: Optional[str] = None
+    last_sender_id: Optional[int] = None
+    last_message_time: Optional[datetime] = None
+    unread_count: int = 0
+    last_read_message_id: Optional[int] = None
+
+class InboxPage(BaseModel):
+    conversations: List[InboxItem]
+    next_cursor: Optional[str] = None  # less recently active conversations
+
+class ReadReceipt(BaseModel):
+    user_id: int
+    message_id: Optional[int] = None  # defaults to the conversation's last message
+
+class ConversationMemberResponse(BaseModel):
+    conversation_id: int
+    user_id: int
+    unread_count: int
+    last_read_message_id: Optional[int] = None
+    last_read_message_at: Optional[datetime] = None
+    read_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -76,3 +76,8 @@ class GroupMessageResponse(GroupMessageBase):
 class GroupMessageWithSender(GroupMessageResponse):
     sender_name: Optional[str] = None
     sender_image: Optional[str] = None
+
+class GroupMessagePage(BaseModel):
+    messages: List[GroupMessageWithSender]
+    next_cursor: Optional[str] = None  # older messages
+    prev_cursor: Optional[str] = None  # newer messages
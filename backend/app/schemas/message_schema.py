@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 class MessageCreate(BaseModel):
     sender_id: int
@@ -15,3 +16,8 @@ class MessageResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+class MessagePage(BaseModel):
+    messages: List[MessageResponse]
+    next_cursor: Optional[str] = None  # older messages
+    prev_cursor: Optional[str] = None  # newer messages
@@ -34,6 +34,7 @@ class AuthUserResponse(BaseModel):
     refresh_token_expires_at: Optional[datetime] = None
     last_login: Optional[datetime] = None
     is_logged_in: Optional[bool] = None
+    is_blocked: Optional[bool] = None
 
 
 
@@ -99,6 +100,7 @@ class CurrentUser(BaseModel):
     user_id: int
     role: str
     msu_email: str
+    is_blocked: bool = False
 
 class Token(BaseModel):
     access_token: str
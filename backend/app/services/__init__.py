@@ -15,8 +15,10 @@ from .auth_services import (
     get_total_auth_users_service,
     get_new_users_service,
     logout_user_service,
-    get_auth_user_by_id_service
+    get_auth_user_by_id_service,
+    set_user_blocked_service
 )
+from .user_import_services import import_users_service
 from .user_services import (
     get_user_profile_service,
     update_user_profile_service,
@@ -0,0 +1,235 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+import logging
+import threading
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import Settings
+from app.database import SessionLocal
+from app.crud.allocation_crud import (
+    commit_allocations,
+    load_open_rooms,
+    load_room_occupants,
+    load_unallocated_students
+)
+from app.ml.assignment import OPEN_ROOM, assign_roommates
+from app.ml.encoding import gender_slot
+from app.services.compatibility_services import index_manager
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 50
+
+
+class AllocationJob:
+    """State of one hall-allocation run, updated by its worker thread"""
+
+    def __init__(
+        self,
+        residence_hall_id: Optional[int],
+        same_gender: bool,
+        dry_run: bool,
+        max_seconds: float
+    ):
+        self.id = uuid.uuid4().hex
+        self.residence_hall_id = residence_hall_id
+        self.same_gender = same_gender
+        self.dry_run = dry_run
+        self.max_seconds = max_seconds
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Waiting to start"
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def report(self, progress: float, message: str) -> None:
+        self.progress = round(min(max(progress, 0.0), 1.0), 3)
+        self.message = message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "residence_hall_id": self.residence_hall_id,
+            "same_gender": self.same_gender,
+            "dry_run": self.dry_run,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+def run_allocation(db: Session, job: AllocationJob) -> Dict[str, Any]:
+    """
+    Place every unallocated student into the rooms with free places so that
+    the total compatibility inside rooms is as high as possible, then write
+    all placements in one transaction (unless job.dry_run)
+
+    Existing occupants stay where they are and count towards the
+    compatibility of their room; with job.same_gender rooms never mix
+    genders. Students without features in the compatibility index yet are
+    left unplaced.
+    """
+    job.report(0.0, "Loading students and rooms")
+    index = index_manager.get(db)
+    hall_id = job.residence_hall_id
+
+    students = load_unallocated_students(db, hall_id)
+    rooms = load_open_rooms(db, hall_id)
+    occupants = load_room_occupants(db, hall_id)
+
+    indexed = [student for student in students if student['user_id'] in index.row_of]
+    rows = np.asarray([index.row_of[student['user_id']] for student in indexed], dtype=np.int64)
+    vectors = index.vectors[rows] if len(rows) else np.zeros((0, index.vectors.shape[1]))
+    groups = (
+        np.asarray([gender_slot(student['gender']) for student in indexed], dtype=np.int64)
+        if job.same_gender else None
+    )
+
+    room_keys = [(room['residence_hall_id'], room['room_number']) for room in rooms]
+    position = {key: i for i, key in enumerate(room_keys)}
+    capacity = np.asarray([room['capacity'] - room['current_occupants'] for room in rooms], dtype=np.int64)
+    room_sums = np.zeros((len(rooms), vectors.shape[1]))
+    room_self = np.zeros(len(rooms))
+    room_groups = np.full(len(rooms), OPEN_ROOM, dtype=np.int64)
+
+    for occupant in occupants:
+        i = position.get(occupant['room'])
+        if i is None:
+            continue  # Room is full
+        if room_groups[i] == OPEN_ROOM:
+            room_groups[i] = gender_slot(occupant['gender']) if job.same_gender else 0
+        row = index.row_of.get(occupant['user_id'])
+        if row is not None:
+            vector = index.vectors[row]
+            room_sums[i] += vector
+            room_self[i] += vector @ vector
+
+    job.report(0.05, f"Assigning {len(indexed)} students to {len(rooms)} rooms")
+    assignment = assign_roommates(
+        vectors,
+        capacity,
+        room_sums=room_sums,
+        room_self=room_self,
+        groups=groups,
+        room_groups=room_groups,
+        n_neighbours=Settings.ALLOCATION_NEIGHBOURS,
+        max_seconds=job.max_seconds,
+        progress=lambda fraction, message: job.report(0.05 + 0.85 * fraction, message)
+    )
+
+    placements = [
+        (student['id'], room_keys[room])
+        for student, room in zip(indexed, assignment.room_of.tolist())
+        if room >= 0
+    ]
+
+    result: Dict[str, Any] = {
+        "students": len(students),
+        "rooms": len(rooms),
+        "assigned": len(placements),
+        "unplaced": len(students) - len(placements),
+        "objective": round(assignment.objective, 4),
+        "greedy_objective": round(assignment.greedy_objective, 4),
+        "swaps": assignment.swaps,
+        "moves": assignment.moves,
+        "committed": 0,
+        "skipped": 0,
+    }
+
+    if job.dry_run:
+        user_ids = {student['id']: student['user_id'] for student in indexed}
+        result["placements"] = [
+            {"user_id": user_ids[profile_id], "residence_hall_id": key[0], "room_number": key[1]}
+            for profile_id, key in placements
+        ]
+        return result
+
+    job.report(0.9, "Saving allocations")
+    expected = {key: room['current_occupants'] for key, room in zip(room_keys, rooms)}
+    result["committed"], result["skipped"] = commit_allocations(db, placements, expected, hall_id)
+
+    # Allocation status feeds the "unallocated only" candidate filter
+    index_manager.mark_stale()
+    return result
+
+
+class AllocationJobRegistry:
+    """
+    Runs allocation jobs one at a time on a background thread and keeps
+    their state in memory for status queries
+    """
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: Dict[str, AllocationJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        residence_hall_id: Optional[int] = None,
+        same_gender: bool = True,
+        dry_run: bool = False,
+        max_seconds: Optional[float] = None
+    ) -> AllocationJob:
+        """Start a job; raises ValueError while another one is running"""
+        job = AllocationJob(
+            residence_hall_id,
+            same_gender,
+            dry_run,
+            Settings.ALLOCATION_MAX_SECONDS if max_seconds is None else max_seconds
+        )
+        with self._lock:
+            if any(not other.is_finished for other in self._jobs.values()):
+                raise ValueError("An allocation job is already running")
+            self._jobs[job.id] = job
+            self._prune()
+
+        threading.Thread(target=self._run, args=(job,), name=f"allocation-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[AllocationJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[AllocationJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def _run(self, job: AllocationJob) -> None:
+        db = SessionLocal()
+        job.status = "running"
+        try:
+            job.result = run_allocation(db, job)
+            job.status = "succeeded"
+            job.report(1.0, "Done")
+        except Exception as e:
+            logger.exception("Allocation job %s failed", job.id)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            db.close()
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (job for job in self._jobs.values() if job.is_finished),
+            key=lambda job: job.created_at
+        )
+        for job in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job.id]
+
+
+allocation_jobs = AllocationJobRegistry()
@@ -1,15 +1,30 @@
 # app/services/auth_services.py
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException
 from app.models.user_model import AuthUser, UserProfile
 from app.schemas.user_schema import AuthUserCreate, AuthUserResponse, AuthUserUpdate, AuthUserUpdatePwd
-from app.core.auth import hash_password, refresh_access_token, verify_password, create_tokens
+from app.core.auth import (
+    hash_password,
+    hash_password_async,
+    refresh_access_token,
+    verify_and_update_password_async,
+    verify_password_async,
+    create_tokens,
+    token_claims,
+    principal_cache
+)
 from app.core.config import Settings
 from app.crud.crud import create_record, update_record, delete_record, get_count, get_all_records
+from app.services.compatibility_services import index_manager
+from app.services.chat_cache import chat_cache
 
 
-def create_user_service(user_data: AuthUserCreate, db: Session):
+def create_user_service(user_data: AuthUserCreate, db: Session, password_hash: Optional[str] = None):
+    # Async callers hash with hash_password_async first and pass password_hash
     # Check if user already exists.
     existing_auth_user = db.query(AuthUser).filter(AuthUser.msu_email == user_data.msu_email).first()
     existing_profile = db.query(UserProfile).filter(UserProfile.msu_email == user_data.msu_email).first()
@@ -18,7 +33,7 @@ def create_user_service(user_data: AuthUserCreate, db: Session):
     
     auth_data = {
         "msu_email": user_data.msu_email,
-        "password": hash_password(user_data.password),
+        "password": password_hash or hash_password(user_data.password),
         "role": user_data.role or "user",
         "created_at": datetime.now(timezone.utc),
         "is_blocked": False
@@ -39,6 +54,7 @@ def create_user_service(user_data: AuthUserCreate, db: Session):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
+    index_manager.refresh_user(db, user_id=new_auth_user.id)
     return {"detail": "User created successfully", "status_code": "200"}
 
 
@@ -93,10 +109,17 @@ def create_user_service(user_data: AuthUserCreate, db: Session):
 
 
 
-def authenticate_user_service(msu_email: str, password: str, db: Session):
-    auth_user = db.query(AuthUser).filter(AuthUser.msu_email == msu_email).first()
-    auth_profile = db.query(UserProfile).filter(UserProfile.msu_email == msu_email).first()
-    if not auth_user or not verify_password(password, auth_user.password):
+async def authenticate_user_service(msu_email: str, password: str, db: AsyncSession):
+    """
+    Verify credentials and issue tokens. bcrypt runs on the hashing pool
+    and is awaited, so a login spike doesn't hold request threads.
+    """
+    auth_user = await db.scalar(select(AuthUser).where(AuthUser.msu_email == msu_email))
+    auth_profile = await db.scalar(select(UserProfile).where(UserProfile.msu_email == msu_email))
+    valid, new_hash = (
+        await verify_and_update_password_async(password, auth_user.password) if auth_user else (False, None)
+    )
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
@@ -104,22 +127,22 @@ def authenticate_user_service(msu_email: str, password: str, db: Session):
         )
     
     # Generate both tokens
-    access_token, refresh_token, refresh_expires = create_tokens(
-        {"sub": auth_user.msu_email, "role": auth_user.role}
-    )
+    access_token, refresh_token, refresh_expires = create_tokens(token_claims(auth_user))
     
     # Update user with refresh token and login status
-    update_record(db, AuthUser, auth_user.id, {
-        "refresh_token": refresh_token,
-        "refresh_token_expires_at": refresh_expires,
-        "last_login": datetime.now(timezone.utc),
-        "is_logged_in": True
-    })
-
-    update_record(db, UserProfile, auth_profile.user_id, {
-        "last_login": datetime.now(timezone.utc),
-        "is_logged_in": True
-    })
+    now = datetime.now(timezone.utc)
+    auth_user.refresh_token = refresh_token
+    auth_user.refresh_token_expires_at = refresh_expires
+    auth_user.last_login = now
+    auth_user.is_logged_in = True
+    if new_hash:
+        # Stored with an outdated bcrypt work factor
+        auth_user.password = new_hash
+
+    if auth_profile is not None:
+        auth_profile.last_login = now
+        auth_profile.is_logged_in = True
+    await db.commit()
     
     res = AuthUserResponse(
         id=auth_user.id,
@@ -144,10 +167,15 @@ def delete_user_by_admin_service(user_id: int, db: Session):
     if not auth_user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    profile_id = db.query(UserProfile.id).filter(UserProfile.user_id == user_id).scalar()
     try:
         success = delete_record(db, AuthUser, user_id)
         if not success:
             raise HTTPException(status_code=400, detail="Failed to delete user")
+        index_manager.refresh_user(db, user_id=user_id)
+        principal_cache.invalidate(user_id)
+        if profile_id is not None:
+            chat_cache.invalidate_user(profile_id)
         return {"detail": "User deleted successfully", "status_code": "200"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -166,8 +194,12 @@ def update_auth_user_service(user_id: int, user_data: AuthUserUpdate, db: Sessio
     if user_data.password:
         update_data["password"] = hash_password(user_data.password)
 
+    # Tokens carry the email and role, so outstanding ones are revoked
+    update_data["token_epoch"] = (auth_user.token_epoch or 0) + 1
+
     try:
         updated_user = update_record(db, AuthUser, user_id, update_data)
+        principal_cache.invalidate(user_id)
         if not updated_user:
             raise HTTPException(status_code=404, detail="User not found for update")
         return updated_user  # Now returning the updated user instance
@@ -175,28 +207,25 @@ def update_auth_user_service(user_id: int, user_data: AuthUserUpdate, db: Sessio
         raise HTTPException(status_code=400, detail=str(e))
 
     
-def update_student_password_service(user_id: int, update_data: AuthUserUpdatePwd, db: Session):
+async def update_student_password_service(user_id: int, update_data: AuthUserUpdatePwd, db: AsyncSession):
     """
     Service function for updating a student's password.
     It verifies the current password before updating to the new password.
     """
-    auth_user = db.query(AuthUser).filter(AuthUser.id == user_id).first()
+    auth_user = await db.get(AuthUser, user_id)
     if not auth_user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify the provided current password
-    if not verify_password(update_data.current_password, auth_user.password):
+    if not await verify_password_async(update_data.current_password, auth_user.password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    update_dict = {
-        "password": hash_password(update_data.new_password),
-        "modified_at": datetime.now(timezone.utc)
-    }
-    
-    updated_user = update_record(db, AuthUser, user_id, update_dict)
-    if not updated_user:
-        raise HTTPException(status_code=400, detail="Password update failed")
-    return updated_user
+    auth_user.password = await hash_password_async(update_data.new_password)
+    auth_user.modified_at = datetime.now(timezone.utc)
+    auth_user.token_epoch = (auth_user.token_epoch or 0) + 1  # Sign out other sessions
+    await db.commit()
+    principal_cache.invalidate(user_id)
+    return auth_user
 
 
 def get_all_auth_users_service(db: Session, skip: int = 0, limit: int = 100):
@@ -233,18 +262,36 @@ def logout_user_service(user_id: int, db: Session):
     if not auth_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Clear refresh token and update login status
+    # Clear refresh token, revoke issued tokens and update login status
     update_record(db, AuthUser, user_id, {
         "refresh_token": None,
         "refresh_token_expires_at": None,
-        "is_logged_in": False
+        "is_logged_in": False,
+        "token_epoch": (auth_user.token_epoch or 0) + 1
     })
+    principal_cache.invalidate(user_id)
 
     update_record(db, UserProfile, user_id, {
         "is_logged_in": False
     })
     return {"detail": "Successfully logged out"}
 
+def set_user_blocked_service(user_id: int, blocked: bool, db: Session):
+    """
+    Block or unblock an account. Blocked users' tokens stop working for
+    authenticated endpoints as soon as the principal cache is invalidated.
+    """
+    auth_user = db.query(AuthUser).filter(AuthUser.id == user_id).first()
+    if not auth_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    updated_user = update_record(db, AuthUser, user_id, {
+        "is_blocked": blocked,
+        "modified_at": datetime.now(timezone.utc)
+    })
+    principal_cache.invalidate(user_id)
+    return updated_user
+
 def get_auth_user_by_id_service(user_id: int, db: Session) -> AuthUserResponse:
     auth_user = db.query(AuthUser).filter(AuthUser.id == user_id).first()
     if not auth_user:
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import Settings
+from app.database import run_in_db_session
+from app.models.message_model import group_members
+from app.models.user_model import UserProfile
+from app.websockets.broker import CACHE_TOPIC, ChatBroker, broker
+from app.websockets.connection import run_in_background
+
+logger = logging.getLogger(__name__)
+
+GROUP_MEMBERS = "group_members"
+PROFILE = "profile"
+USER = "user"  # A deleted profile: drops it and every group it was in
+
+
+class ChatCache:
+    """
+    In-memory cache of what the chat hot path reads for every message:
+    group member ids and profile summaries (name and avatar), keyed by
+    user_profiles.id
+
+    Entries are dropped when the data changes: GroupService and the
+    profile services call the invalidate_* methods, which also publish the
+    invalidation on the chat broker so every worker drops its copy. A
+    load that overlaps an invalidation is not cached. Entries expire
+    after ttl_seconds as well, as a backstop for changes made outside the
+    services, and the least recently used are evicted past max_entries.
+    """
+
+    def __init__(self, broker: ChatBroker, ttl_seconds: float = 300.0, max_entries: int = 10000):
+        self.broker = broker
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.hits = 0
+        self.misses = 0
+        broker.subscribe(CACHE_TOPIC, self._on_invalidation)
+
+    def start(self) -> None:
+        # Invalidations from worker threads are published on this loop
+        self._loop = asyncio.get_running_loop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def group_members(self, group_id: int) -> FrozenSet[int]:
+        """Profile ids of the group's members (empty if the group doesn't exist)"""
+        return await self._get((GROUP_MEMBERS, group_id), _load_group_members)
+
+    async def profile(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        """id, first_name, last_name and avatar of a profile, or None if it doesn't exist"""
+        return await self._get((PROFILE, profile_id), _load_profile)
+
+    def invalidate_group(self, group_id: int) -> None:
+        self._invalidate(GROUP_MEMBERS, group_id)
+
+    def invalidate_profile(self, profile_id: int) -> None:
+        self._invalidate(PROFILE, profile_id)
+
+    def invalidate_user(self, profile_id: int) -> None:
+        """Drop a deleted profile along with every cached group it was in"""
+        self._invalidate(USER, profile_id)
+
+    async def _get(self, key: Tuple[str, int], loader) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+
+        value = await run_in_db_session(loader, key[1])
+
+        with self._lock:
+            # Skip caching if the key was invalidated while it was loading
+            if value is not None and self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _drop(self, kind: str, key_id: int) -> None:
+        with self._lock:
+            if kind == USER:
+                keys = [(PROFILE, key_id)] + [
+                    key for key, (_, value) in self._entries.items()
+                    if key[0] == GROUP_MEMBERS and key_id in value
+                ]
+            else:
+                keys = [(kind, key_id)]
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _invalidate(self, kind: str, key_id: int) -> None:
+        self._drop(kind, key_id)
+        self._publish({"kind": kind, "id": key_id})
+
+    def _publish(self, data: Dict[str, Any]) -> None:
+        # Callable from the event loop or from a worker thread (sync routes)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None:
+            run_in_background(self._publish_async(data), running)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(lambda: run_in_background(self._publish_async(data), self._loop))
+
+    async def _publish_async(self, data: Dict[str, Any]) -> None:
+        try:
+            await self.broker.publish(CACHE_TOPIC, data)
+        except Exception:
+            logger.exception("Could not broadcast chat cache invalidation %s", data)
+
+    async def _on_invalidation(self, event: Dict[str, Any]) -> None:
+        self._drop(event["kind"], event["id"])
+
+
+def _load_group_members(db: Session, group_id: int) -> FrozenSet[int]:
+    return frozenset(
+        user_id for (user_id,) in
+        db.query(group_members.c.user_id).filter(group_members.c.group_id == group_id).all()
+    )
+
+
+def _load_profile(db: Session, profile_id: int) -> Optional[Dict[str, Any]]:
+    profile = (
+        db.query(UserProfile.id, UserProfile.first_name, UserProfile.last_name, UserProfile.profile_image)
+        .filter(UserProfile.id == profile_id)
+        .first()
+    )
+    if profile is None:
+        return None
+    return {
+        "id":          profile.id,
+        "first_name":  profile.first_name,
+        "last_name":   profile.last_name,
+        "avatar":      profile.profile_image
+    }
+
+
+chat_cache = ChatCache(
+    broker,
+    ttl_seconds=Settings.CHAT_CACHE_TTL_SECONDS,
+    max_entries=Settings.CHAT_CACHE_MAX_ENTRIES
+)
@@ -1,11 +1,30 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+import logging
+import os
+import threading
 import numpy as np
 from sqlalchemy.orm import Session
-from app.ml.feature_extraction import extract_features_for_all_users, extract_user_features
-from app.ml.similarity import calculate_compatibility_score, get_top_matches, calculate_similarity_matrix
+from app.core.config import Settings
+from app.database import SessionLocal
+from sqlalchemy import select
+from app.crud.matching_crud import load_answer_matrix, load_profile_columns, load_questions, load_rating_totals
+from app.ml.feature_extraction import (
+    encode_feature_matrix,
+    extract_features_for_all_users,
+    extract_user_features
+)
+from app.ml.candidate_filter import CandidateFilter, ProfileAttributes
+from app.ml.encoding import FeatureVocabulary
+from app.ml.scoring import parse_category_weights
+from app.ml.similarity import calculate_compatibility_score
+from app.ml.compatibility_index import CompatibilityIndex
+from app.ml.feature_store import IncrementalFeatureStore
 
 # Import your database models
-from app.models import UserProfile, Question, UserResponse
+from app.models import UserProfile, UserResponse
+
+logger = logging.getLogger(__name__)
+
 
 class MatchingService:
     def __init__(self, db):
@@ -14,22 +33,45 @@ class MatchingService:
     def get_user_profiles_from_db(self) -> List[Dict[str, Any]]:
         """Get all user profiles from the database"""
         profiles = self.db.query(UserProfile).all()
-        return [
-            {
-                'user_id': profile.user_id,
-                'age': profile.age,
-                'gender': profile.gender,
-                'majors': profile.majors,
-                'bio': profile.bio,
-                'residence_hall_id': profile.residence_hall_id
-            }
-            for profile in profiles
-        ]
+        return [self._profile_to_dict(profile) for profile in profiles]
+
+
+    def get_user_profile_from_db(
+        self,
+        user_id: Optional[int] = None,
+        profile_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get a single user profile by auth user id or profile id"""
+        query = self.db.query(UserProfile)
+        if profile_id is not None:
+            query = query.filter(UserProfile.id == profile_id)
+        else:
+            query = query.filter(UserProfile.user_id == user_id)
+        profile = query.first()
+        return self._profile_to_dict(profile) if profile else None
+
+
+    @staticmethod
+    def _profile_to_dict(profile: UserProfile) -> Dict[str, Any]:
+        return {
+            'id': profile.id,
+            'user_id': profile.user_id,
+            'age': profile.age,
+            'gender': profile.gender,
+            'majors': profile.majors,
+            'bio': profile.bio,
+            'residence_hall_id': profile.residence_hall_id,
+            'move_in_date': profile.move_in_date,
+            'room_number': profile.room_number
+        }
 
 
-    def get_user_responses_from_db(self) -> List[Dict[str, Any]]:
-        """Get all user responses from the database"""
-        responses = self.db.query(UserResponse).all()
+    def get_user_responses_from_db(self, profile_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get all user responses (or one profile's responses) from the database"""
+        query = self.db.query(UserResponse)
+        if profile_id is not None:
+            query = query.filter(UserResponse.user_profile_id == profile_id)
+        responses = query.all()
         return [
             {
                 'user_profile_id': response.user_profile_id,
@@ -41,16 +83,8 @@ class MatchingService:
 
 
     def get_questions_from_db(self) -> List[Dict[str, Any]]:
-        """Get all questions from the database"""
-        questions = self.db.query(Question).all()
-        return [
-            {
-                'id': question.id,
-                'question_text': question.question_text,
-                'category': question.category
-            }
-            for question in questions
-        ]
+        """Get all questions, with their option texts in Option.id order, from the database"""
+        return load_questions(self.db)
 
 
     def get_user_feature_vectors(self) -> Dict[int, np.ndarray]:
@@ -87,20 +121,23 @@ class MatchingService:
         Returns:
         - Compatibility score (0-100)
         """
-        # Get user feature vectors
-        user_features = self.get_user_feature_vectors()
-        
-        # Calculate compatibility score
-        score = calculate_compatibility_score(user1_id, user2_id, user_features)
+        # Only the two users' vectors are needed, not the whole population
+        vectors = index_manager.pair_vectors(self.db, user1_id, user2_id)
+        if vectors is None:
+            return 0.0  # No data for one or both users
         
-        return score
+        # Pure similarity, so the score is symmetric; peer ratings only
+        # affect how a user's candidates are ranked
+        return calculate_compatibility_score(*vectors)
 
 
     def get_top_compatible_users(
         self,
         user_id: int,
         skip: int = 0,
-        n: int = 10
+        n: int = 10,
+        mode: Optional[str] = None,
+        filters: Optional[CandidateFilter] = None
     ) -> List[Dict[str, Any]]:
         """
         Get top N compatible users for a given user
@@ -108,32 +145,373 @@ class MatchingService:
         Parameters:
         - db: Database session
         - user_id: ID of the user to find matches for
+        - skip: Number of best matches to skip (for pagination)
         - n: Number of matches to return
+        - mode: "exact" or "approximate"; defaults to MATCHING_SEARCH_MODE
+        - filters: Restrict the candidates (hall, gender, move-in window, ...)
         
         Returns:
         - List of user IDs and compatibility scores
         """
-        # Get data from database
-        user_profiles = self.get_user_profiles_from_db()
-        user_responses = self.get_user_responses_from_db()
-        questions = self.get_questions_from_db()
-        
-        # Extract features for all users
-        user_features, user_ids = extract_features_for_all_users(user_profiles, user_responses, questions)
+        # Answer from the precomputed index instead of rebuilding features
+        index = index_manager.get(self.db)
         
-        # Calculate similarity matrix
-        similarity_dict = calculate_similarity_matrix(user_features, user_ids)
-        
-        # Get top matches
-        top_matches = get_top_matches(user_id, similarity_dict, n)
+        # Get one page of top matches
+        top_matches = index.top_k(
+            user_id,
+            n,
+            skip=skip,
+            mode=mode or Settings.MATCHING_SEARCH_MODE,
+            filters=filters
+        )
         
         # Format results
-        results = [
+        return [
             {
                 'user_id': match_id,
                 'compatibility_score': round(score, 2)
             }
             for match_id, score in top_matches
         ]
+
+    def get_top_compatible_users_for_all(self, n: int = 10) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Get top N compatible users for every user, e.g. to suggest roommates
+        to a whole intake at once
+        
+        Parameters:
+        - n: Number of matches per user
+        
+        Returns:
+        - Dictionary mapping each user ID to its list of user IDs and compatibility scores
+        """
+        index = index_manager.get(self.db)
+        
+        all_matches = index.all_top_k(
+            n,
+            block_size=Settings.MATCHING_BLOCK_SIZE,
+            n_jobs=Settings.MATCHING_WORKERS
+        )
         
-        return results[skip:skip+n]
\ No newline at end of file
+        return {
+            user_id: [
+                {
+                    'user_id': match_id,
+                    'compatibility_score': round(score, 2)
+                }
+                for match_id, score in matches
+            ]
+            for user_id, matches in all_matches.items()
+        }
+
+
+# Refresh passes before giving up on a user whose store keeps being replaced
+REFRESH_ATTEMPTS = 3
+
+
+class CompatibilityIndexManager:
+    """
+    Owns the process-wide IncrementalFeatureStore and CompatibilityIndex.
+
+    The index is built once (or loaded from a snapshot) and then served to
+    every request. Profile and questionnaire edits re-extract only the user
+    who changed (refresh_user); all vectors are re-normalised only when the
+    feature statistics drift past MATCHING_DRIFT_THRESHOLD. A full rebuild
+    runs on a background thread when the index is marked stale or gets older
+    than MATCHING_INDEX_MAX_AGE_SECONDS, while the old index keeps serving.
+    Feedback writes adjust the receiver's rating aggregates in place
+    (apply_rating_change), so ranking never queries feedback.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        max_age_seconds: int = 900,
+        drift_threshold: float = 0.1,
+        ann_backend: str = "lsh",
+        ann_params: Optional[Dict[str, Any]] = None,
+        rating_weight: float = 0.0,
+        rating_prior: Tuple[float, float] = (3.0, 5.0),
+        category_weights: Optional[Dict[str, float]] = None
+    ):
+        self.snapshot_path = snapshot_path
+        self.max_age_seconds = max_age_seconds
+        self.drift_threshold = drift_threshold
+        self.ann_backend = ann_backend
+        self.ann_params = ann_params or {}
+        self.rating_weight = rating_weight
+        self.rating_prior = rating_prior
+        self.category_weights = category_weights or {}
+        self._index: Optional[CompatibilityIndex] = None
+        self._store: Optional[IncrementalFeatureStore] = None
+        self._stale = False
+        self._build_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    @property
+    def is_stale(self) -> bool:
+        index = self._index
+        return index is None or self._stale or index.age > self.max_age_seconds
+
+    def get(self, db: Session) -> CompatibilityIndex:
+        """
+        Return the current index, building it synchronously only if this
+        process has never had one
+        """
+        if self._index is None:
+            # Startup warm-up may already be building it; don't build twice
+            warming = self._rebuild_thread
+            if warming is not None:
+                warming.join()
+            with self._build_lock:
+                if self._index is None:
+                    snapshot = self._load_snapshot()
+                    if snapshot is not None:
+                        self._apply_category_weights(snapshot, load_questions(db))
+                        self._install(snapshot, save=False)
+                    else:
+                        self._install(self.build_store(db))
+        if self.is_stale:
+            self.rebuild_in_background()
+        return self._index
+
+    def mark_stale(self) -> None:
+        """Flag the index for rebuild on next use"""
+        self._stale = True
+
+    def refresh_user(self, db: Session, user_id: Optional[int] = None, profile_id: Optional[int] = None) -> None:
+        """
+        Re-extract one user's features after their profile or responses
+        changed. Pass either the auth user_id or the profile id.
+        """
+        try:
+            # A rebuild can install a new store while features are being
+            # extracted; then refresh against the new one
+            for _ in range(REFRESH_ATTEMPTS):
+                store, index = self._store, self._index
+                if store is None or index is None:
+                    return  # The first build will pick the change up
+                if self._refresh_user(db, store, index, user_id, profile_id):
+                    return
+            self.mark_stale()
+        except Exception:
+            # Never fail the write that triggered this; fall back to a rebuild
+            logger.exception("Incremental refresh failed for user %s / profile %s", user_id, profile_id)
+            self.mark_stale()
+
+    def _refresh_user(
+        self,
+        db: Session,
+        store: IncrementalFeatureStore,
+        index: CompatibilityIndex,
+        user_id: Optional[int],
+        profile_id: Optional[int]
+    ) -> bool:
+        """Apply the refresh; False if store/index were replaced meanwhile"""
+        service = MatchingService(db)
+        questions = service.get_questions_from_db()
+        if not store.vocabulary.same_questions(questions):
+            self.mark_stale()  # Feature layout changed; needs a full rebuild
+            return True
+        if not np.array_equal(self._column_weights(store.vocabulary, questions), store.column_weights):
+            self.mark_stale()  # A question's category changed; re-weight everyone
+
+        extracted = self._extract_user(service, store.vocabulary, user_id=user_id, profile_id=profile_id)
+        if extracted is not None and not store.vocabulary.knows_majors(extracted[0].get('majors')):
+            self.mark_stale()  # Encoded as "unknown" until a rebuild extends the vocabulary
+
+        with self._update_lock:
+            if self._store is not store or self._index is not index:
+                return False  # Swapped by _install; the new store is retried
+
+            if extracted is None:
+                if user_id is not None:
+                    store.remove(user_id)
+                    index.remove(user_id)
+                return True
+
+            profile, raw = extracted
+            store.upsert(profile['user_id'], raw, ProfileAttributes.row_from_profile(profile))
+
+            # Register the user first so a re-normalisation below covers them too
+            index.upsert(profile['user_id'], store.normalize(raw))
+            if store.needs_renormalization():
+                store.publish_stats()
+                index.replace_vectors(store.normalized_matrix(), store.user_ids)
+
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                self.mark_stale()  # The running build may have read the old row
+            return True
+
+    def apply_rating_change(self, db: Session, profile_id: int, rating_delta: float, count_delta: int) -> None:
+        """
+        Adjust the rating aggregates of the profile that received feedback
+        (count_delta is +1 for new feedback, -1 for deleted, 0 for edits)
+        """
+        store = self._store
+        if store is None or store.attributes is None:
+            return  # The first build will aggregate the feedback
+
+        try:
+            user_id = db.execute(
+                select(UserProfile.user_id).where(UserProfile.id == profile_id)
+            ).scalar_one_or_none()
+            with self._update_lock:
+                row = store.row_of.get(user_id)
+                if row is not None:
+                    store.attributes.add_rating(row, rating_delta, count_delta)
+                if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                    self.mark_stale()  # The running build may have read the old totals
+        except Exception:
+            logger.exception("Rating update failed for profile %s", profile_id)
+            self.mark_stale()
+
+    def pair_vectors(
+        self,
+        db: Session,
+        user1_id: int,
+        user2_id: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Normalized feature vectors for two users, or None if either has no
+        profile. Indexed users are read straight from the index; anyone not
+        indexed yet is extracted on its own and normalized with the cached
+        statistics, so the cost doesn't depend on the population size.
+        """
+        index = self.get(db)
+        store = self._store
+        service = MatchingService(db)
+        questions = None
+
+        vectors = []
+        for user_id in (user1_id, user2_id):
+            row = index.row_of.get(user_id)
+            if row is not None:
+                vectors.append(index.vectors[row])
+                continue
+
+            if questions is None:
+                questions = service.get_questions_from_db()
+                if not store.vocabulary.same_questions(questions):
+                    return None  # Layout changed; wait for the rebuild
+
+            extracted = self._extract_user(service, store.vocabulary, user_id=user_id)
+            if extracted is None:
+                return None
+            vectors.append(store.normalize(extracted[1]))
+
+        return vectors[0], vectors[1]
+
+    def _extract_user(
+        self,
+        service: "MatchingService",
+        vocabulary: FeatureVocabulary,
+        user_id: Optional[int] = None,
+        profile_id: Optional[int] = None
+    ) -> Optional[Tuple[Dict[str, Any], np.ndarray]]:
+        """Raw features for a single user, or None if the profile doesn't exist"""
+        profile = service.get_user_profile_from_db(user_id=user_id, profile_id=profile_id)
+        if profile is None:
+            return None
+        responses = service.get_user_responses_from_db(profile_id=profile['id'])
+        return profile, extract_user_features(profile, responses, [], vocabulary)
+
+    def build_store(self, db: Session) -> IncrementalFeatureStore:
+        """
+        Extract raw features for every user from the database, streaming
+        plain columns instead of hydrating ORM objects
+        """
+        questions = load_questions(db)
+        profiles = load_profile_columns(db)
+        profiles['rating_sum'], profiles['rating_count'] = load_rating_totals(db, profiles['profile_ids'])
+        vocabulary = FeatureVocabulary.from_columns(profiles['majors'], questions)
+        answers = load_answer_matrix(db, profiles['profile_ids'], vocabulary)
+        store = IncrementalFeatureStore(
+            profiles['user_ids'].tolist(),
+            encode_feature_matrix(profiles, answers, vocabulary),
+            vocabulary=vocabulary,
+            attributes=ProfileAttributes.from_profile_columns(profiles),
+            drift_threshold=self.drift_threshold
+        )
+        self._apply_category_weights(store, questions)
+        return store
+
+    def _column_weights(self, vocabulary: FeatureVocabulary, questions: List[Dict[str, Any]]) -> np.ndarray:
+        categories = {q['id']: q['category'] for q in questions}
+        return vocabulary.column_weights(categories, self.category_weights)
+
+    def _apply_category_weights(self, store: IncrementalFeatureStore, questions: List[Dict[str, Any]]) -> None:
+        store.column_weights = self._column_weights(store.vocabulary, questions)
+
+    def rebuild_in_background(self) -> None:
+        """Start a rebuild thread unless one is already running"""
+        with self._build_lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._stale = False
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild, name="compatibility-index-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild(self) -> None:
+        db = SessionLocal()
+        try:
+            self._install(self.build_store(db))
+        except Exception:
+            self._stale = True
+            logger.exception("Compatibility index rebuild failed")
+        finally:
+            db.close()
+
+    def _install(self, store: IncrementalFeatureStore, save: bool = True) -> None:
+        index = CompatibilityIndex(
+            store.user_ids,
+            store.normalized_matrix(),
+            built_at=store.built_at,
+            ann_backend=self.ann_backend,
+            ann_params=self.ann_params,
+            attributes=store.attributes,
+            rating_weight=self.rating_weight,
+            rating_prior=self.rating_prior
+        )
+        with self._update_lock:
+            self._store, self._index = store, index
+        if save:
+            self._save_snapshot(store)
+
+    def _load_snapshot(self) -> Optional[IncrementalFeatureStore]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            store = IncrementalFeatureStore.load(self.snapshot_path)
+        except Exception:
+            logger.exception("Could not load compatibility index snapshot %s", self.snapshot_path)
+            return None
+        # Snapshots without a vocabulary or attributes predate those features
+        if store.vocabulary is None or store.attributes is None:
+            return None
+        return store
+
+    def _save_snapshot(self, store: IncrementalFeatureStore) -> None:
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            store.save(tmp_path)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            logger.exception("Could not save compatibility index snapshot %s", self.snapshot_path)
+
+
+index_manager = CompatibilityIndexManager(
+    snapshot_path=Settings.MATCHING_INDEX_PATH,
+    max_age_seconds=Settings.MATCHING_INDEX_MAX_AGE_SECONDS,
+    drift_threshold=Settings.MATCHING_DRIFT_THRESHOLD,
+    ann_backend=Settings.MATCHING_ANN_BACKEND,
+    ann_params={"n_tables": Settings.MATCHING_LSH_TABLES, "n_bits": Settings.MATCHING_LSH_BITS},
+    rating_weight=Settings.MATCHING_RATING_WEIGHT,
+    rating_prior=(Settings.MATCHING_RATING_PRIOR_MEAN, Settings.MATCHING_RATING_PRIOR_COUNT),
+    category_weights=parse_category_weights(Settings.MATCHING_CATEGORY_WEIGHTS)
+)
@@ -0,0 +1,354 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from ..models.message_model import ChatGroup, Conversation, ConversationMember, GroupMessage, Message, group_members
+from ..models.user_model import UserProfile
+from ..crud.pagination import keyset_page, keyset_window
+
+DIRECT = "direct"
+GROUP = "group"
+
+
+def _utc_naive(timestamp: datetime) -> datetime:
+    # Conversation timestamps are stored as naive UTC, like the message tables
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _now() -> datetime:
+    return _utc_naive(datetime.now(timezone.utc))
+
+
+class ConversationService:
+    """
+    Conversations (a pair of users or a group) with their last message and
+    each member's unread count kept up to date as messages are written, so
+    inboxes are read from conversation_members instead of being aggregated
+    from the message tables
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ── Creation and membership ────────────────────────────────────────────
+    def create_group_conversation(self, group_id: int, member_ids: Iterable[int]) -> Conversation:
+        """Add the conversation for a new group (the caller commits)"""
+        now = _now()
+        conversation = Conversation(kind=GROUP, group_id=group_id, last_activity_at=now)
+        self.db.add(conversation)
+        self.db.flush()
+        self.db.add_all([
+            ConversationMember(conversation_id=conversation.id, user_id=user_id, unread_count=0, last_activity_at=now)
+            for user_id in set(member_ids)
+        ])
+        self.db.flush()
+        return conversation
+
+    def add_group_member(self, group_id: int, user_id: int) -> None:
+        """Give a new group member a place in the group's conversation (the caller commits)"""
+        conversation_id = self.group_conversation_ids([group_id]).get(group_id)
+        if conversation_id is None or self.db.get(ConversationMember, (conversation_id, user_id)):
+            return
+        conversation = self.db.get(Conversation, conversation_id)
+        self.db.add(ConversationMember(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            unread_count=0,
+            last_activity_at=conversation.last_activity_at
+        ))
+        self.db.flush()
+
+    def remove_group_member(self, group_id: int, user_id: int) -> None:
+        """Drop a former member's place in the group's conversation (the caller commits)"""
+        self.db.query(ConversationMember).filter(
+            ConversationMember.user_id == user_id,
+            ConversationMember.conversation_id.in_(
+                select(Conversation.id).where(Conversation.group_id == group_id)
+            )
+        ).delete(synchronize_session=False)
+
+    def direct_conversation_ids(self, pairs: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+        """
+        Ids of the direct conversations between each (lower, higher) pair of
+        profile ids, creating missing ones
+        """
+        pairs = set(pairs)
+        found = self._direct_conversation_ids(pairs)
+        for low, high in pairs - found.keys():
+            try:
+                with self.db.begin_nested():
+                    now = _now()
+                    conversation = Conversation(kind=DIRECT, user_low_id=low, user_high_id=high, last_activity_at=now)
+                    self.db.add(conversation)
+                    self.db.flush()
+                    self.db.add_all([
+                        ConversationMember(conversation_id=conversation.id, user_id=user_id, unread_count=0, last_activity_at=now)
+                        for user_id in {low, high}
+                    ])
+                    self.db.flush()
+                found[(low, high)] = conversation.id
+            except IntegrityError:
+                # Created by another worker meanwhile, or a user no longer exists
+                found.update(self._direct_conversation_ids([(low, high)]))
+        return found
+
+    def group_conversation_ids(self, group_ids: Iterable[int]) -> Dict[int, int]:
+        """Ids of the groups' conversations, creating any that are missing"""
+        group_ids = set(group_ids)
+        if not group_ids:
+            return {}
+        found = self._group_conversation_ids(group_ids)
+        for group_id in group_ids - found.keys():
+            try:
+                with self.db.begin_nested():
+                    member_ids = [
+                        user_id for (user_id,) in
+                        self.db.query(group_members.c.user_id).filter(group_members.c.group_id == group_id).all()
+                    ]
+                    found[group_id] = self.create_group_conversation(group_id, member_ids).id
+            except IntegrityError:
+                found.update(self._group_conversation_ids([group_id]))
+        return found
+
+    def _direct_conversation_ids(self, pairs: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        rows = (
+            self.db.query(Conversation.id, Conversation.user_low_id, Conversation.user_high_id)
+            .filter(tuple_(Conversation.user_low_id, Conversation.user_high_id).in_(pairs))
+            .all()
+        )
+        return {(low, high): conversation_id for conversation_id, low, high in rows}
+
+    def _group_conversation_ids(self, group_ids: Iterable[int]) -> Dict[int, int]:
+        rows = (
+            self.db.query(Conversation.group_id, Conversation.id)
+            .filter(Conversation.group_id.in_(list(group_ids)))
+            .all()
+        )
+        return dict(rows)
+
+    # ── Counters ───────────────────────────────────────────────────────────
+    def record_messages(self, batch: Dict[str, List[Dict[str, Any]]]) -> None:
+        """
+        Update last message, activity time and unread counts for newly
+        inserted messages, keyed by table name as the message writer
+        flushes them (the caller commits)
+        """
+        direct = batch.get(Message.__tablename__, [])
+        group = batch.get(GroupMessage.__tablename__, [])
+
+        pair_of = lambda row: (min(row["sender_id"], row["receiver_id"]), max(row["sender_id"], row["receiver_id"]))
+        direct_ids = self.direct_conversation_ids(pair_of(row) for row in direct)
+        group_ids = self.group_conversation_ids(row["group_id"] for row in group)
+
+        by_conversation: Dict[int, List[Dict[str, Any]]] = {}
+        for row in direct:
+            if pair_of(row) in direct_ids:
+                by_conversation.setdefault(direct_ids[pair_of(row)], []).append(row)
+        for row in group:
+            if row["group_id"] in group_ids:
+                by_conversation.setdefault(group_ids[row["group_id"]], []).append(row)
+        if not by_conversation:
+            return
+
+        latest = []
+        unread = []
+        for conversation_id, rows in by_conversation.items():
+            last = max(rows, key=lambda row: (_utc_naive(row["timestamp"]), row["id"]))
+            latest.append({
+                "b_id": conversation_id,
+                "b_message_id": last["id"],
+                "b_content": last["content"],
+                "b_sender_id": last["sender_id"],
+                "b_at": _utc_naive(last["timestamp"])
+            })
+            for sender_id, count in Counter(row["sender_id"] for row in rows).items():
+                unread.append({"b_id": conversation_id, "b_sender_id": sender_id, "b_count": count})
+
+        conversations = Conversation.__table__
+        members = ConversationMember.__table__
+
+        # Rows replayed or flushed late by another worker must not replace a newer last message
+        self.db.execute(
+            conversations.update()
+            .where(
+                conversations.c.id == bindparam("b_id"),
+                or_(conversations.c.last_message_id.is_(None), conversations.c.last_activity_at <= bindparam("b_at"))
+            )
+            .values(
+                last_message_id=bindparam("b_message_id"),
+                last_message=bindparam("b_content"),
+                last_sender_id=bindparam("b_sender_id"),
+                last_activity_at=bindparam("b_at")
+            ),
+            latest
+        )
+        self.db.execute(
+            members.update()
+            .where(members.c.conversation_id.in_(list(by_conversation)))
+            .values(
+                last_activity_at=select(conversations.c.last_activity_at)
+                .where(conversations.c.id == members.c.conversation_id)
+                .scalar_subquery()
+            )
+        )
+        # Everyone but the sender has that sender's messages to read
+        self.db.execute(
+            members.update()
+            .where(members.c.conversation_id == bindparam("b_id"), members.c.user_id != bindparam("b_sender_id"))
+            .values(unread_count=members.c.unread_count + bindparam("b_count")),
+            unread
+        )
+
+    def mark_read(self, conversation_id: int, user_id: int, message_id: Optional[int] = None) -> Optional[ConversationMember]:
+        """
+        Record a read receipt
+
+        Parameters:
+        - message_id: Last message read; the conversation's last message if
+          omitted. Receipts never move a member's read position backwards.
+
+        Returns:
+        - The member's updated state, or None if the user is not in the
+          conversation; raises ValueError if the message is not part of it
+        """
+        member = self.db.get(ConversationMember, (conversation_id, user_id))
+        if member is None:
+            return None
+        conversation = self.db.get(Conversation, conversation_id)
+
+        if message_id is None or message_id == conversation.last_message_id:
+            position = (conversation.last_activity_at, conversation.last_message_id)
+            unread = 0
+        else:
+            message = self._find_message(conversation, message_id)
+            if message is None:
+                raise ValueError(f"Message {message_id} is not in conversation {conversation_id}")
+            position = (message.timestamp, message.id)
+            unread = self._count_unread_after(conversation, user_id, position)
+
+        if position[1] is not None:
+            current = (member.last_read_message_at, member.last_read_message_id)
+            if current[1] is None or current < position:
+                member.last_read_message_id = position[1]
+                member.last_read_message_at = position[0]
+                member.unread_count = unread
+        member.read_at = _now()
+        self.db.commit()
+        self.db.refresh(member)
+        return member
+
+    def get_receipts(self, conversation_id: int) -> List[ConversationMember]:
+        return (
+            self.db.query(ConversationMember)
+            .filter(ConversationMember.conversation_id == conversation_id)
+            .all()
+        )
+
+    def _find_message(self, conversation: Conversation, message_id: int):
+        if conversation.kind == GROUP:
+            return (
+                self.db.query(GroupMessage)
+                .filter(GroupMessage.id == message_id, GroupMessage.group_id == conversation.group_id)
+                .first()
+            )
+        low, high = conversation.user_low_id, conversation.user_high_id
+        return (
+            self.db.query(Message)
+            .filter(
+                Message.id == message_id,
+                or_(
+                    and_(Message.sender_id == low, Message.receiver_id == high),
+                    and_(Message.sender_id == high, Message.receiver_id == low)
+                )
+            )
+            .first()
+        )
+
+    def _count_unread_after(self, conversation: Conversation, user_id: int, position: Tuple[datetime, int]) -> int:
+        # Served by the (..., timestamp, id) history indexes
+        if conversation.kind == GROUP:
+            return (
+                self.db.query(GroupMessage)
+                .filter(
+                    GroupMessage.group_id == conversation.group_id,
+                    tuple_(GroupMessage.timestamp, GroupMessage.id) > tuple_(*position),
+                    or_(GroupMessage.sender_id.is_(None), GroupMessage.sender_id != user_id)
+                )
+                .count()
+            )
+        other_id = conversation.user_high_id if conversation.user_low_id == user_id else conversation.user_low_id
+        if other_id == user_id:
+            return 0
+        return (
+            self.db.query(Message)
+            .filter(
+                Message.sender_id == other_id,
+                Message.receiver_id == user_id,
+                tuple_(Message.timestamp, Message.id) > tuple_(*position)
+            )
+            .count()
+        )
+
+    # ── Inbox ──────────────────────────────────────────────────────────────
+    def get_inbox(self, user_id: int, limit: int = 50, before: Optional[str] = None) -> Dict[str, Any]:
+        """
+        A user's conversations, most recently active first, read from one
+        range of ix_conversation_members_user_activity
+
+        Parameters:
+        - before: next_cursor of a previous page
+
+        Returns:
+        - items, next_cursor and prev_cursor (see crud.pagination.keyset_page)
+        """
+        predicate, order_by, older = keyset_window(
+            ConversationMember.last_activity_at, ConversationMember.conversation_id, before=before
+        )
+        other = aliased(UserProfile)
+        other_id = case(
+            (Conversation.user_low_id == user_id, Conversation.user_high_id),
+            else_=Conversation.user_low_id
+        )
+
+        query = (
+            self.db.query(
+                ConversationMember, Conversation, ChatGroup.name,
+                other.id, other.first_name, other.last_name, other.profile_image
+            )
+            .join(Conversation, Conversation.id == ConversationMember.conversation_id)
+            .outerjoin(ChatGroup, ChatGroup.id == Conversation.group_id)
+            .outerjoin(other, and_(Conversation.kind == DIRECT, other.id == other_id))
+            .filter(ConversationMember.user_id == user_id)
+        )
+        if predicate is not None:
+            query = query.filter(predicate)
+        rows = query.order_by(*order_by).limit(limit + 1).all()
+
+        page = keyset_page(rows, limit, lambda row: (row[0].last_activity_at, row[0].conversation_id), older, before)
+        page["items"] = [
+            {
+                "conversation_id": conversation.id,
+                "kind": conversation.kind,
+                "group_id": conversation.group_id,
+                "other_user_id": other_user_id,
+                "name": group_name if conversation.kind == GROUP else f"{first_name or ''} {last_name or ''}".strip(),
+                "image": profile_image,
+                "last_message_id": conversation.last_message_id,
+                "last_message": conversation.last_message,
+                "last_sender_id": conversation.last_sender_id,
+                "last_message_time": conversation.last_activity_at if conversation.last_message_id else None,
+                "unread_count": member.unread_count,
+                "last_read_message_id": member.last_read_message_id
+            }
+            for member, conversation, group_name, other_user_id, first_name, last_name, profile_image in page["items"]
+        ]
+        return page
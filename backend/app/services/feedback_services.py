@@ -5,6 +5,8 @@ from sqlalchemy.orm import Session, joinedload
 from ..models.feedback_model import Feedback
 from ..schemas.feedback_schema import FeedbackCreate, FeedbackResponse, FeedbackUpdate
 from ..services.user_services import get_user_profile_service
+from ..services.compatibility_services import index_manager
+from ..crud.matching_crud import get_rating_totals
 from ..crud.crud import (
     create_record, 
     get_all_records, 
@@ -31,11 +33,15 @@ class FeedbackService:
             data=feedback_data
         )
 
+        # Keep the matcher's rating aggregates current
+        index_manager.apply_rating_change(self.db, created_feedback.receiver_user_id, created_feedback.rating, 1)
+
         return created_feedback
 
 
     def update_feedback(self, feedback: FeedbackUpdate):
         given_feedback = self.get_current_feedback(feedback.giver_user_id,feedback.receiver_user_id)
+        old_rating = given_feedback.rating
         
         feedback_data = feedback.model_dump()
 
@@ -46,10 +52,16 @@ class FeedbackService:
             update_data=feedback_data
         )
 
+        if updated_feedback.rating != old_rating:
+            index_manager.apply_rating_change(
+                self.db, updated_feedback.receiver_user_id, updated_feedback.rating - old_rating, 0
+            )
+
         return updated_feedback
 
     def delete_feedback(self, giver_user_id: int, receiver_user_id: int) -> bool:
         given_feedback = self.get_current_feedback(giver_user_id=giver_user_id, receiver_user_id=receiver_user_id)
+        old_rating = given_feedback.rating
 
         deleted_feedback = delete_record(
             db=self.db,
@@ -59,6 +71,8 @@ class FeedbackService:
 
         if not deleted_feedback:
             raise ValueError(f"Feedback for user with {receiver_user_id} not found.")
+
+        index_manager.apply_rating_change(self.db, receiver_user_id, -old_rating, -1)
         
         return True
     
@@ -91,10 +105,8 @@ class FeedbackService:
         return feedbacks
 
     def get_average_rating(self, user_id: int) -> float:
-        feedbacks = self.list_feedback_user_received(user_id)
-
-        total_rating = sum(feedback.rating for feedback in feedbacks)
-        number_of_feedbacks = len(feedbacks)
+        # Aggregated in the database instead of loading every feedback row
+        total_rating, number_of_feedbacks = get_rating_totals(self.db, user_id)
 
         if number_of_feedbacks == 0:
             return 0.0  # Avoid division by zero
@@ -1,12 +1,14 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
-from ..models.message_model import ChatGroup, group_members, GroupMessage
+from ..models.message_model import ChatGroup, group_members, GroupMessage, Conversation, ConversationMember
 from ..models.user_model import UserProfile
 from ..schemas.group_schema import GroupCreate, GroupUpdate
-from ..schemas.group_schema import GroupMessageCreate
+from .chat_cache import chat_cache
+from .conversation_services import ConversationService
+from ..crud.pagination import keyset_page, keyset_window
 
 class GroupService:
     def __init__(self, db: Session):
@@ -43,9 +45,13 @@ class GroupService:
                     is_admin=1
                 )
             )
-            
+        
+        ConversationService(self.db).create_group_conversation(
+            new_group.id, set(group_data.member_ids) | {group_data.creator_id}
+        )
         self.db.commit()
         self.db.refresh(new_group)
+        chat_cache.invalidate_group(new_group.id)
         return new_group
     
     def get_group(self, group_id: int) -> Optional[ChatGroup]:
@@ -60,58 +66,41 @@ class GroupService:
         )
     
     def get_group_with_last_message(self, user_id: int) -> List[dict]:
-        # This query gets all groups with their last message info
+        # The user's group conversations, most recently active first, with
+        # last message and unread count kept up to date on every send and read
         groups = (
-            self.db.query(
-                ChatGroup,
-                func.max(GroupMessage.timestamp).label("last_message_time"),
-                func.count(GroupMessage.id).filter(
-                    and_(
-                        GroupMessage.timestamp > group_members.c.joined_at,
-                        GroupMessage.sender_id != user_id
-                    )
-                ).label("unread_count")
-            )
-            .join(group_members, ChatGroup.id == group_members.c.group_id)
-            .outerjoin(GroupMessage, ChatGroup.id == GroupMessage.group_id)
-            .filter(group_members.c.user_id == user_id)
-            .group_by(ChatGroup.id)
-            .order_by(desc("last_message_time"))
+            self.db.query(ChatGroup, Conversation, ConversationMember)
+            .join(Conversation, Conversation.group_id == ChatGroup.id)
+            .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
+            .filter(ConversationMember.user_id == user_id)
+            .order_by(ConversationMember.last_activity_at.desc())
             .all()
         )
         
-        result = []
-        for group, last_message_time, unread_count in groups:
-            # Get the last message content if there is one
-            last_message = None
-            if last_message_time:
-                last_message = (
-                    self.db.query(GroupMessage)
-                    .filter(
-                        GroupMessage.group_id == group.id,
-                        GroupMessage.timestamp == last_message_time
-                    )
-                    .first()
-                )
-            
-            # Get all members
+        # Members of all of these groups in one query
+        members_by_group = {group.id: [] for group, _, _ in groups}
+        if members_by_group:
             members = (
-                self.db.query(UserProfile)
-                .join(group_members, UserProfile.id == group_members.c.user_id)
-                .filter(group_members.c.group_id == group.id)
+                self.db.query(group_members.c.group_id, UserProfile)
+                .join(UserProfile, UserProfile.id == group_members.c.user_id)
+                .filter(group_members.c.group_id.in_(list(members_by_group)))
                 .all()
             )
-            
+            for group_id, member in members:
+                members_by_group[group_id].append(member)
+        
+        result = []
+        for group, conversation, membership in groups:
             group_data = {
                 "id": group.id,
                 "name": group.name,
                 "creator_id": group.creator_id,
                 "created_at": group.created_at,
                 "updated_at": group.updated_at,
-                "members": members,
-                "last_message": last_message.content if last_message else None,
-                "last_message_time": last_message_time,
-                "unread_count": unread_count,
+                "members": members_by_group[group.id],
+                "last_message": conversation.last_message,
+                "last_message_time": conversation.last_activity_at if conversation.last_message_id else None,
+                "unread_count": membership.unread_count,
                 
             }
             result.append(group_data)
@@ -141,7 +130,9 @@ class GroupService:
                 is_admin=1 if is_admin else 0
             )
         )
+        ConversationService(self.db).add_group_member(group_id, user_id)
         self.db.commit()
+        chat_cache.invalidate_group(group_id)
         return True
     
     def remove_member(self, group_id: int, user_id: int) -> bool:
@@ -153,7 +144,9 @@ class GroupService:
                 )
             )
         )
+        ConversationService(self.db).remove_group_member(group_id, user_id)
         self.db.commit()
+        chat_cache.invalidate_group(group_id)
         return result.rowcount > 0
     
     def is_user_in_group(self, group_id: int, user_id: int) -> bool:
@@ -181,17 +174,22 @@ class GroupMessageService:
     def __init__(self, db: Session):
         self.db = db
     
-    def send_message(self, message: GroupMessageCreate) -> GroupMessage:
-        new_message = GroupMessage(
-            group_id=message.group_id,
-            sender_id=message.sender_id,
-            content=message.content
-        )
-        self.db.add(new_message)
-        self.db.commit()
-        self.db.refresh(new_message)
-        return new_message
-    
+    @staticmethod
+    def chat_payload(message: Dict[str, Any], sender: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        A saved or queued group message as delivered over the WebSocket;
+        sender is the profile summary from chat_cache.profile
+        """
+        return {
+            "id": message["id"],
+            "group_id": message["group_id"],
+            "sender_id": message["sender_id"],
+            "content": message["content"],
+            "timestamp": message["timestamp"].isoformat(),
+            "sender_name": f"{sender['first_name'] or ''} {sender['last_name'] or ''}".strip() if sender else None,
+            "sender_image": sender["avatar"] if sender else None
+        }
+
     def get_group_messages(self, group_id: int, skip: int = 0, limit: int = 50) -> List[GroupMessage]:
         return (
             self.db.query(GroupMessage)
@@ -202,28 +200,82 @@ class GroupMessageService:
             .all()
         )
     
-    def get_message_with_sender_info(self, message_id: int):
-        message = (
-            self.db.query(
-                GroupMessage,
-                func.concat(UserProfile.first_name, ' ', UserProfile.last_name).label("sender_name"),
-                UserProfile.profile_image
-            )
-            .join(UserProfile, GroupMessage.sender_id == UserProfile.id)
-            .filter(GroupMessage.id == message_id)
-            .first()
+    def get_group_messages_with_sender(self, group_id: int, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest messages of a group with sender name and avatar, in one joined query"""
+        rows = (
+            self._messages_with_sender()
+            .filter(GroupMessage.group_id == group_id)
+            .order_by(desc(GroupMessage.timestamp))
+            .offset(skip)
+            .limit(limit)
+            .all()
         )
+        return [self._with_sender(row) for row in rows]
+    
+    def get_group_messages_page(
+        self,
+        group_id: int,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        One page of a group's history with sender details, newest first, by
+        (timestamp, id) cursor over ix_group_messages_group_timestamp
+
+        Parameters:
+        - before: next_cursor of a previous page, for older messages
+        - after: prev_cursor of a previous page, for newer messages
+
+        Returns:
+        - items, next_cursor and prev_cursor (see crud.pagination.keyset_page)
+        """
+        predicate, order_by, older = keyset_window(GroupMessage.timestamp, GroupMessage.id, before, after)
+
+        query = self._messages_with_sender().filter(GroupMessage.group_id == group_id)
+        if predicate is not None:
+            query = query.filter(predicate)
+        rows = query.order_by(*order_by).limit(limit + 1).all()
+
+        page = keyset_page(rows, limit, lambda row: (row.timestamp, row.id), older, after or before)
+        page["items"] = [self._with_sender(row) for row in page["items"]]
+        return page
+
+    def get_message_with_sender_info(self, message_id: int):
+        message = self._messages_with_sender().filter(GroupMessage.id == message_id).first()
         
         if not message:
             return None
         
-        msg, sender_name, sender_image = message
+        return self._with_sender(message)
+
+    def _messages_with_sender(self):
+        # Message columns plus the sender's name and avatar; the outer join
+        # keeps messages whose sender was deleted
+        return (
+            self.db.query(
+                GroupMessage.id,
+                GroupMessage.group_id,
+                GroupMessage.sender_id,
+                GroupMessage.content,
+                GroupMessage.timestamp,
+                UserProfile.id.label("profile_id"),
+                UserProfile.first_name,
+                UserProfile.last_name,
+                UserProfile.profile_image
+            )
+            .outerjoin(UserProfile, GroupMessage.sender_id == UserProfile.id)
+        )
+
+    @staticmethod
+    def _with_sender(row) -> Dict[str, Any]:
         return {
-            "id": msg.id,
-            "group_id": msg.group_id,
-            "sender_id": msg.sender_id,
-            "content": msg.content,
-            "timestamp": msg.timestamp,
-            "sender_name": sender_name,
-            "sender_image": sender_image
+            "id": row.id,
+            "group_id": row.group_id,
+            "sender_id": row.sender_id,
+            "content": row.content,
+            "timestamp": row.timestamp,
+            "sender_name": f"{row.first_name or ''} {row.last_name or ''}".strip() if row.profile_id else None,
+            "sender_image": row.profile_image
         }
+
@@ -1,22 +1,29 @@
+from typing import Any, Dict, Optional
+from sqlalchemy import case, select, union_all
 from sqlalchemy.orm import Session
-from ..models.message_model import Message
+from ..models.message_model import Conversation, ConversationMember, Message
 from ..models.user_model import UserProfile
-from ..schemas.message_schema import MessageCreate, MessageResponse
-from ..crud.crud import create_record
+from ..crud.pagination import keyset_page, keyset_window
+from .conversation_services import DIRECT
 
 class MessageService:
     def __init__(self, db: Session):
         self.db = db
 
-    def send_message(self, message: MessageCreate) -> MessageResponse:
-        message_data = message.model_dump()
+    @staticmethod
+    def chat_payload(message: Dict[str, Any], sender: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        A saved or queued direct message as delivered over the WebSocket;
+        sender is the profile summary from chat_cache.profile
+        """
+        return {
+            "id": message["id"],
+            "sender": sender,
+            "receiver_id": message["receiver_id"],
+            "content": message["content"],
+            "timestamp": message["timestamp"].isoformat()
+        }
 
-        return create_record(
-            db=self.db,
-            model=Message,
-            data=message_data
-        )
-    
     def get_chat_history(self, user_id: int, other_user_id: int, skip: int = 0, limit: int = 50):
         messages = (
             self.db.query(Message)
@@ -34,32 +41,63 @@ class MessageService:
         
         return messages
     
-    def get_chat_contacts(self, user_id: int):
-        # Find all unique users that the current user has sent messages to
-        sent_to = (
-            self.db.query(Message.receiver_id)
-            .filter(Message.sender_id == user_id)
-            .distinct()
+    def get_chat_history_page(
+        self,
+        user_id: int,
+        other_user_id: int,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        One page of a conversation, newest first, by (timestamp, id) cursor
+
+        Each direction of the conversation is a separate range of
+        ix_messages_sender_receiver_timestamp, so a page is read from both
+        ranges and merged instead of scanning an OR.
+
+        Parameters:
+        - before: next_cursor of a previous page, for older messages
+        - after: prev_cursor of a previous page, for newer messages
+
+        Returns:
+        - items, next_cursor and prev_cursor (see crud.pagination.keyset_page)
+        """
+        predicate, order_by, older = keyset_window(Message.timestamp, Message.id, before, after)
+
+        directions = []
+        for sender_id, receiver_id in ((user_id, other_user_id), (other_user_id, user_id)):
+            query = select(Message.id).where(Message.sender_id == sender_id, Message.receiver_id == receiver_id)
+            if predicate is not None:
+                query = query.where(predicate)
+            directions.append(select(query.order_by(*order_by).limit(limit + 1).subquery()))
+        candidate_ids = union_all(*directions).subquery()
+
+        rows = (
+            self.db.query(Message)
+            .filter(Message.id.in_(select(candidate_ids.c.id)))
+            .order_by(*order_by)
+            .limit(limit + 1)
             .all()
         )
-        
-        # Find all unique users that have sent messages to the current user
-        received_from = (
-            self.db.query(Message.sender_id)
-            .filter(Message.receiver_id == user_id)
-            .distinct()
-            .all()
+        return keyset_page(rows, limit, lambda row: (row.timestamp, row.id), older, after or before)
+
+    def get_chat_contacts(self, user_id: int):
+        # The user's direct conversations, most recently active first
+        other_id = case(
+            (Conversation.user_low_id == user_id, Conversation.user_high_id),
+            else_=Conversation.user_low_id
         )
-        
-        # Combine and remove duplicates
-        contact_ids = set([user_id for (user_id,) in sent_to] + 
-                        [user_id for (user_id,) in received_from])
-        
-        # Get the actual user profiles
         contacts = (
             self.db.query(UserProfile)
-            .filter(UserProfile.id.in_(contact_ids))
+            .join(Conversation, UserProfile.id == other_id)
+            .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
+            .filter(
+                ConversationMember.user_id == user_id,
+                Conversation.kind == DIRECT
+            )
+            .order_by(ConversationMember.last_activity_at.desc())
             .all()
         )
         
-        return contacts
\ No newline at end of file
+        return contacts
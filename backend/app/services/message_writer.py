@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import Settings
+from app.database import Base, engine, run_in_db_session
+from app.models.message_model import GroupMessage, Message
+from app.services.conversation_services import ConversationService
+from app.websockets.chat_ws import manager
+from app.websockets.group_chat_ws import group_manager
+
+logger = logging.getLogger(__name__)
+
+# Longest pause between flush attempts while the database is failing
+MAX_RETRY_DELAY_SECONDS = 5.0
+
+# Flush attempts on shutdown before unsaved rows are spilled to disk
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+class SequenceIdAllocator:
+    """
+    Hands out primary keys for one table in blocks, so rows can carry
+    their final id before they are inserted
+
+    On PostgreSQL a block is reserved from the table's sequence in one
+    round trip and ids stay unique across workers. Other databases (SQLite
+    in development) have no sequences; ids continue from MAX(id) in this
+    process, which is only safe with a single worker, so MessageWriter
+    refuses to start on SQLite while another process is writing.
+    """
+
+    def __init__(self, model: Type[Base], block_size: int = 100):
+        self.model = model
+        self.block_size = block_size
+        self._ids: List[int] = []
+        self._next_local: Optional[int] = None
+        self._floor = 0
+        self._lock = asyncio.Lock()
+
+    def observe(self, row_id: int) -> None:
+        """Never hand out ids at or below one already in use (e.g. replayed rows)"""
+        self._floor = max(self._floor, row_id)
+
+    async def next_id(self) -> int:
+        async with self._lock:
+            if not self._ids:
+                self._ids = await run_in_db_session(self._reserve)
+            return self._ids.pop(0)
+
+    def _reserve(self, db: Session) -> List[int]:
+        table = self.model.__table__
+        if db.get_bind().dialect.name == "postgresql":
+            rows = db.execute(
+                text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :n)"),
+                {"table": table.name, "n": self.block_size}
+            )
+            return [row_id for (row_id,) in rows]
+
+        if self._next_local is None:
+            self._next_local = (db.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+        self._next_local = max(self._next_local, self._floor + 1)
+        block = list(range(self._next_local, self._next_local + self.block_size))
+        self._next_local += self.block_size
+        return block
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages
+
+    enqueue() gives a message its id and timestamp immediately, so it can
+    be delivered right away, and queues the row. A background task inserts
+    the queued rows of every table in one transaction of multi-row INSERTs
+    every flush_interval seconds, or as soon as batch_size rows are
+    waiting. A failed flush keeps the rows and retries with backoff; rows
+    the database rejects outright (e.g. a group deleted since the sender's
+    membership was checked) are dropped so they can't block the queue, and
+    on_rejected is awaited for each so the sender can be told. enqueue()
+    refuses new messages once max_pending rows are waiting.
+
+    after_write, if given, runs in the same transaction as the INSERTs
+    (conversation counters use it).
+
+    Timestamps are naive UTC, like the DateTime columns they are stored
+    in, so a delivered message and the same message read back from
+    history serialise identically.
+
+    On shutdown the queue is drained with a few retries, and anything the
+    database still won't take is written to spill_path and re-queued on
+    the next start. Rows are lost only if the process dies without
+    shutting down, and then at most one flush interval's worth.
+    """
+
+    def __init__(
+        self,
+        models: List[Type[Base]],
+        flush_interval: float = 0.05,
+        batch_size: int = 500,
+        max_pending: int = 10000,
+        id_block_size: int = 100,
+        spill_path: Optional[str] = None,
+        after_write: Optional[Callable[[Session, Dict[str, List[Dict[str, Any]]]], None]] = None,
+        on_rejected: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.after_write = after_write
+        self.on_rejected = on_rejected
+        self._models = {model.__tablename__: model for model in models}
+        self._allocators = {name: SequenceIdAllocator(model, id_block_size) for name, model in self._models.items()}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self._models}
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._oldest_pending: Optional[float] = None
+        self._sqlite_lock = None
+
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_rows = 0
+        self.rejected_rows = 0
+        self.last_flush_ms: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        return sum(len(rows) for rows in self._pending.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush counters"""
+        return {
+            "queue_depth": self.pending,
+            "queue_depth_by_table": {name: len(rows) for name, rows in self._pending.items()},
+            "oldest_pending_ms": (
+                (time.monotonic() - self._oldest_pending) * 1000 if self._oldest_pending is not None else None
+            ),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_rows": self.flushed_rows,
+            "rejected_rows": self.rejected_rows,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    async def start(self) -> None:
+        self._claim_sqlite_writer()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._replay_spill()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the background task and drain the queue"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for attempt in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            if await self.flush():
+                break
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+        if self.pending:
+            self._spill()
+
+        if self._sqlite_lock is not None:
+            self._sqlite_lock.close()  # Releases the flock
+            self._sqlite_lock = None
+
+    def _claim_sqlite_writer(self) -> None:
+        # SQLite ids come from MAX(id) in this process (SequenceIdAllocator),
+        # so a second worker would hand out the same ids. Hold an exclusive
+        # lock next to the database file for as long as the writer runs.
+        if engine.dialect.name != "sqlite" or not engine.url.database or engine.url.database == ":memory:":
+            return
+        try:
+            import fcntl
+        except ImportError:
+            return  # No flock (Windows); single-worker use is on the operator
+
+        lock_file = open(f"{engine.url.database}.chat-writer.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                "Another process is already writing chat messages to this SQLite database; "
+                "SQLite only supports a single worker (use PostgreSQL for several)"
+            )
+        self._sqlite_lock = lock_file
+
+    async def enqueue(self, model: Type[Base], values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Assign an id and timestamp to a new row and queue it for insertion
+
+        Returns:
+        - The row as it will be stored
+        """
+        if self._task is None:
+            raise RuntimeError("Message writer is not running")
+        if self.pending >= self.max_pending:
+            raise RuntimeError("Messages are being saved more slowly than they arrive; try again shortly")
+
+        name = model.__tablename__
+        row = dict(values)
+        row["id"] = await self._allocators[name].next_id()
+        row.setdefault("timestamp", datetime.now(timezone.utc).replace(tzinfo=None))
+
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+        self._pending[name].append(row)
+        if self.pending >= self.batch_size:
+            self._wake.set()
+        return row
+
+    async def flush(self) -> bool:
+        """Insert everything queued so far; returns False if the rows had to be kept"""
+        async with self._flush_lock:
+            batch = {name: rows for name, rows in self._pending.items() if rows}
+            if not batch:
+                return True
+            oldest = self._oldest_pending
+            self._pending = {name: [] for name in self._models}
+            self._oldest_pending = None
+
+            started = time.perf_counter()
+            try:
+                written, rejected = await run_in_db_session(self._write, batch)
+            except Exception:
+                logger.exception("Saving %d chat messages failed; will retry", sum(map(len, batch.values())))
+                for name, rows in batch.items():
+                    self._pending[name][:0] = rows
+                self._oldest_pending = oldest  # The kept rows are older than any queued since
+                self.failed_flushes += 1
+                return False
+
+            self.flushes += 1
+            self.flushed_rows += written
+            self.rejected_rows += len(rejected)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            for name, row in rejected:
+                logger.error("Dropping chat message the database rejected: %s %s", name, row)
+                if self.on_rejected is not None:
+                    try:
+                        await self.on_rejected(name, row)
+                    except Exception:
+                        logger.exception("Could not report rejected chat message %s %s", name, row["id"])
+            return True
+
+    def _write(self, db: Session, batch: Dict[str, List[Dict[str, Any]]]) -> Tuple[int, List[Tuple[str, Dict[str, Any]]]]:
+        total = sum(len(rows) for rows in batch.values())
+        try:
+            for name, rows in batch.items():
+                db.execute(insert(self._models[name]), rows)
+            if self.after_write is not None:
+                self.after_write(db, batch)
+            db.commit()
+            return total, []
+        except IntegrityError:
+            db.rollback()
+
+        # Some row violates a constraint; isolate it with a savepoint per
+        # row, still in one transaction
+        rejected = []
+        written: Dict[str, List[Dict[str, Any]]] = {}
+        for name, rows in batch.items():
+            for row in rows:
+                try:
+                    with db.begin_nested():
+                        db.execute(insert(self._models[name]), [row])
+                    written.setdefault(name, []).append(row)
+                except IntegrityError:
+                    rejected.append((name, row))
+
+        if self.after_write is not None and written:
+            # Counters are secondary; don't let them cost the messages
+            try:
+                with db.begin_nested():
+                    self.after_write(db, written)
+            except Exception:
+                logger.exception("Post-write update failed for %d chat messages", total - len(rejected))
+        db.commit()
+        return total - len(rejected), rejected
+
+    async def _flush_loop(self) -> None:
+        delay = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if await self.flush():
+                delay = self.flush_interval
+            else:
+                delay = min(max(delay, self.flush_interval) * 2, MAX_RETRY_DELAY_SECONDS)
+
+    def _spill(self) -> None:
+        rows = [(name, row) for name, table_rows in self._pending.items() for row in table_rows]
+        if not self.spill_path:
+            for name, row in rows:
+                logger.error("Unsaved chat message lost on shutdown: %s %s", name, row)
+            return
+        with open(self.spill_path, "a") as f:
+            for name, row in rows:
+                f.write(json.dumps({"table": name, "row": {**row, "timestamp": row["timestamp"].isoformat()}}) + "\n")
+        logger.error("Spilled %d unsaved chat messages to %s", len(rows), self.spill_path)
+        self._pending = {name: [] for name in self._models}
+        self._oldest_pending = None
+
+    def _replay_spill(self) -> None:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries:
+            row = entry["row"]
+            timestamp = datetime.fromisoformat(row["timestamp"])
+            if timestamp.tzinfo is not None:  # Spilled before timestamps were naive
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            row["timestamp"] = timestamp
+            self._pending[entry["table"]].append(row)
+            self._allocators[entry["table"]].observe(row["id"])
+        if entries:
+            self._oldest_pending = time.monotonic()
+            logger.info("Re-queued %d chat messages spilled at the last shutdown", len(entries))
+        # They are in memory now; the next shutdown spills them again if needed
+        os.remove(self.spill_path)
+
+
+async def _notify_sender(name: str, row: Dict[str, Any]) -> None:
+    # The message was already delivered; tell the sender it wasn't saved
+    payload = json.dumps({
+        "status": "error",
+        "message": "Message could not be saved",
+        "data": {"id": row["id"], "receiver_id": row.get("receiver_id"), "group_id": row.get("group_id")}
+    })
+    if name == GroupMessage.__tablename__:
+        await group_manager.send_message(row["sender_id"], payload)
+    else:
+        await manager.send_message(receiver_id=row["sender_id"], message=payload)
+
+
+message_writer = MessageWriter(
+    [Message, GroupMessage],
+    flush_interval=Settings.CHAT_FLUSH_INTERVAL_MS / 1000,
+    batch_size=Settings.CHAT_FLUSH_BATCH_SIZE,
+    max_pending=Settings.CHAT_MAX_PENDING_MESSAGES,
+    id_block_size=Settings.CHAT_ID_BLOCK_SIZE,
+    spill_path=Settings.CHAT_SPILL_PATH,
+    after_write=lambda db, batch: ConversationService(db).record_messages(batch),
+    on_rejected=lambda name, row: _notify_sender(name, row)
+)
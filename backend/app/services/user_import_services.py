@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, union
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.auth import hash_password_in_worker
+from app.core.config import Settings
+from app.core.email_utils import send_welcome_email
+from app.database import SessionLocal
+from app.models.user_model import AuthUser, UserProfile
+from app.schemas.user_schema import AuthUserCreate
+from app.services.compatibility_services import index_manager
+
+logger = logging.getLogger(__name__)
+
+# Optional columns copied onto the new profile
+PROFILE_FIELDS = ("first_name", "last_name", "msu_id")
+
+
+def parse_user_rows(content: bytes, filename: str = "") -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (line number, row) from a CSV file with a header row or from
+    JSON Lines. The format is taken from the file extension, or sniffed
+    from the first character when there is none.
+    """
+    text = content.decode("utf-8-sig")
+    name = filename.lower()
+    is_jsonl = name.endswith((".jsonl", ".ndjson", ".json")) or (
+        not name.endswith(".csv") and text.lstrip().startswith("{")
+    )
+
+    if is_jsonl:
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {"_error": f"Invalid JSON: {e}"}
+            yield line_number, row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        for row in reader:
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key}
+
+
+class UserImporter:
+    """
+    Creates auth users and their profiles in bulk
+
+    Rows are handled in chunks: one query finds the emails that already
+    exist, passwords are hashed across a process pool, and each table gets
+    one multi-row INSERT ... RETURNING per chunk. A result is yielded per
+    input row, so callers can stream progress back while the import runs.
+    With send_welcome, each created user's credentials go on the mail queue.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = 500, workers: int = 0, send_welcome: bool = False):
+        self.db = db
+        self.chunk_size = max(chunk_size, 1)
+        self.workers = workers
+        self.send_welcome = send_welcome
+        self.counts = {"created": 0, "exists": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+
+    def run(self, rows: Iterator[Tuple[int, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """Import rows and yield one result per row, then a summary"""
+        started = time.perf_counter()
+        seen = set()
+        chunk: List[Dict[str, Any]] = []
+
+        # forkserver: the app runs threads, which fork() would copy mid-flight
+        context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(
+            max_workers=None if self.workers < 1 else self.workers,
+            mp_context=context
+        ) as pool:
+            for line_number, raw in rows:
+                row, error = self._validate(raw)
+                if error:
+                    yield self._result(line_number, raw.get("msu_email"), "invalid", detail=error)
+                    continue
+                if row["msu_email"] in seen:
+                    yield self._result(line_number, row["msu_email"], "duplicate", detail="Repeated in this file")
+                    continue
+                seen.add(row["msu_email"])
+                row["line"] = line_number
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    yield from self._import_chunk(chunk, pool)
+                    chunk = []
+            if chunk:
+                yield from self._import_chunk(chunk, pool)
+
+        if self.counts["created"]:
+            # New users have no responses yet; let the next use rebuild
+            index_manager.mark_stale()
+
+        yield {"summary": dict(self.counts, seconds=round(time.perf_counter() - started, 3))}
+
+    # ── Per chunk ──────────────────────────────────────────────────────────
+    def _import_chunk(self, chunk: List[Dict[str, Any]], pool: ProcessPoolExecutor) -> Iterator[Dict[str, Any]]:
+        existing = self._existing_emails([row["msu_email"] for row in chunk])
+        new_rows = []
+        for row in chunk:
+            if row["msu_email"] in existing:
+                yield self._result(row["line"], row["msu_email"], "exists", detail="User already exists")
+            else:
+                new_rows.append(row)
+        if not new_rows:
+            return
+
+        hashes = pool.map(hash_password_in_worker, [row["password"] for row in new_rows], chunksize=8)
+        for row, hashed in zip(new_rows, hashes):
+            row["raw_password"], row["password"] = row["password"], hashed
+
+        try:
+            created = self._insert(new_rows)
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.warning("Bulk insert of %d users failed (%s); retrying row by row", len(new_rows), e.orig or e)
+            yield from self._insert_one_by_one(new_rows)
+            return
+
+        for row, (auth_id, profile_id) in zip(new_rows, created):
+            yield self._created(row, auth_id, profile_id)
+
+    def _existing_emails(self, emails: List[str]) -> set:
+        query = union(
+            select(AuthUser.msu_email).where(AuthUser.msu_email.in_(emails)),
+            select(UserProfile.msu_email).where(UserProfile.msu_email.in_(emails))
+        )
+        return set(self.db.execute(query).scalars())
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """Insert auth users then profiles; returns (auth id, profile id) per row"""
+        now = datetime.now(timezone.utc)
+        auth_ids = self.db.execute(
+            insert(AuthUser).returning(AuthUser.id, sort_by_parameter_order=True),
+            [
+                {
+                    "msu_email": row["msu_email"],
+                    "password": row["password"],
+                    "role": row["role"],
+                    "created_at": now,
+                    "is_blocked": False
+                }
+                for row in rows
+            ]
+        ).scalars().all()
+        profile_ids = self.db.execute(
+            insert(UserProfile).returning(UserProfile.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": auth_id,
+                    "msu_email": row["msu_email"],
+                    "created_profile_at": now,
+                    **{field: row.get(field) for field in PROFILE_FIELDS}
+                }
+                for row, auth_id in zip(rows, auth_ids)
+            ]
+        ).scalars().all()
+        return list(zip(auth_ids, profile_ids))
+
+    def _insert_one_by_one(self, rows: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        # Isolates the rows that broke the chunk (e.g. a taken msu_id)
+        for row in rows:
+            try:
+                with self.db.begin_nested():
+                    [(auth_id, profile_id)] = self._insert([row])
+            except SQLAlchemyError as e:
+                yield self._result(row["line"], row["msu_email"], "failed", detail=str(e.orig or e).strip())
+                continue
+            yield self._created(row, auth_id, profile_id)
+        self.db.commit()
+
+    # ── Helpers ────────────────────────────────────────────────────────────
+    @staticmethod
+    def _validate(raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        if "_error" in raw:
+            return None, raw["_error"]
+        try:
+            user = AuthUserCreate(
+                msu_email=(raw.get("msu_email") or "").strip(),
+                password=raw.get("password") or "",
+                role=(raw.get("role") or "").strip() or "user"
+            )
+        except ValidationError as e:
+            return None, "; ".join(error["msg"] for error in e.errors())
+        if not user.msu_email or not user.password:
+            return None, "msu_email and password are required"
+
+        row = {"msu_email": user.msu_email, "password": user.password, "role": user.role}
+        for field in PROFILE_FIELDS:
+            value = raw.get(field)
+            row[field] = str(value).strip() or None if value is not None else None
+        return row, None
+
+    def _created(self, row: Dict[str, Any], auth_id: int, profile_id: int) -> Dict[str, Any]:
+        extra = {}
+        if self.send_welcome:
+            try:
+                send_welcome_email(row["msu_email"], row["raw_password"])
+                extra["welcome_email"] = "queued"
+            except RuntimeError as e:
+                extra["welcome_email"] = str(e)
+        return self._result(row["line"], row["msu_email"], "created", user_id=auth_id, profile_id=profile_id, **extra)
+
+    def _result(self, line: int, msu_email: Optional[str], status: str, **extra) -> Dict[str, Any]:
+        self.counts[status] += 1
+        return {"line": line, "msu_email": msu_email, "status": status, **extra}
+
+
+def import_users_service(content: bytes, filename: str = "", send_welcome: bool = False) -> Iterator[str]:
+    """
+    Bulk-create users from an uploaded CSV or JSONL file, yielding one
+    JSON line per input row and a final summary line. With send_welcome,
+    new users are e-mailed their credentials in the background.
+
+    Uses its own session, since the results are streamed after the
+    request handler has returned.
+    """
+    db = SessionLocal()
+    try:
+        importer = UserImporter(
+            db,
+            chunk_size=Settings.USER_IMPORT_CHUNK_SIZE,
+            workers=Settings.USER_IMPORT_WORKERS,
+            send_welcome=send_welcome
+        )
+        for result in importer.run(parse_user_rows(content, filename)):
+            yield json.dumps(result) + "\n"
+    finally:
+        db.close()
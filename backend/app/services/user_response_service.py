@@ -6,6 +6,8 @@ from ..schemas.user_response_schema import UserResponseCreate, SingleUserRespons
 from ..crud.crud import (
     create_record
 )
+from .compatibility_services import index_manager
+
 class UserResponseService:
     def __init__(self, db: Session):
         self.db = db
@@ -36,6 +38,7 @@ class UserResponseService:
             )
             user_responses.append(user_response)
 
+        index_manager.refresh_user(self.db, profile_id=user_profile_id)
         return user_responses
 
     def get_user_responses(self, user_profile_id: int):
@@ -67,6 +70,7 @@ class UserResponseService:
             updated_responses.append(existing_response)
 
         self.db.commit()
+        index_manager.refresh_user(self.db, profile_id=user_profile_id)
         return updated_responses
     
     def delete_user_response(self, user_profile_id: int, question_id: int) -> bool:
@@ -84,5 +88,6 @@ class UserResponseService:
 
         self.db.delete(response)
         self.db.commit()
+        index_manager.refresh_user(self.db, profile_id=user_profile_id)
         return True
 
@@ -7,6 +7,8 @@ from fastapi import HTTPException
 import os
 from app.models.user_model import UserProfile
 from app.schemas.user_schema import UserProfileUpdate
+from app.services.compatibility_services import index_manager
+from app.services.chat_cache import chat_cache
 from ..crud.crud import (
     get_record_by_id, 
     get_all_records, 
@@ -45,6 +47,8 @@ def update_user_profile_service(user_id: int, profile_update: dict, db: Session)
         updated_profile = update_record(db, UserProfile, profile.id, update_data)
         if not updated_profile:
             raise HTTPException(status_code=404, detail="Profile not updated")
+        index_manager.refresh_user(db, user_id=user_id)
+        chat_cache.invalidate_profile(profile.id)
         return updated_profile
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Topics chat events are published on
+DIRECT_TOPIC = "direct"
+GROUP_TOPIC = "group"
+PRESENCE_TOPIC = "presence"
+CACHE_TOPIC = "cache"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ChatBroker:
+    """
+    Pub/sub backplane for chat events.
+
+    Every worker publishes events (a direct message, a group message, a
+    presence change, a cache invalidation) to the broker and every worker, including the
+    publisher, receives them and delivers them to the sockets it holds.
+    Each topic has its own queue and dispatcher task: handlers for a topic
+    run one event at a time, in publish order, and a slow handler (e.g. a
+    group event waiting on a member lookup) only holds up its own topic.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._dispatchers: Dict[str, asyncio.Task] = {}
+        self._started = False
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self) -> None:
+        self._started = True
+
+    async def stop(self) -> None:
+        self._started = False
+        dispatchers = list(self._dispatchers.values())
+        for dispatcher in dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*dispatchers, return_exceptions=True)
+        self._dispatchers.clear()
+        self._queues.clear()
+
+    async def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _received(self, topic: str, data: Dict[str, Any]) -> None:
+        """Queue an event from the backplane for the local handlers"""
+        if not self._started:
+            logger.warning("Chat broker not started; dropping %s event", topic)
+            return
+        if topic not in self._handlers:
+            return
+        queue = self._queues.get(topic)
+        if queue is None:
+            # Dispatchers start with a topic's first event
+            queue = self._queues[topic] = asyncio.Queue()
+            self._dispatchers[topic] = asyncio.create_task(self._dispatch_loop(topic, queue))
+        queue.put_nowait(data)
+
+    async def _dispatch_loop(self, topic: str, queue: asyncio.Queue) -> None:
+        while True:
+            data = await queue.get()
+            for handler in self._handlers.get(topic, []):
+                try:
+                    await handler(data)
+                except Exception:
+                    logger.exception("Chat handler for %s failed", topic)
+
+
+class InProcessBroker(ChatBroker):
+    """
+    Broker for a single worker (and for tests): events only reach the
+    handlers of this process
+    """
+
+    name = "memory"
+
+    async def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        # Round-trip through JSON so handlers see what a network backend delivers
+        self._received(topic, json.loads(json.dumps(data)))
+
+
+class PostgresBroker(ChatBroker):
+    """
+    Broker over Postgres LISTEN/NOTIFY, so workers on any host that share
+    the database see each other's events
+
+    One autocommit connection LISTENs and is watched by the event loop;
+    another sends NOTIFYs from a worker thread. NOTIFY payloads are
+    limited to MAX_PAYLOAD_BYTES, and a lost listening connection is
+    re-established with exponential backoff.
+    """
+
+    name = "postgres"
+
+    # Postgres rejects NOTIFY payloads of 8000 bytes or more
+    MAX_PAYLOAD_BYTES = 7999
+
+    def __init__(self, dsn: str, channel: str = "chat_events", max_backoff_seconds: float = 30.0):
+        super().__init__()
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", channel):
+            raise ValueError(f"Invalid NOTIFY channel name '{channel}'")
+        self.dsn = dsn
+        self.channel = channel
+        self.max_backoff_seconds = max_backoff_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener = None
+        self._notifier = None
+        self._notify_lock = threading.Lock()
+        self._reconnecting: Optional[asyncio.Task] = None
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    async def start(self) -> None:
+        await super().start()
+        self._loop = asyncio.get_running_loop()
+        await self._listen()
+
+    async def stop(self) -> None:
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            self._reconnecting = None
+        self._close_listener()
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
+        await super().stop()
+
+    async def _listen(self) -> None:
+        self._listener = await asyncio.to_thread(self._connect)
+        with self._listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        self._loop.add_reader(self._listener.fileno(), self._on_readable)
+
+    def _close_listener(self) -> None:
+        if self._listener is None:
+            return
+        try:
+            self._loop.remove_reader(self._listener.fileno())
+        except Exception:
+            pass  # Socket already gone
+        self._listener.close()
+        self._listener = None
+
+    def _on_readable(self) -> None:
+        try:
+            self._listener.poll()
+        except Exception:
+            logger.exception("Lost the chat broker's LISTEN connection")
+            self._close_listener()
+            if self._reconnecting is None:
+                self._reconnecting = self._loop.create_task(self._reconnect())
+            return
+
+        while self._listener.notifies:
+            notification = self._listener.notifies.pop(0)
+            try:
+                envelope = json.loads(notification.payload)
+                self._received(envelope["topic"], envelope["data"])
+            except (ValueError, KeyError):
+                logger.warning("Ignoring malformed chat event on %s", self.channel)
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self._listen()
+                    logger.info("Chat broker reconnected to %s", self.channel)
+                    return
+                except Exception:
+                    logger.warning("Chat broker reconnect failed; retrying in %.1fs", delay)
+                    delay = min(delay * 2, self.max_backoff_seconds)
+        finally:
+            self._reconnecting = None
+
+    def _notify(self, payload: str) -> None:
+        with self._notify_lock:
+            for attempt in range(2):
+                try:
+                    if self._notifier is None or self._notifier.closed:
+                        self._notifier = self._connect()
+                    with self._notifier.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except Exception:
+                    # A broken connection is replaced once before giving up
+                    if self._notifier is not None:
+                        self._notifier.close()
+                    self._notifier = None
+                    if attempt:
+                        raise
+
+    async def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        payload = json.dumps({"topic": topic, "data": data})
+        if len(payload.encode("utf-8")) > self.MAX_PAYLOAD_BYTES:
+            raise ValueError("Message is too large to deliver")
+        await asyncio.to_thread(self._notify, payload)
+
+
+def _postgres_dsn(database_url: str) -> str:
+    """libpq connection string for a SQLAlchemy URL (drops the +driver suffix)"""
+    from sqlalchemy.engine import make_url
+
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def make_broker(backend: str = "memory", database_url: Optional[str] = None, channel: str = "chat_events") -> ChatBroker:
+    """
+    Instantiate a chat broker by name: "memory" for a single worker,
+    "postgres" to fan out across workers through the application database
+    """
+    if backend == InProcessBroker.name:
+        return InProcessBroker()
+    if backend == PostgresBroker.name:
+        if not database_url or not database_url.startswith("postgresql"):
+            raise ValueError("The postgres chat broker needs a PostgreSQL DATABASE_URL")
+        return PostgresBroker(_postgres_dsn(database_url), channel=channel)
+    raise ValueError(f"Unknown chat broker '{backend}'. Choose from ['memory', 'postgres']")
+
+
+broker = make_broker(Settings.CHAT_BROKER, Settings.DATABASE_URL, Settings.CHAT_BROKER_CHANNEL)
@@ -1,37 +1,62 @@
-import asyncio
 import json
-from fastapi import WebSocket
-from typing import Dict
+from typing import Any, Dict, Optional
 from datetime import datetime, timezone
-from fastapi import WebSocket, WebSocketDisconnect
+from fastapi import WebSocket
+
+from app.core.config import Settings
+from .broker import DIRECT_TOPIC, PRESENCE_TOPIC, ChatBroker, broker
+from .connection import OutboundConnection, run_in_background
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+    """
+    Direct-message sockets held by this worker. Messages and presence
+    changes go through the chat broker, so they reach users connected to
+    any worker; each worker delivers them to its own sockets by queueing
+    them on the socket's OutboundConnection.
+    """
+
+    def __init__(self, broker: ChatBroker):
+        self.active_connections: Dict[int, OutboundConnection] = {}
+        self.broker = broker
+        broker.subscribe(DIRECT_TOPIC, self._deliver_message)
+        broker.subscribe(PRESENCE_TOPIC, self._deliver_presence)
 
-    async def connect(self, user_id: int, ws: WebSocket):
+    async def connect(self, user_id: int, ws: WebSocket) -> OutboundConnection:
         await ws.accept()
-        self.active_connections[user_id] = ws
+        connection = OutboundConnection(
+            ws,
+            max_queue=Settings.CHAT_SEND_QUEUE_SIZE,
+            policy=Settings.CHAT_SLOW_CONSUMER_POLICY,
+            send_timeout=Settings.CHAT_SEND_TIMEOUT_SECONDS,
+            on_close=lambda closed: self.disconnect(user_id, closed)
+        )
+        connection.start()
+        self.active_connections[user_id] = connection
         # announce “online”
         await self.broadcast_presence(user_id, True)
+        return connection
 
-    def disconnect(self, user_id: int):
-        # remove socket
-        self.active_connections.pop(user_id, None)
-        # announce “offline” asynchronously
-        asyncio.create_task(self.broadcast_presence(user_id, False))
+    def disconnect(self, user_id: int, connection: Optional[OutboundConnection] = None):
+        """
+        Close a user's connection (the current one unless given) and, if it
+        was the current one, announce that they went offline
+        """
+        current = self.active_connections.get(user_id)
+        connection = connection or current
+        if connection is None:
+            return
+        if not connection.closed:
+            run_in_background(connection.close())
+        if connection is current:
+            del self.active_connections[user_id]
+            # announce “offline” asynchronously
+            run_in_background(self.broadcast_presence(user_id, False))
 
     async def send_message(self, receiver_id: int, message: str):
         """
-        Send a chat payload to a single connected user.
+        Send a chat payload to a single user, wherever they are connected.
         """
-        ws = self.active_connections.get(receiver_id)
-        if ws:
-            try:
-                await ws.send_text(message)
-            except WebSocketDisconnect:
-                # if they disconnected unexpectedly, clean up
-                self.disconnect(receiver_id)
+        await self.broker.publish(DIRECT_TOPIC, {"receiver_id": receiver_id, "message": message})
 
     async def broadcast_presence(self, user_id: int, is_online: bool):
         """
@@ -43,11 +68,16 @@ class ConnectionManager:
             "is_online": is_online,
             "timestamp": datetime.now(timezone.utc).isoformat()
         })
-        for uid, socket in list(self.active_connections.items()):
-            if uid != user_id:
-                try:
-                    await socket.send_text(payload)
-                except WebSocketDisconnect:
-                    self.disconnect(uid)
+        await self.broker.publish(PRESENCE_TOPIC, {"user_id": user_id, "message": payload})
+
+    async def _deliver_message(self, event: Dict[str, Any]):
+        connection = self.active_connections.get(event["receiver_id"])
+        if connection:
+            connection.send(event["message"])
+
+    async def _deliver_presence(self, event: Dict[str, Any]):
+        for uid, connection in list(self.active_connections.items()):
+            if uid != event["user_id"]:
+                connection.send(event["message"])
                     
-manager = ConnectionManager()
+manager = ConnectionManager(broker)
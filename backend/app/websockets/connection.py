@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Set
+
+from fastapi import WebSocket, status
+
+logger = logging.getLogger(__name__)
+
+# What to do when a client doesn't keep up with its messages
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+SLOW_CONSUMER_POLICIES = (DROP_OLDEST, DISCONNECT)
+
+# Fire-and-forget tasks; the event loop only keeps weak references to them
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def run_in_background(coroutine: Awaitable[None], loop: Optional[asyncio.AbstractEventLoop] = None) -> asyncio.Task:
+    """
+    Start a task nobody awaits, holding a reference until it finishes so it
+    can't be garbage-collected mid-run; failures are logged
+    """
+    task = (loop or asyncio.get_running_loop()).create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+
+def _background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background chat task failed", exc_info=task.exception())
+
+
+class OutboundConnection:
+    """
+    A WebSocket with a bounded outbound queue drained by its own writer
+    task. send() only enqueues, so broadcasting to many sockets never waits
+    on the network and one slow client can't hold up the others.
+
+    When the queue is full the connection either drops its oldest pending
+    message (drop_oldest) or is closed (disconnect) so the client can
+    reconnect and reload history. A send that doesn't finish within
+    send_timeout seconds, or that fails, closes the connection as well.
+    Every socket write goes through the queue, which also keeps writes to
+    one socket from overlapping.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int = 256,
+        policy: str = DROP_OLDEST,
+        send_timeout: float = 10.0,
+        on_close: Optional[Callable[["OutboundConnection"], None]] = None
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy '{policy}'. Choose from {list(SLOW_CONSUMER_POLICIES)}")
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+        self.dropped = 0
+        self.closed = False
+        self._queue: Deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: str) -> bool:
+        """
+        Queue a message without waiting; returns False if it was not
+        accepted because the connection is closed or being closed
+        """
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if self.policy == DISCONNECT:
+                logger.warning("Closing slow chat connection with %d queued messages", len(self._queue))
+                self._shutdown(status.WS_1013_TRY_AGAIN_LATER)
+                return False
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(message)
+        self._ready.set()
+        return True
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE) -> None:
+        """Stop the writer (pending messages are discarded) and close the socket"""
+        self._mark_closed()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
+
+    def _shutdown(self, code: int) -> None:
+        # Refuse further messages right away; the socket closes shortly
+        if not self.closed:
+            self._mark_closed()
+            run_in_background(self.close(code))
+
+    def _mark_closed(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _write_loop(self) -> None:
+        while not self.closed:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            message = self._queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Chat send timed out after %.1fs; closing the connection", self.send_timeout)
+                await self.close(status.WS_1013_TRY_AGAIN_LATER)
+                return
+            except Exception:
+                # The client went away; the receive loop will see it too
+                self._mark_closed()
+                return
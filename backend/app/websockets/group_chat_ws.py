@@ -1,25 +1,86 @@
 from fastapi import WebSocket
-from typing import Dict
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.config import Settings
+from app.services.chat_cache import chat_cache
+from .broker import GROUP_TOPIC, ChatBroker, broker
+from .connection import OutboundConnection, run_in_background
 
 class GroupConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+    """
+    Group-chat sockets held by this worker; messages are fanned out to
+    every worker through the chat broker and queued on each member's
+    OutboundConnection
+    """
+
+    def __init__(self, broker: ChatBroker):
+        self.active_connections: Dict[int, OutboundConnection] = {}
+        self.broker = broker
+        broker.subscribe(GROUP_TOPIC, self._deliver)
 
-    async def connect(self, user_id: int, websocket: WebSocket):
+    async def connect(self, user_id: int, websocket: WebSocket) -> OutboundConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        connection = OutboundConnection(
+            websocket,
+            max_queue=Settings.CHAT_SEND_QUEUE_SIZE,
+            policy=Settings.CHAT_SLOW_CONSUMER_POLICY,
+            send_timeout=Settings.CHAT_SEND_TIMEOUT_SECONDS,
+            on_close=lambda closed: self.disconnect(user_id, closed)
+        )
+        connection.start()
+        self.active_connections[user_id] = connection
+        return connection
 
-    def disconnect(self, user_id: int):
-        self.active_connections.pop(user_id, None)
+    def disconnect(self, user_id: int, connection: Optional[OutboundConnection] = None):
+        current = self.active_connections.get(user_id)
+        connection = connection or current
+        if connection is None:
+            return
+        if not connection.closed:
+            run_in_background(connection.close())
+        if connection is current:
+            del self.active_connections[user_id]
 
     async def send_message(self, receiver_id: int, message: str):
-        if receiver_id in self.active_connections:
-            await self.active_connections[receiver_id].send_text(message)
+        await self.send_to_members([receiver_id], message)
+
+    async def send_to_members(self, member_ids: Iterable[int], message: str):
+        """Send a message to the given users with a single broker event"""
+        await self.broker.publish(GROUP_TOPIC, {"receiver_ids": list(member_ids), "message": message})
 
-    async def broadcast(self, message: str, exclude_user_id: int = None):
+    async def send_to_group(self, group_id: int, message: str, exclude_user_id: Optional[int] = None):
+        """
+        Send a message to every member of a group. Only the group id goes
+        through the broker, so the event size doesn't grow with the group;
+        each worker looks the members up in the chat cache.
+        """
+        await self.broker.publish(GROUP_TOPIC, {
+            "group_id": group_id,
+            "exclude_user_id": exclude_user_id,
+            "message": message
+        })
+
+    async def broadcast(self, message: str, exclude_user_id: Optional[int] = None):
         """Send a message to all connected clients except the excluded one"""
-        for user_id, connection in self.active_connections.items():
-            if user_id != exclude_user_id:
-                await connection.send_text(message)
+        await self.broker.publish(GROUP_TOPIC, {
+            "receiver_ids": None,
+            "exclude_user_id": exclude_user_id,
+            "message": message
+        })
+
+    async def _deliver(self, event: Dict[str, Any]):
+        if event.get("group_id") is not None:
+            if not self.active_connections:
+                return  # Nobody on this worker; skip the member lookup
+            member_ids = await chat_cache.group_members(event["group_id"])
+            receiver_ids = [uid for uid in member_ids if uid != event.get("exclude_user_id")]
+        else:
+            receiver_ids = event.get("receiver_ids")
+        if receiver_ids is None:
+            receiver_ids = [uid for uid in self.active_connections if uid != event.get("exclude_user_id")]
+        for user_id in receiver_ids:
+            connection = self.active_connections.get(user_id)
+            if connection is not None:
+                connection.send(event["message"])
 
-group_manager = GroupConnectionManager()
\ No newline at end of file
+group_manager = GroupConnectionManager(broker)
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# The app modules create their engines at import time; nothing connects
+# unless a test does
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "roommate_tests.db"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """A fresh SQLite database with every table, enforcing foreign keys"""
+    from app.database import Base
+    import app.models  # noqa: F401  (registers every table)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    @event.listens_for(engine, "connect")
+    def _foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    session = sessionmaker(bind=db_engine, autoflush=False)()
+    yield session
+    session.close()
@@ -0,0 +1,120 @@
+from datetime import date
+
+import numpy as np
+
+from app.crud.allocation_crud import commit_allocations, load_open_rooms
+from app.ml.assignment import OPEN_ROOM, assign_roommates
+from app.models import AuthUser, ResidenceHall, Room, UserProfile
+
+
+def _clusters(n_clusters, size, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = np.eye(dim)[:n_clusters]
+    vectors = np.repeat(centres, size, axis=0) + rng.normal(scale=0.05, size=(n_clusters * size, dim))
+    labels = np.repeat(np.arange(n_clusters), size)
+    order = rng.permutation(len(vectors))
+    vectors = vectors[order] / np.linalg.norm(vectors[order], axis=1, keepdims=True)
+    return vectors, labels[order]
+
+
+# ── Solver ─────────────────────────────────────────────────────────────────
+def test_solver_puts_each_cluster_in_its_own_room():
+    vectors, labels = _clusters(n_clusters=4, size=3)
+    assignment = assign_roommates(vectors, np.full(4, 3), n_neighbours=5)
+
+    assert assignment.unplaced == 0
+    for room in range(4):
+        assert len(set(labels[assignment.room_of == room])) == 1
+    assert assignment.objective >= assignment.greedy_objective - 1e-9
+
+
+def test_solver_respects_capacity_and_leaves_overflow_unplaced():
+    vectors, _ = _clusters(n_clusters=2, size=5)
+    assignment = assign_roommates(vectors, np.array([2, 3, 1]), n_neighbours=4)
+
+    counts = np.bincount(assignment.room_of[assignment.room_of >= 0], minlength=3)
+    assert (counts <= [2, 3, 1]).all()
+    assert assignment.unplaced == 10 - 6
+
+
+def test_solver_never_mixes_groups():
+    vectors, _ = _clusters(n_clusters=2, size=4)
+    groups = np.array([0, 1] * 4)
+    room_groups = np.array([1, OPEN_ROOM, OPEN_ROOM, OPEN_ROOM])
+    assignment = assign_roommates(
+        vectors,
+        np.array([2, 2, 2, 2]),
+        groups=groups,
+        room_groups=room_groups,
+        n_neighbours=4
+    )
+
+    for room in range(4):
+        placed = groups[assignment.room_of == room]
+        assert len(set(placed.tolist())) <= 1
+    assert set(groups[assignment.room_of == 0].tolist()) <= {1}
+
+
+# ── Commit ─────────────────────────────────────────────────────────────────
+def _hall(db, rooms, students):
+    db.add(ResidenceHall(id=1, name="North", address="1 Campus Dr"))
+    for number, capacity in rooms.items():
+        db.add(Room(
+            residence_hall_id=1, room_number=number, room_type="double", capacity=capacity,
+            current_occupants=0, price=1.0, lease_end=date(2030, 1, 1)
+        ))
+    for i in range(1, students + 1):
+        db.add(AuthUser(id=i, msu_email=f"s{i}@msu.edu", password="x"))
+        db.add(UserProfile(id=i, user_id=i, msu_email=f"s{i}@msu.edu"))
+    db.commit()
+
+
+def _room(db, number):
+    return db.get(Room, (number, 1), populate_existing=True)
+
+
+def test_commit_writes_placements_and_occupancy(db):
+    _hall(db, {101: 2, 102: 2}, students=3)
+
+    written, skipped = commit_allocations(db, [(1, (1, 101)), (2, (1, 101)), (3, (1, 102))], {(1, 101): 0, (1, 102): 0})
+
+    assert (written, skipped) == (3, 0)
+    assert (_room(db, 101).current_occupants, _room(db, 101).room_status, _room(db, 101).is_available) == (2, "full", False)
+    assert (_room(db, 102).current_occupants, _room(db, 102).room_status, _room(db, 102).is_available) == (1, "partially_occupied", True)
+    assert [room['room_number'] for room in load_open_rooms(db, 1)] == [102]
+
+
+def test_commit_skips_student_assigned_meanwhile(db):
+    _hall(db, {101: 2, 102: 2}, students=2)
+    expected = {(1, 101): 0, (1, 102): 0}
+
+    # An admin puts student 1 in room 102 after the solver read the hall
+    db.get(UserProfile, 1).room_number, db.get(UserProfile, 1).residence_hall_id = 102, 1
+    _room(db, 102).current_occupants = 1
+    db.commit()
+
+    written, skipped = commit_allocations(db, [(1, (1, 101)), (2, (1, 101))], expected)
+
+    assert (written, skipped) == (1, 1)
+    assert db.get(UserProfile, 1, populate_existing=True).room_number == 102
+    assert db.get(UserProfile, 2, populate_existing=True).room_number == 101
+    assert _room(db, 101).current_occupants == 1
+
+
+def test_commit_skips_room_changed_meanwhile(db):
+    _hall(db, {101: 2, 102: 2}, students=4)
+    expected = {(1, 101): 0, (1, 102): 0}
+
+    # Student 4 is put into room 101 by hand, so room 101 now has one place
+    profile = db.get(UserProfile, 4)
+    profile.room_number, profile.residence_hall_id = 101, 1
+    _room(db, 101).current_occupants = 1
+    db.commit()
+
+    written, skipped = commit_allocations(db, [(1, (1, 101)), (2, (1, 101)), (3, (1, 102))], expected)
+
+    assert (written, skipped) == (1, 2)
+    assert _room(db, 101).current_occupants == 1  # Not overbooked
+    assert db.get(UserProfile, 1, populate_existing=True).room_number is None
+    assert db.get(UserProfile, 2, populate_existing=True).room_number is None
+    assert db.get(UserProfile, 3, populate_existing=True).room_number == 102
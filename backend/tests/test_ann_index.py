@@ -0,0 +1,19 @@
+import numpy as np
+
+from app.ml.ann_index import RandomProjectionLSH, lsh_bits_for
+from app.ml.benchmark import benchmark_population
+
+
+def test_bits_grow_with_the_population():
+    assert [lsh_bits_for(n) for n in (0, 2_000, 10_000, 100_000, 10**9)] == [4, 7, 10, 13, 16]
+
+
+def test_fit_resolves_bits_unless_given():
+    vectors = np.random.default_rng(0).normal(size=(1_000, 6))
+    assert RandomProjectionLSH().fit(vectors).bits == lsh_bits_for(1_000)
+    assert RandomProjectionLSH(n_bits=12).fit(vectors).bits == 12
+
+
+def test_default_lsh_recall_on_synthetic_questionnaires():
+    run = benchmark_population(2_000, n_queries=100, backends=["lsh"], all_pairs_max_users=0)
+    assert run["top_k"]["lsh"]["recall_at_k"] >= 0.9
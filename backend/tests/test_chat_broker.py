@@ -0,0 +1,58 @@
+import asyncio
+
+from app.websockets.broker import DIRECT_TOPIC, GROUP_TOPIC, InProcessBroker
+
+
+def test_slow_topic_does_not_hold_up_other_topics():
+    async def scenario():
+        broker = InProcessBroker()
+        release_group = asyncio.Event()
+        delivered = []
+
+        async def slow_group(event):
+            await release_group.wait()  # e.g. a member lookup on a cache miss
+            delivered.append(("group", event["n"]))
+
+        async def direct(event):
+            delivered.append(("direct", event["n"]))
+
+        broker.subscribe(GROUP_TOPIC, slow_group)
+        broker.subscribe(DIRECT_TOPIC, direct)
+        await broker.start()
+
+        await broker.publish(GROUP_TOPIC, {"n": 1})
+        await broker.publish(GROUP_TOPIC, {"n": 2})
+        for n in range(3):
+            await broker.publish(DIRECT_TOPIC, {"n": n})
+        await asyncio.sleep(0.01)
+        before_release = list(delivered)
+
+        release_group.set()
+        await asyncio.sleep(0.01)
+        await broker.stop()
+        return before_release, delivered
+
+    before_release, delivered = asyncio.run(scenario())
+
+    assert before_release == [("direct", 0), ("direct", 1), ("direct", 2)]
+    # Each topic still runs in publish order
+    assert [n for topic, n in delivered if topic == "group"] == [1, 2]
+
+
+def test_events_before_start_are_dropped():
+    async def scenario():
+        broker = InProcessBroker()
+        delivered = []
+
+        async def handler(event):
+            delivered.append(event)
+
+        broker.subscribe(DIRECT_TOPIC, handler)
+        await broker.publish(DIRECT_TOPIC, {"n": 0})
+        await broker.start()
+        await broker.publish(DIRECT_TOPIC, {"n": 1})
+        await asyncio.sleep(0.01)
+        await broker.stop()
+        return delivered
+
+    assert asyncio.run(scenario()) == [{"n": 1}]
@@ -0,0 +1,87 @@
+import numpy as np
+
+from app.ml.compatibility_index import CompatibilityIndex
+from app.ml.encoding import FeatureVocabulary
+from app.ml.feature_store import IncrementalFeatureStore
+from app.services import compatibility_services
+from app.services.compatibility_services import CompatibilityIndexManager
+
+
+def _manager_with(n_users, drift_threshold, monkeypatch):
+    vocabulary = FeatureVocabulary(["cs"], [])
+    rng = np.random.default_rng(0)
+    store = IncrementalFeatureStore(
+        list(range(1, n_users + 1)),
+        rng.normal(size=(n_users, vocabulary.dim)),
+        vocabulary=vocabulary,
+        drift_threshold=drift_threshold
+    )
+    manager = CompatibilityIndexManager(drift_threshold=drift_threshold)
+    manager._install(store, save=False)
+    monkeypatch.setattr(compatibility_services.MatchingService, "get_questions_from_db", lambda self: [])
+    return manager
+
+
+def _refresh_new_user(manager, monkeypatch, user_id, raw):
+    profile = {"id": user_id, "user_id": user_id, "majors": None}
+    monkeypatch.setattr(manager, "_extract_user", lambda *args, **kwargs: (profile, raw))
+    manager.refresh_user(db=None, user_id=user_id)
+
+
+def test_new_user_crossing_drift_threshold_stays_aligned(monkeypatch):
+    manager = _manager_with(10, drift_threshold=0.01, monkeypatch=monkeypatch)
+    dim = manager._store.dim
+
+    # Far from the current means, so the insert forces a re-normalisation
+    assert manager._store.needs_renormalization() is False
+    _refresh_new_user(manager, monkeypatch, 11, np.full(dim, 50.0))
+
+    store, index = manager._store, manager._index
+    assert 11 in index
+    assert index.user_ids == store.user_ids
+    assert len(index) == len(store) == 11
+
+    # The next new user must land on the same row in both
+    _refresh_new_user(manager, monkeypatch, 12, np.zeros(dim))
+    assert index.user_ids == store.user_ids
+    assert index.row_of[12] == store.row_of[12]
+    np.testing.assert_allclose(
+        index.vectors,
+        CompatibilityIndex(store.user_ids, store.normalized_matrix()).vectors
+    )
+
+
+def test_new_user_below_drift_threshold_is_upserted(monkeypatch):
+    manager = _manager_with(10, drift_threshold=1e6, monkeypatch=monkeypatch)
+    _refresh_new_user(manager, monkeypatch, 11, np.zeros(manager._store.dim))
+    assert manager._index.user_ids == manager._store.user_ids
+
+
+def test_store_swapped_mid_refresh_updates_the_new_store(monkeypatch):
+    manager = _manager_with(10, drift_threshold=1e6, monkeypatch=monkeypatch)
+    old_store, old_index = manager._store, manager._index
+    vocabulary = old_store.vocabulary
+    new_store = IncrementalFeatureStore(
+        list(range(1, 21)),
+        np.random.default_rng(1).normal(size=(20, vocabulary.dim)),
+        vocabulary=vocabulary,
+        drift_threshold=1e6
+    )
+    profile = {"id": 21, "user_id": 21, "majors": None}
+    calls = []
+
+    def extract_and_swap(*args, **kwargs):
+        # A full rebuild finishes while this user's features are read
+        if not calls:
+            manager._install(new_store, save=False)
+        calls.append(1)
+        return profile, np.zeros(vocabulary.dim)
+
+    monkeypatch.setattr(manager, "_extract_user", extract_and_swap)
+    manager.refresh_user(db=None, user_id=21)
+
+    assert manager._store is new_store
+    assert 21 in manager._index
+    assert manager._index.user_ids == new_store.user_ids
+    assert 21 not in old_index and 21 not in old_store.row_of
+    assert manager._stale is False
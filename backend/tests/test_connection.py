@@ -0,0 +1,20 @@
+import asyncio
+
+from app.websockets import connection
+
+
+def test_background_tasks_are_held_until_done():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        task = connection.run_in_background(job())
+        held = task in connection._background_tasks
+        release.set()
+        await task
+        await asyncio.sleep(0)  # Done callbacks run on the next loop iteration
+        return held, task in connection._background_tasks
+
+    assert asyncio.run(scenario()) == (True, False)
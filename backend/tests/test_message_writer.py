@@ -0,0 +1,171 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.models import AuthUser, UserProfile
+from app.models.message_model import ChatGroup, GroupMessage, Message
+from app.services import message_writer as message_writer_module
+from app.services.message_writer import MessageWriter
+
+
+@pytest.fixture
+def session_factory(db_engine, monkeypatch):
+    factory = sessionmaker(bind=db_engine, autoflush=False)
+
+    async def run_in_test_session(function, *args):
+        db = factory()
+        try:
+            return await asyncio.to_thread(function, db, *args)
+        finally:
+            db.close()
+
+    monkeypatch.setattr(message_writer_module, "run_in_db_session", run_in_test_session)
+    monkeypatch.setattr(message_writer_module, "engine", db_engine)
+
+    db = factory()
+    for i in (1, 2):
+        db.add(AuthUser(id=i, msu_email=f"u{i}@msu.edu", password="x"))
+        db.add(UserProfile(id=i, user_id=i, msu_email=f"u{i}@msu.edu"))
+    db.add(ChatGroup(id=1, name="Floor 3", creator_id=1))
+    db.commit()
+    db.close()
+    return factory
+
+
+def _writer(**kwargs):
+    # Long interval: the tests flush by hand
+    return MessageWriter([Message, GroupMessage], flush_interval=60, **kwargs)
+
+
+def _saved(factory, model):
+    with factory() as db:
+        return db.execute(select(model.id, model.content, model.timestamp).order_by(model.id)).all()
+
+
+def test_flush_inserts_queued_rows_in_one_pass(session_factory):
+    batches = []
+
+    async def scenario():
+        writer = _writer(after_write=lambda db, batch: batches.append({name: len(rows) for name, rows in batch.items()}))
+        await writer.start()
+        first = await writer.enqueue(Message, {"sender_id": 1, "receiver_id": 2, "content": "hi"})
+        await writer.enqueue(Message, {"sender_id": 2, "receiver_id": 1, "content": "hello"})
+        await writer.enqueue(GroupMessage, {"group_id": 1, "sender_id": 1, "content": "all"})
+        assert writer.pending == 3
+        assert await writer.flush() is True
+        await writer.stop()
+        return writer, first
+
+    writer, first = asyncio.run(scenario())
+
+    saved = _saved(session_factory, Message)
+    assert [(row.id, row.content) for row in saved] == [(first["id"], "hi"), (first["id"] + 1, "hello")]
+    # Stored timestamps are naive UTC, the same value the socket payload carried
+    assert first["timestamp"].tzinfo is None
+    assert saved[0].timestamp == first["timestamp"]
+    assert [row.content for row in _saved(session_factory, GroupMessage)] == ["all"]
+    assert batches == [{"messages": 2, "group_messages": 1}]
+    assert (writer.pending, writer.flushes, writer.flushed_rows) == (0, 1, 3)
+
+
+def test_rejected_row_is_reported_and_the_rest_are_saved(session_factory):
+    rejected = []
+
+    async def on_rejected(name, row):
+        rejected.append((name, row["group_id"]))
+
+    async def scenario():
+        writer = _writer(on_rejected=on_rejected)
+        await writer.start()
+        await writer.enqueue(GroupMessage, {"group_id": 1, "sender_id": 1, "content": "kept"})
+        await writer.enqueue(GroupMessage, {"group_id": 99, "sender_id": 1, "content": "no such group"})
+        await writer.enqueue(Message, {"sender_id": 1, "receiver_id": 2, "content": "also kept"})
+        assert await writer.flush() is True
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+
+    assert rejected == [("group_messages", 99)]
+    assert [row.content for row in _saved(session_factory, GroupMessage)] == ["kept"]
+    assert [row.content for row in _saved(session_factory, Message)] == ["also kept"]
+    assert (writer.flushed_rows, writer.rejected_rows) == (2, 1)
+
+
+def test_failed_flush_keeps_rows_in_order_for_the_retry(session_factory, monkeypatch):
+    async def scenario():
+        writer = _writer()
+        await writer.start()
+        write = writer._write
+        calls = []
+
+        def failing_once(db, batch):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return write(db, batch)
+
+        monkeypatch.setattr(writer, "_write", failing_once)
+        await writer.enqueue(Message, {"sender_id": 1, "receiver_id": 2, "content": "first"})
+        assert await writer.flush() is False
+        assert writer.pending == 1
+
+        await writer.enqueue(Message, {"sender_id": 1, "receiver_id": 2, "content": "second"})
+        assert await writer.flush() is True
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+
+    assert [row.content for row in _saved(session_factory, Message)] == ["first", "second"]
+    assert (writer.failed_flushes, writer.flushes, writer.pending) == (1, 1, 0)
+
+
+def test_unsaved_rows_are_spilled_on_stop_and_replayed_on_start(session_factory, tmp_path, monkeypatch):
+    spill_path = tmp_path / "chat-spill.jsonl"
+    monkeypatch.setattr(message_writer_module, "SHUTDOWN_FLUSH_ATTEMPTS", 1)
+
+    async def spill():
+        writer = _writer(spill_path=str(spill_path))
+        await writer.start()
+
+        def database_down(db, batch):
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+
+        monkeypatch.setattr(writer, "_write", database_down)
+        rows = [
+            await writer.enqueue(Message, {"sender_id": 1, "receiver_id": 2, "content": "one"}),
+            await writer.enqueue(GroupMessage, {"group_id": 1, "sender_id": 2, "content": "two"}),
+        ]
+        await writer.stop()
+        return rows
+
+    spilled = asyncio.run(spill())
+
+    entries = [json.loads(line) for line in spill_path.read_text().splitlines()]
+    assert [(entry["table"], entry["row"]["id"]) for entry in entries] == [
+        ("messages", spilled[0]["id"]), ("group_messages", spilled[1]["id"])
+    ]
+    assert _saved(session_factory, Message) == []
+
+    async def replay():
+        writer = _writer(spill_path=str(spill_path))
+        await writer.start()
+        assert writer.pending == 2
+        assert not spill_path.exists()
+        assert await writer.flush() is True
+        later = await writer.enqueue(Message, {"sender_id": 2, "receiver_id": 1, "content": "three"})
+        await writer.flush()
+        await writer.stop()
+        return later
+
+    later = asyncio.run(replay())
+
+    saved = _saved(session_factory, Message)
+    assert [(row.id, row.content) for row in saved] == [(spilled[0]["id"], "one"), (later["id"], "three")]
+    assert saved[0].timestamp == spilled[0]["timestamp"]
+    assert [row.content for row in _saved(session_factory, GroupMessage)] == ["two"]
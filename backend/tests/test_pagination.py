@@ -0,0 +1,96 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.crud.pagination import decode_cursor, encode_cursor, keyset_window
+from app.models import AuthUser, UserProfile
+from app.models.message_model import Message
+from app.services.message_services import MessageService
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def conversation(db):
+    for i in (1, 2, 3):
+        db.add(AuthUser(id=i, msu_email=f"u{i}@msu.edu", password="x"))
+        db.add(UserProfile(id=i, user_id=i, msu_email=f"u{i}@msu.edu"))
+    # Several messages share a timestamp, in both directions; ids break the tie
+    rows = [
+        (1, 1, 2, T0),
+        (2, 2, 1, T0),
+        (3, 1, 2, T0),
+        (4, 1, 3, T0),  # Another conversation
+        (5, 2, 1, T0 + timedelta(seconds=1)),
+        (6, 1, 2, T0 + timedelta(seconds=1)),
+        (7, 2, 1, T0 + timedelta(seconds=1)),
+        (8, 1, 2, T0 + timedelta(seconds=2)),
+    ]
+    for row_id, sender_id, receiver_id, timestamp in rows:
+        db.add(Message(id=row_id, sender_id=sender_id, receiver_id=receiver_id, content=f"m{row_id}", timestamp=timestamp))
+    db.commit()
+    return MessageService(db)
+
+
+def _ids(page):
+    return [message.id for message in page["items"]]
+
+
+def test_cursor_round_trip():
+    key = (T0, 42)
+    assert decode_cursor(encode_cursor(key)) == key
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    base64.urlsafe_b64encode(b"{}").decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'["2026-01-01T12:00:00", "x"]').decode(),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_before_and_after_together_are_rejected():
+    cursor = encode_cursor((T0, 1))
+    with pytest.raises(ValueError):
+        keyset_window(Message.timestamp, Message.id, before=cursor, after=cursor)
+
+
+def test_paging_back_across_equal_timestamps(conversation):
+    pages = []
+    page = conversation.get_chat_history_page(1, 2, limit=3)
+    pages.append(_ids(page))
+    while page["next_cursor"]:
+        page = conversation.get_chat_history_page(1, 2, limit=3, before=page["next_cursor"])
+        pages.append(_ids(page))
+
+    assert pages == [[8, 7, 6], [5, 3, 2], [1]]
+
+
+def test_paging_forward_across_equal_timestamps(conversation):
+    oldest = conversation.get_chat_history_page(1, 2, limit=2, before=encode_cursor((T0, 3)))
+    assert _ids(oldest) == [2, 1]
+
+    pages = []
+    cursor = oldest["prev_cursor"]
+    while True:
+        page = conversation.get_chat_history_page(1, 2, limit=2, after=cursor)
+        if not page["items"]:
+            break
+        pages.append(_ids(page))
+        # Older rows always exist when paging forward
+        assert page["next_cursor"] is not None
+        cursor = page["prev_cursor"]
+
+    assert pages == [[5, 3], [7, 6], [8]]
+    # Polling past the newest message keeps the cursor
+    assert page["prev_cursor"] == cursor
+
+
+def test_history_page_rejects_bad_cursor(conversation):
+    with pytest.raises(ValueError):
+        conversation.get_chat_history_page(1, 2, before="garbage")